@@ -0,0 +1,397 @@
+"""
+Packet I/O backends สำหรับ NetworkImpairmentEngine
+WinDivert (live capture), synthetic in-memory generator, and pcap replay/record
+"""
+
+import random
+import struct
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from packets import SimPacket, build_udp_packet
+
+try:
+    import pydivert
+    HAS_PYDIVERT = True
+except ImportError:
+    HAS_PYDIVERT = False
+
+logger = logging.getLogger(__name__)
+
+# pcap constants
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = 0x8100
+
+
+class PacketBackend:
+    """Interface ของ packet I/O: open / recv_batch / send_batch / close
+
+    recv_batch คืน list ของ packets (อาจว่างเมื่อ timeout) และ send_batch
+    re-inject packets ตามลำดับที่ได้รับ ทุก packet ต้องมี .raw เป็น memoryview
+    backends ที่ supports_pool สร้าง packets จาก pool (BufferPool ที่ engine ตั้งให้)
+    และคืน pool หลัง send_batch
+    """
+
+    name = 'base'
+    supports_pool = False
+    pool = None
+
+    def open(self):
+        raise NotImplementedError
+
+    def recv_batch(self, max_packets: int, timeout_ms: int) -> List[Any]:
+        raise NotImplementedError
+
+    def send_batch(self, packets: List[Any]) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+    @property
+    def exhausted(self) -> bool:
+        """True เมื่อ source หมดแล้ว (replay/generator ที่จำกัดจำนวน)"""
+        return False
+
+
+class WinDivertBackend(PacketBackend):
+    """Live capture ผ่าน pydivert/WinDivert
+
+    pydivert bind กับ WinDivert 1.x ซึ่งไม่มี batch recv/send (RecvEx/SendEx
+    แบบ batch มีตั้งแต่ 2.x) จึงใช้ reader thread ดึง packets จาก driver
+    ลง ring ที่มีขนาดจำกัด ขณะที่ capture thread ประมวลผล batch ก่อนหน้า
+    (recv ปล่อย GIL ระหว่างรอ driver) แล้ว recv_batch ดึงทีละ N ตัว
+    ถ้า ring เต็ม reader thread จะรอ (backpressure ไปที่ driver queue)
+    ไม่ใช้ BufferPool: pydivert recv() allocate buffer ของตัวเองและไม่มี API รับลง buffer ที่ให้
+    """
+
+    name = 'windivert'
+
+    def __init__(self, filter_str: str, rx_ring_size: int = 4096):
+        self.filter_str = filter_str
+        self.rx_ring_size = rx_ring_size
+        self.handle = None
+        self._rx = deque()
+        self._rx_lock = threading.Lock()
+        self._rx_ready = threading.Condition(self._rx_lock)
+        self._rx_space = threading.Condition(self._rx_lock)
+        self._reader = None
+
+    def open(self):
+        if not HAS_PYDIVERT:
+            raise RuntimeError("pydivert is not installed")
+        logger.info(f"Opening WinDivert with filter: {self.filter_str}")
+        self.handle = pydivert.WinDivert(self.filter_str)
+        self.handle.open()
+        self._rx.clear()
+        self._reader = threading.Thread(target=self._read_loop, daemon=True, name="WinDivertReader")
+        self._reader.start()
+
+    def _read_loop(self):
+        handle = self.handle
+        rx = self._rx
+        while self.handle is not None:
+            try:
+                packet = handle.recv()
+            except Exception as e:
+                if self.handle is not None:
+                    logger.debug(f"Recv error: {e}")
+                break
+            with self._rx_lock:
+                while len(rx) >= self.rx_ring_size and self.handle is not None:
+                    self._rx_space.wait(0.1)
+                rx.append(packet)
+                if len(rx) == 1:
+                    self._rx_ready.notify()
+
+    def recv_batch(self, max_packets: int, timeout_ms: int) -> List[Any]:
+        rx = self._rx
+        with self._rx_lock:
+            if not rx:
+                self._rx_ready.wait(timeout_ms / 1000.0)
+            n = min(max_packets, len(rx))
+            batch = [rx.popleft() for _ in range(n)]
+            if n:
+                self._rx_space.notify()
+        return batch
+
+    def send_batch(self, packets: List[Any]) -> int:
+        handle = self.handle
+        if handle is None:
+            return 0
+        send = handle.send
+        sent = 0
+        for packet in packets:
+            try:
+                # checksum ถูก patch ระหว่าง effects แล้ว ยกเว้นที่ตั้งใจให้ผิด (bad_checksum)
+                send(packet, recalculate_checksum=not getattr(packet, 'bad_checksum', False))
+                sent += 1
+            except Exception as e:
+                logger.debug(f"Send error: {e}")
+        return sent
+
+    def close(self):
+        handle = self.handle
+        self.handle = None
+        if handle:
+            handle.close()
+        with self._rx_lock:
+            self._rx_space.notify_all()
+            self._rx_ready.notify_all()
+        if self._reader:
+            self._reader.join(timeout=2)
+            self._reader = None
+
+
+class SyntheticBackend(PacketBackend):
+    """In-memory UDP traffic generator สำหรับ benchmark/regression แบบไม่ใช้ driver
+
+    สร้าง packets จาก templates ของ `flows` flows (payload ขนาด payload_size)
+    ที่อัตรา pps (0 = เร็วที่สุด) จนครบ count (0 = ไม่จำกัด); packets ที่ส่ง
+    กลับมานับใน sent_packets/sent_bytes และเก็บ latency (send - recv) ถ้า
+    record_latency
+    """
+
+    name = 'synthetic'
+    supports_pool = True
+
+    def __init__(self, flows: int = 64, payload_size: int = 64, pps: float = 0,
+                 count: int = 0, inbound_ratio: float = 0.0, seed: int = 1,
+                 record_latency: bool = False):
+        rng = random.Random(seed)
+        self.templates = []
+        for i in range(max(1, flows)):
+            packet = build_udp_packet(
+                f"10.0.{(i >> 8) & 0xFF}.{i & 0xFF}",
+                f"192.0.2.{rng.randint(1, 254)}",
+                1024 + rng.randint(0, 60000),
+                rng.choice((53, 443, 3478, 27015)),
+                bytes(rng.getrandbits(8) for _ in range(payload_size)),
+            )
+            self.templates.append(bytes(packet.raw))
+        self.inbound_every = int(round(1.0 / inbound_ratio)) if inbound_ratio > 0 else 0
+        self.pps = pps
+        self.count = count
+        self.record_latency = record_latency
+        self.generated = 0
+        self.sent_packets = 0
+        self.sent_bytes = 0
+        self.latencies = []
+        self._started = 0.0
+        self._lock = threading.Lock()
+
+    def open(self):
+        self.generated = 0
+        self._started = time.monotonic()
+
+    def recv_batch(self, max_packets: int, timeout_ms: int) -> List[Any]:
+        n = max_packets
+        if self.count:
+            n = min(n, self.count - self.generated)
+            if n <= 0:
+                time.sleep(timeout_ms / 1000.0)
+                return []
+        if self.pps:
+            due = int((time.monotonic() - self._started) * self.pps) - self.generated
+            if due <= 0:
+                wait = (self.generated + 1) / self.pps - (time.monotonic() - self._started)
+                time.sleep(min(max(wait, 0.0), timeout_ms / 1000.0))
+                return []
+            n = min(n, due)
+
+        templates = self.templates
+        flows = len(templates)
+        inbound_every = self.inbound_every
+        first = self.generated
+        now = time.monotonic()
+        self.generated = first + n
+        if self.pool is not None:
+            return self.pool.acquire_batch(
+                ((templates[i % flows], not (inbound_every and i % inbound_every == 0))
+                 for i in range(first, first + n)), now)
+        batch = []
+        for i in range(first, first + n):
+            outbound = not (inbound_every and i % inbound_every == 0)
+            batch.append(SimPacket(bytearray(templates[i % flows]), outbound, now))
+        return batch
+
+    def send_batch(self, packets: List[Any]) -> int:
+        nbytes = 0
+        for packet in packets:
+            nbytes += len(packet.raw)
+        with self._lock:
+            self.sent_packets += len(packets)
+            self.sent_bytes += nbytes
+            if self.record_latency:
+                now = time.monotonic()
+                self.latencies.extend(now - packet.timestamp for packet in packets)
+        if self.pool is not None:
+            self.pool.release(packets)
+        return len(packets)
+
+    def close(self):
+        pass
+
+    @property
+    def exhausted(self) -> bool:
+        return bool(self.count) and self.generated >= self.count
+
+
+class PcapBackend(PacketBackend):
+    """Replay packets จากไฟล์ pcap และ/หรือ record packets ที่ส่งลงไฟล์ pcap
+
+    read_path: pcap (Ethernet, raw IP) ที่จะ replay; speed 0 = เร็วที่สุด,
+    1.0 = ตาม timestamp ในไฟล์; loop = วนซ้ำเมื่อจบไฟล์
+    write_path: บันทึก packets ที่ผ่าน engine (LINKTYPE_RAW)
+    """
+
+    name = 'pcap'
+    supports_pool = True
+
+    def __init__(self, read_path: Optional[str] = None, write_path: Optional[str] = None,
+                 speed: float = 0.0, loop: bool = False, outbound: bool = True):
+        self.read_path = read_path
+        self.write_path = write_path
+        self.speed = speed
+        self.loop = loop
+        self.outbound = outbound
+        self.records = []
+        self.position = 0
+        self.sent_packets = 0
+        self._writer = None
+        self._write_lock = threading.Lock()
+        self._started = 0.0
+        self._loop_offset = 0.0
+
+    def open(self):
+        if self.read_path:
+            self.records = read_pcap(self.read_path)
+            logger.info(f"Loaded {len(self.records)} packets from {self.read_path}")
+        if self.write_path:
+            self._writer = open(self.write_path, 'wb')
+            self._writer.write(struct.pack('<IHHiIII', PCAP_MAGIC_NS, 2, 4, 0, 0, 65535, LINKTYPE_RAW))
+        self.position = 0
+        self._loop_offset = 0.0
+        self._started = time.monotonic()
+
+    def recv_batch(self, max_packets: int, timeout_ms: int) -> List[Any]:
+        records = self.records
+        if self.position >= len(records):
+            if not (self.loop and records):
+                time.sleep(timeout_ms / 1000.0)
+                return []
+            self._loop_offset += records[-1][0] - records[0][0]
+            self.position = 0
+
+        end = min(len(records), self.position + max_packets)
+        if self.speed:
+            base = records[0][0]
+            elapsed = (time.monotonic() - self._started) * self.speed + base - self._loop_offset
+            if records[self.position][0] > elapsed:
+                wait = (records[self.position][0] - elapsed) / self.speed
+                time.sleep(min(wait, timeout_ms / 1000.0))
+                return []
+            while end > self.position + 1 and records[end - 1][0] > elapsed:
+                end -= 1
+
+        now = time.monotonic()
+        chunk = records[self.position:end]
+        self.position = end
+        if self.pool is not None:
+            outbound = self.outbound
+            return self.pool.acquire_batch(((data, outbound) for _, data in chunk), now)
+        return [SimPacket(bytearray(data), self.outbound, now) for _, data in chunk]
+
+    def send_batch(self, packets: List[Any]) -> int:
+        if self._writer:
+            now = time.time()
+            sec = int(now)
+            nsec = int((now - sec) * 1e9)
+            header = struct.Struct('<IIII')
+            with self._write_lock:
+                for packet in packets:
+                    raw = packet.raw
+                    self._writer.write(header.pack(sec, nsec, len(raw), len(raw)))
+                    self._writer.write(raw)
+        self.sent_packets += len(packets)
+        if self.pool is not None:
+            self.pool.release(packets)
+        return len(packets)
+
+    def close(self):
+        if self._writer:
+            with self._write_lock:
+                self._writer.close()
+                self._writer = None
+
+    @property
+    def exhausted(self) -> bool:
+        return not self.loop and self.position >= len(self.records)
+
+
+def read_pcap(path: str):
+    """อ่าน pcap คืน list ของ (timestamp_s, ip_packet_bytes); ข้าม non-IP frames"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < 24:
+        raise ValueError(f"Not a pcap file: {path}")
+
+    magic = struct.unpack_from('<I', data, 0)[0]
+    if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+        endian = '<'
+    else:
+        magic = struct.unpack_from('>I', data, 0)[0]
+        if magic not in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            raise ValueError(f"Unsupported capture format (pcapng?): {path}")
+        endian = '>'
+    scale = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+    linktype = struct.unpack_from(endian + 'I', data, 20)[0]
+    record = struct.Struct(endian + 'IIII')
+
+    records = []
+    offset = 24
+    while offset + 16 <= len(data):
+        sec, frac, incl_len, _ = record.unpack_from(data, offset)
+        offset += 16
+        frame = data[offset:offset + incl_len]
+        offset += incl_len
+        ip = _strip_link_layer(frame, linktype)
+        if ip:
+            records.append((sec + frac * scale, ip))
+    return records
+
+
+def _strip_link_layer(frame: bytes, linktype: int) -> Optional[bytes]:
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        return frame if frame and frame[0] >> 4 in (4, 6) else None
+    if linktype == LINKTYPE_ETHERNET:
+        offset = 12
+        ethertype = struct.unpack_from('!H', frame, offset)[0] if len(frame) >= 14 else 0
+        while ethertype == ETHERTYPE_VLAN and len(frame) >= offset + 6:
+            offset += 4
+            ethertype = struct.unpack_from('!H', frame, offset)[0]
+        if ethertype in (ETHERTYPE_IPV4, ETHERTYPE_IPV6):
+            return frame[offset + 2:]
+    return None
+
+
+def create_backend(name: str, filter_str: str = '', options: Optional[Dict[str, Any]] = None) -> PacketBackend:
+    """สร้าง backend ตามชื่อใน NetworkConfig.backend"""
+    options = options or {}
+    if name == 'windivert':
+        return WinDivertBackend(filter_str)
+    if name == 'synthetic':
+        return SyntheticBackend(**options)
+    if name == 'pcap':
+        return PcapBackend(**options)
+    raise ValueError(f"Unknown backend: {name}")
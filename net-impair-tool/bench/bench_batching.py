@@ -0,0 +1,54 @@
+"""
+Batched vs per-packet pipeline at fixed offered loads (synthetic backend)
+Reports achieved pps, CPU per packet and recv->send latency for each batch size
+
+Usage: python bench/bench_batching.py [--rates 10000,50000,100000] [--seconds 2] [--preset MINIMAL]
+       [--policy block --queue-max-packets 250000]  (effects presets: no overflow drops)
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import examples
+from backends import SyntheticBackend
+from bench_pipeline import percentile, run_pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rates', default='10000,50000,100000,0', help='0 = unpaced (max throughput)')
+    parser.add_argument('--max-packets', type=int, default=200000, help='packet count for unpaced runs')
+    parser.add_argument('--batch-sizes', default='1,64')
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--preset', default=None, help='config dict name in examples.py')
+    parser.add_argument('--policy', default='tail_drop', help='queue_overflow_policy')
+    parser.add_argument('--queue-max-packets', type=int, default=0, help='0 = auto size from offered rate')
+    args = parser.parse_args()
+
+    base = dict(getattr(examples, args.preset)) if args.preset else {}
+    print(f"preset={args.preset or 'passthrough'} policy={args.policy}")
+    print(f"{'offered pps':>12}{'batch':>7}{'achieved pps':>14}{'CPU us/pkt':>12}"
+          f"{'lat p50 ms':>12}{'lat p99 ms':>12}{'overflow':>10}")
+    for rate in (int(r) for r in args.rates.split(',')):
+        for batch_size in (int(b) for b in args.batch_sizes.split(',')):
+            count = int(rate * args.seconds) if rate else args.max_packets
+            backend = SyntheticBackend(pps=rate, count=count, record_latency=True)
+            config = dict(base, batch_size=batch_size, queue_expected_pps=rate,
+                          queue_max_packets=args.queue_max_packets, queue_overflow_policy=args.policy)
+            cpu0 = time.process_time()
+            elapsed, stats = run_pipeline(config, backend, count)
+            cpu = time.process_time() - cpu0
+            latencies = [lat * 1000.0 for lat in backend.latencies]
+            offered = f"{rate:,}" if rate else 'max'
+            print(f"{offered:>12}{batch_size:>7}{stats['processed'] / elapsed:>14,.0f}"
+                  f"{cpu / max(stats['processed'], 1) * 1e6:>12.2f}"
+                  f"{percentile(latencies, 50):>12.3f}{percentile(latencies, 99):>12.3f}"
+                  f"{stats['overflow']:>10,}")
+
+
+if __name__ == '__main__':
+    main()
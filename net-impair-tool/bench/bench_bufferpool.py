@@ -0,0 +1,68 @@
+"""
+Buffer pool on/off: GC activity, allocation rate and release jitter under paced synthetic load
+Runs the same preset twice (buffer_pool_enabled False / True) and reports collections per
+generation (gen0 runs every ~700 net container allocations, so it tracks allocation rate),
+GC pause percentiles and release error / recv->send tails
+
+Usage: python bench/bench_bufferpool.py [--preset POOR_WIFI] [--pps 20000] [--seconds 5] [--flows 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import examples
+from backends import SyntheticBackend
+from bench_pipeline import percentile, run_pipeline
+
+
+def measure(config, pps, seconds, flows, pool):
+    count = int(pps * seconds)
+    backend = SyntheticBackend(flows=flows, payload_size=200, pps=pps, count=count, record_latency=True)
+    config = dict(config, buffer_pool_enabled=pool, queue_expected_pps=int(pps),
+                  queue_overflow_policy='tail_drop')
+    elapsed, stats = run_pipeline(config, backend, count, settle_s=30)
+    latencies = [value * 1000.0 for value in backend.latencies]
+    gc_stats = stats['gc']
+    return {
+        'collections': gc_stats['collections'],
+        'gc_pause_total_ms': round(sum(gc_stats['pause_total_ms']), 1),
+        'gc_pause_p99_ms': gc_stats['pause_ms']['p99'],
+        'gc_pause_max_ms': gc_stats['pause_ms']['max'],
+        'release_error': stats['latency']['release_error_ms'],
+        'recv_to_send_p99_ms': round(percentile(latencies, 99), 3),
+        'recv_to_send_max_ms': round(max(latencies, default=0.0), 3),
+        'pool': stats['buffer_pool'],
+        'seconds': elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--preset', default='POOR_WIFI', help='config dict name in examples.py')
+    parser.add_argument('--pps', type=float, default=20000)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--flows', type=int, default=20000, help='many flows = large flow table for gen2 to scan')
+    args = parser.parse_args()
+
+    config = dict(getattr(examples, args.preset))
+    print(f"preset={args.preset} pps={args.pps:.0f} seconds={args.seconds} flows={args.flows}")
+    print(f"{'pool':<6}{'gen0/1/2':>16}{'gc total ms':>13}{'gc p99 ms':>11}{'gc max ms':>11}"
+          f"{'rel.err p99':>13}{'rel.err max':>13}{'r->s p99':>10}{'r->s max':>10}{'hit rate':>10}")
+    for pool in (False, True):
+        result = measure(config, args.pps, args.seconds, args.flows, pool)
+        error = result['release_error']
+        hit_rate = result['pool']['hit_rate'] if result['pool'] else 0.0
+        collections = '/'.join(str(n) for n in result['collections'])
+        print(f"{'on' if pool else 'off':<6}{collections:>16}{result['gc_pause_total_ms']:>13.1f}"
+              f"{result['gc_pause_p99_ms']:>11.3f}{result['gc_pause_max_ms']:>11.3f}"
+              f"{error['p99']:>13.3f}{error['max']:>13.3f}{result['recv_to_send_p99_ms']:>10.2f}"
+              f"{result['recv_to_send_max_ms']:>10.2f}{hit_rate:>10.1%}")
+        time.sleep(0.5)
+
+
+if __name__ == '__main__':
+    main()
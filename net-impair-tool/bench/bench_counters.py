@@ -0,0 +1,62 @@
+"""
+Counter increment cost: shared stats dict (เดิม) vs per-thread StatCounters slot
+
+Usage: python bench/bench_counters.py [--increments 2000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from counters import StatCounters
+
+
+def loop_dict(n, stats):
+    for _ in range(n):
+        stats['processed'] += 1
+
+
+def loop_slot(n, slot):
+    for _ in range(n):
+        slot[0] += 1
+
+
+def loop_empty(n, _):
+    for _ in range(n):
+        pass
+
+
+def per_op_ns(func, n, arg):
+    start = time.perf_counter()
+    func(n, arg)
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--increments', type=int, default=2000000)
+    args = parser.parse_args()
+    n = args.increments
+
+    counters = StatCounters(('processed', 'dropped', 'delayed'))
+    base = per_op_ns(loop_empty, n, None)
+    cases = (
+        ("dict['processed'] += 1", loop_dict, {'processed': 0, 'dropped': 0}),
+        ("array('Q') slot[0] += 1", loop_slot, array('Q', [0, 0, 0])),
+        ('StatCounters slot[0] += 1', loop_slot, counters.slot()),
+    )
+    for name, func, arg in cases:
+        print(f"{name:<32}{per_op_ns(func, n, arg) - base:>8.1f} ns/increment")
+
+    start = time.perf_counter()
+    for _ in range(10000):
+        counters.snapshot_and_reset()
+    print(f"{'snapshot_and_reset()':<32}{(time.perf_counter() - start) / 10000 * 1e9:>8.1f} ns")
+
+
+if __name__ == '__main__':
+    main()
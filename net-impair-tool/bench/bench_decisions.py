@@ -0,0 +1,86 @@
+"""
+Effect decision throughput: scalar rng.random() ต่อ packet (เดิม) vs DecisionEngine ต่อ batch
+
+Usage: python bench/bench_decisions.py [--packets 1000000] [--batch 64]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from decisions import HAS_NUMPY, DecisionEngine
+
+# (drop, duplicate, tamper, out_of_order, throttle) chances ของ STRESS_TEST / POOR_WIFI
+PROFILES = {
+    'poor_wifi': (0.10, 0.05, 0.0, 0.15, 0.30),
+    'stress': (0.15, 0.20, 0.10, 0.40, 0.0),
+    'light': (0.01, 0.01, 0.0, 0.02, 0.0),
+}
+
+
+def scalar(packets, batch, chances, seed):
+    """แบบ _apply_effects เดิม: draw ทีละ packet ทีละ effect"""
+    rand = random.Random(seed).random
+    drop_p, dup_p, tamper_p, ooo_p, throttle_p = chances
+    decisions = 0
+    for _ in range(packets // batch):
+        for _ in range(batch):
+            decisions += 1
+            if rand() < drop_p:
+                continue
+            dup = rand() < dup_p
+            tamper = rand() < tamper_p
+            delay = rand() * 100 if rand() < ooo_p else 0.0
+            if rand() < throttle_p:
+                delay += rand() * 10
+    return decisions
+
+
+def batched(packets, batch, chances, seed):
+    """DecisionEngine: hits/uniform ต่อ batch ต่อ effect"""
+    engine = DecisionEngine(seed)
+    hits = engine.hits
+    uniform = engine.uniform
+    drop_p, dup_p, tamper_p, ooo_p, throttle_p = chances
+    decisions = 0
+    for _ in range(packets // batch):
+        decisions += batch
+        n = batch - len(hits(batch, drop_p))
+        dup = hits(n, dup_p)
+        tamper = hits(n, tamper_p)
+        delays = [0.0] * n
+        hit = hits(n, ooo_p)
+        for i, extra in zip(hit, uniform(len(hit), 100)):
+            delays[i] += extra
+        hit = hits(n, throttle_p)
+        for i, extra in zip(hit, uniform(len(hit), 10)):
+            delays[i] += extra
+    return decisions
+
+
+def rate(func, packets, batch, chances):
+    start = time.perf_counter()
+    decided = func(packets, batch, chances, 1)
+    return decided / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--packets', type=int, default=1000000)
+    parser.add_argument('--batch', type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"numpy={'yes' if HAS_NUMPY else 'no'} batch={args.batch} (packets/s ที่ตัดสิน effects ครบ)")
+    print(f"{'profile':<12}{'scalar':>14}{'batched':>14}{'speedup':>10}")
+    for name, chances in PROFILES.items():
+        old = rate(scalar, args.packets, args.batch, chances)
+        new = rate(batched, args.packets, args.batch, chances)
+        print(f"{name:<12}{old:>14,.0f}{new:>14,.0f}{new / old:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Asymmetric impairment with independent inbound/outbound pipelines: outbound lag
+stays on target while the inbound direction builds a large shaper backlog
+
+Usage: python bench/bench_directions.py [--pps 10000] [--packets 40000] [--up-ms 30] [--down-ms 120]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import SyntheticBackend
+from bench_pipeline import run_pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pps', type=float, default=10000)
+    parser.add_argument('--packets', type=int, default=40000)
+    parser.add_argument('--payload', type=int, default=200)
+    parser.add_argument('--up-ms', type=float, default=30)
+    parser.add_argument('--down-ms', type=float, default=120)
+    parser.add_argument('--down-kbps', type=float, default=2000,
+                        help='inbound shaper rate (below the offered rate = growing backlog)')
+    args = parser.parse_args()
+
+    offered_kbps = args.pps / 2 * (args.payload + 28) * 8 / 1000
+    config = {
+        'filter_str': 'udp',
+        'lag_enabled': True,
+        'lag_ms': args.up_ms,
+        'inbound': {'lag_ms': args.down_ms, 'shaper_enabled': True},
+        'shaper_inbound_kbps': args.down_kbps,
+        'shaper_queue_bytes': 4 * 10 ** 6,
+        'queue_overflow_policy': 'tail_drop',
+        'queue_expected_pps': int(args.pps),
+    }
+    backend = SyntheticBackend(flows=64, payload_size=args.payload, pps=args.pps,
+                               count=args.packets, inbound_ratio=0.5)
+    _, stats = run_pipeline(config, backend, args.packets, settle_s=60)
+
+    print(f"pps={args.pps:,.0f} (half inbound, {offered_kbps:,.0f} kbps offered per direction) "
+          f"lag up={args.up_ms:g} ms down={args.down_ms:g} ms, inbound shaper {args.down_kbps:g} kbps")
+    for name, target in (('outbound', args.up_ms), ('inbound', args.down_ms)):
+        direction = stats[name]
+        latency = direction['latency']
+        delay = latency['queue_delay_ms']
+        print(f"  {name:<9} released={direction['released']:<7} target={target:g} ms  "
+              f"queue delay p50={delay['p50']:.1f} p99={delay['p99']:.1f} max={delay['max']:.1f} ms  "
+              f"release error p99={latency['release_error_ms']['p99']:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
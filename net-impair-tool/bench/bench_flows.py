@@ -0,0 +1,69 @@
+"""
+Flow table cost: per-packet observe/queued time, memory per flow and /api/flows
+top-N query time at a few concurrent-flow counts
+
+Usage: python bench/bench_flows.py [--flows 64,10000,100000] [--packets 200000]
+"""
+
+import argparse
+import ipaddress
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flows import FlowTable, top_flows
+from packets import build_udp_packet, flow_key
+
+
+def per_packet_ns(fn, batches, packets, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for batch in batches:
+            fn(batch)
+        best = min(best, (time.perf_counter() - start) / packets * 1e9)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--flows', default='64,10000,100000')
+    parser.add_argument('--packets', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=64)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    print(f"{'flows':>8}{'flow_key ns':>13}{'observe ns':>12}{'+queued ns':>12}{'B/flow':>9}{'top-20 ms':>11}")
+    for count in [int(value) for value in args.flows.split(',')]:
+        templates = [build_udp_packet(str(ipaddress.ip_address(0x0A000000 + i)), "192.0.2.1",
+                                      1024 + i % 60000, 27015, b'x' * 64) for i in range(count)]
+        packets = [templates[rng.randrange(count)] for _ in range(args.packets)]
+        batches = [packets[i:i + args.batch] for i in range(0, len(packets), args.batch)]
+        delays = [30.0] * args.batch
+
+        tracemalloc.start()
+        table = FlowTable(max(count, 1) * 2)
+        now = time.monotonic()
+        for template in templates:
+            table.observe([template], True, now)
+        memory = tracemalloc.get_traced_memory()[0] / len(table)
+        tracemalloc.stop()
+
+        key_ns = per_packet_ns(lambda batch: [flow_key(p.raw) for p in batch], batches, len(packets))
+        observe_ns = per_packet_ns(lambda batch: table.observe(batch, True, now), batches, len(packets))
+        queued_ns = per_packet_ns(lambda batch: (table.observe(batch, True, now),
+                                                 table.queued(batch, delays[:len(batch)])),
+                                  batches, len(packets))
+        start = time.perf_counter()
+        top_flows([table], time.monotonic(), 20, 'pps')
+        query_ms = (time.perf_counter() - start) * 1000
+        print(f"{count:>8,}{key_ns:>13,.0f}{observe_ns:>12,.0f}{queued_ns:>12,.0f}"
+              f"{memory:>9,.0f}{query_ms:>11,.1f}")
+
+
+if __name__ == '__main__':
+    main()
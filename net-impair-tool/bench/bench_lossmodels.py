@@ -0,0 +1,64 @@
+"""
+Loss model cost and accuracy: Bernoulli hits vs per-flow Gilbert-Elliott vs loss-trace replay
+
+Usage: python bench/bench_lossmodels.py [--p 1] [--r 30] [--flows 64] [--packets 500000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from decisions import DecisionEngine
+from lossmodels import BurstStats, GilbertElliott, LossTrace, summarize_bursts
+from packets import build_udp_packet, flow_key
+
+BATCH = 64
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--p', type=float, default=1.0, help='%% good -> bad')
+    parser.add_argument('--r', type=float, default=30.0, help='%% bad -> good')
+    parser.add_argument('--flows', type=int, default=64)
+    parser.add_argument('--packets', type=int, default=500000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    raws = [build_udp_packet(f"10.0.0.{i % 250 + 1}", "192.0.2.1", 1024 + i, 27015, b'x' * 64).raw
+            for i in range(args.flows)]
+    batches = [[rng.choice(raws) for _ in range(BATCH)] for _ in range(args.packets // BATCH)]
+    total = len(batches) * BATCH
+
+    model = GilbertElliott(args.p / 100.0, args.r / 100.0)
+    loss = model.expected_loss
+
+    decisions = DecisionEngine(1)
+    start = time.perf_counter()
+    lost = sum(len(decisions.hits(BATCH, loss)) for _ in batches)
+    bernoulli_ns = (time.perf_counter() - start) / total * 1e9
+    print(f"{'bernoulli hits':<28}{bernoulli_ns:>8,.0f} ns/packet  loss={lost / total:.4f}")
+
+    pattern = bytes(1 if rng.random() < loss else 0 for _ in range(10000))
+    for name, m in (('gilbert_elliott', model), ('trace (10k pattern)', LossTrace(pattern))):
+        flows = {}
+        bursts = BurstStats()
+        rand = random.Random(1).random
+        start = time.perf_counter()
+        lost = 0
+        for batch in batches:
+            keys = [flow_key(raw) for raw in batch]
+            lost += len(m.lost(keys, flows, rand, bursts))
+        ns = (time.perf_counter() - start) / total * 1e9
+        summary = summarize_bursts([bursts])
+        print(f"{name + ' (+flow_key)':<28}{ns:>8,.0f} ns/packet  loss={lost / total:.4f} "
+              f"bursts={summary['count']} mean_burst={summary['mean']} max={summary['max']}")
+
+    print(f"expected: loss={loss:.4f} mean_burst={100.0 / args.r:.2f} (gilbert_elliott)")
+
+
+if __name__ == '__main__':
+    main()
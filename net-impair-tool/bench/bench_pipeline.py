@@ -0,0 +1,94 @@
+"""
+Offline effect-pipeline benchmark: drives NetworkImpairmentEngine through the
+synthetic or pcap backend (no WinDivert driver) and reports pps and latency
+
+Usage: python bench/bench_pipeline.py [--preset POOR_WIFI] [--packets 200000] [--pps 0]
+       python bench/bench_pipeline.py --pcap capture.pcap [--record out.pcap]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import examples
+from backends import PcapBackend, SyntheticBackend
+from network import NetworkImpairmentEngine
+
+
+def run_pipeline(config, backend, expected, settle_s=5.0):
+    """Run engine จน backend หมดและ queue ว่าง คืน (elapsed_s, stats)"""
+    engine = NetworkImpairmentEngine()
+    engine.update_config(config)
+    started = time.perf_counter()
+    if not engine.start(backend=backend):
+        raise RuntimeError("engine failed to start")
+
+    while not backend.exhausted or engine.get_stats()['processed'] < expected:
+        time.sleep(0.005)
+    processed_at = time.perf_counter()
+    drain_deadline = time.monotonic() + settle_s
+    while time.monotonic() < drain_deadline:
+        stats = engine.get_stats()
+        if not stats['queue_size'] and not stats['reorder_held']:
+            break
+        time.sleep(0.005)
+    stats = engine.get_stats()
+    engine.stop()
+    return processed_at - started, stats
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--preset', default=None, help='config dict name in examples.py')
+    parser.add_argument('--packets', type=int, default=200000)
+    parser.add_argument('--pps', type=float, default=0, help='offered load; 0 = as fast as possible')
+    parser.add_argument('--flows', type=int, default=64)
+    parser.add_argument('--payload', type=int, default=64)
+    parser.add_argument('--pcap', default=None, help='replay this pcap instead of synthetic traffic')
+    parser.add_argument('--record', default=None, help='with --pcap: write released packets to this pcap')
+    parser.add_argument('--overflow-policy', default='block',
+                        help='block measures lossless throughput; tail_drop shows offered-load loss')
+    args = parser.parse_args()
+
+    config = dict(getattr(examples, args.preset)) if args.preset else {}
+    config['queue_expected_pps'] = int(args.pps or 200000)
+    config['queue_overflow_policy'] = args.overflow_policy
+
+    if args.pcap:
+        backend = PcapBackend(read_path=args.pcap, write_path=args.record)
+        backend.open()
+        expected = len(backend.records)
+        backend.close()
+    else:
+        backend = SyntheticBackend(flows=args.flows, payload_size=args.payload, pps=args.pps,
+                                   count=args.packets, record_latency=True)
+        expected = args.packets
+
+    elapsed, stats = run_pipeline(config, backend, expected)
+    latencies = [lat * 1000.0 for lat in getattr(backend, 'latencies', [])]
+
+    print(f"preset={args.preset or 'passthrough'} backend={backend.name} packets={expected}")
+    print(f"  capture+effects: {stats['processed'] / elapsed:,.0f} pps "
+          f"({elapsed / max(stats['processed'], 1) * 1e9:,.0f} ns/packet)")
+    print(f"  sent={backend.sent_packets} dropped={stats['dropped']} overflow={stats['overflow']}")
+    if latencies:
+        print(f"  recv->send latency ms: p50={percentile(latencies, 50):.3f} "
+              f"p99={percentile(latencies, 99):.3f} max={max(latencies):.3f}")
+    for name in ('queue_delay_ms', 'release_error_ms', 'processing_ms'):
+        h = stats['latency'][name]
+        print(f"  engine {name}: p50={h['p50']:.3f} p90={h['p90']:.3f} p99={h['p99']:.3f} "
+              f"p99.9={h['p99.9']:.3f} max={h['max']:.3f} (n={h['count']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Release accuracy: event-driven PacketQueue.wait_ready vs the old 1 ms sleep-poll
+Measures release time minus deadline against the configured lag_ms, and idle CPU
+
+Usage: python bench/bench_release_jitter.py [--lag-ms 100] [--pps 2000] [--seconds 3]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from network import PacketQueue
+
+
+class FakePacket:
+    __slots__ = ('raw', 'deadline')
+
+    def __init__(self, deadline):
+        self.raw = b'\x00' * 64
+        self.deadline = deadline
+
+
+def poll_release(queue, errors, stop):
+    """Release loop เดิม: get_ready_packets แล้ว sleep 1ms"""
+    while not stop.is_set():
+        for packet in queue.get_ready_packets():
+            errors.append(time.monotonic() - packet.deadline)
+        time.sleep(0.001)
+
+
+def event_release(queue, errors, stop):
+    """Release loop ใหม่: wait_ready หลับจนถึง deadline ถัดไป"""
+    while not stop.is_set():
+        for packet in queue.wait_ready():
+            errors.append(time.monotonic() - packet.deadline)
+
+
+def measure(release, lag_ms, pps, seconds):
+    queue = PacketQueue(max_packets=int(pps * (lag_ms / 1000.0 + 1)) + 1024)
+    errors = []
+    stop = threading.Event()
+    thread = threading.Thread(target=release, args=(queue, errors, stop), daemon=True)
+    thread.start()
+
+    interval = 1.0 / pps
+    next_send = time.monotonic()
+    end = next_send + seconds
+    while next_send < end:
+        now = time.monotonic()
+        if now < next_send:
+            time.sleep(next_send - now)
+        now = time.monotonic()
+        queue.add(FakePacket(now + lag_ms / 1000.0), lag_ms, timestamp=now)
+        next_send += interval
+
+    time.sleep(lag_ms / 1000.0 + 0.05)
+    stop.set()
+    queue.wake()
+    thread.join()
+    return [e * 1000.0 for e in errors]
+
+
+def idle_cpu(release, seconds=1.0):
+    """CPU seconds ที่ release loop ใช้ตอน queue ว่าง"""
+    queue = PacketQueue()
+    stop = threading.Event()
+    thread = threading.Thread(target=release, args=(queue, [], stop), daemon=True)
+    cpu0 = time.process_time()
+    thread.start()
+    time.sleep(seconds)
+    stop.set()
+    queue.wake()
+    thread.join()
+    return (time.process_time() - cpu0) / seconds
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lag-ms', type=float, default=100)
+    parser.add_argument('--pps', type=int, default=2000)
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+
+    print(f"lag_ms={args.lag_ms} pps={args.pps}  (error = release time - deadline)")
+    print(f"{'release loop':<14}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'mean ms':>9}{'idle CPU':>10}")
+    for name, release in (('sleep-poll', poll_release), ('event-driven', event_release)):
+        errors = measure(release, args.lag_ms, args.pps, args.seconds)
+        cpu = idle_cpu(release)
+        print(f"{name:<14}{percentile(errors, 50):>9.3f}{percentile(errors, 99):>9.3f}"
+              f"{max(errors):>9.3f}{sum(errors) / len(errors):>9.3f}{cpu * 100:>9.1f}%")
+
+
+if __name__ == '__main__':
+    main()
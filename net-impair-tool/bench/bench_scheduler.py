@@ -0,0 +1,129 @@
+"""
+Microbenchmark: FIFO deque (เดิม) vs DeadlineScheduler vs SlotScheduler (int keys ที่ PacketQueue ใช้)
+Measures insert/release throughput and per-packet release error at 50k+ queued packets
+
+Usage: python bench/bench_scheduler.py [--packets 50000]
+"""
+
+import argparse
+import heapq
+import itertools
+import os
+import random
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import SlotScheduler
+
+
+class DequeQueue:
+    """Baseline: PacketQueue เดิม - pop จากหัว deque เท่านั้น"""
+
+    def __init__(self):
+        self.queue = deque()
+
+    def push(self, ready_time, packet):
+        self.queue.append({'packet': packet, 'ready_time': ready_time})
+
+    def pop_ready(self, now):
+        ready = []
+        while self.queue and self.queue[0]['ready_time'] <= now:
+            ready.append(self.queue.popleft()['packet'])
+        return ready
+
+    def __len__(self):
+        return len(self.queue)
+
+
+class DeadlineScheduler:
+    """Baseline: min-heap ของ (ready_time, seq, packet) - tuple + float ต่อ packet
+
+    รุ่นก่อน SlotScheduler; seq เป็น tie-break ให้ deadline เท่ากันออกแบบ FIFO
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+
+    def push(self, ready_time, packet):
+        heapq.heappush(self._heap, (ready_time, next(self._seq), packet))
+
+    def pop_ready(self, now):
+        heap = self._heap
+        ready = []
+        while heap and heap[0][0] <= now:
+            ready.append(heapq.heappop(heap)[2])
+        return ready
+
+    def __len__(self):
+        return len(self._heap)
+
+
+def make_workload(count, pps, seed=1):
+    """สร้าง (arrival, deadline) ตาม effect mix แบบ POOR_WIFI: lag + throttle jitter + ooo"""
+    rng = random.Random(seed)
+    workload = []
+    for i in range(count):
+        arrival = i / pps
+        delay = 150.0
+        if rng.random() < 0.40:
+            delay += rng.random() * 30
+        if rng.random() < 0.15:
+            delay += rng.random() * 100
+        workload.append((arrival, arrival + delay / 1000.0))
+    return workload
+
+
+def run(structure, workload, tick=0.001):
+    """Drive structure ด้วย virtual clock; คืน (push_s, pop_s, errors_ms)"""
+    errors = []
+    push_time = 0.0
+    pop_time = 0.0
+    index = 0
+    now = 0.0
+    end = workload[-1][1] + 1.0
+    while now <= end:
+        t0 = time.perf_counter()
+        while index < len(workload) and workload[index][0] <= now:
+            structure.push(workload[index][1], index)
+            index += 1
+        t1 = time.perf_counter()
+        ready = structure.pop_ready(now)
+        t2 = time.perf_counter()
+        push_time += t1 - t0
+        pop_time += t2 - t1
+        for packet_index in ready:
+            errors.append((now - workload[packet_index][1]) * 1000.0)
+        now += tick
+    return push_time, pop_time, errors
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--packets', type=int, default=60000)
+    parser.add_argument('--pps', type=int, default=100000,
+                        help='arrival rate; 100k pps with ~150ms delay keeps 15k+ queued, '
+                             'use --pps 400000 for 50k+ queued')
+    args = parser.parse_args()
+
+    workload = make_workload(args.packets, args.pps)
+    print(f"{'structure':<18}{'push ns/pkt':>12}{'pop ns/pkt':>12}"
+          f"{'err p50 ms':>12}{'err p99 ms':>12}{'err max ms':>12}")
+    for name, factory in (('deque (FIFO)', DequeQueue), ('DeadlineScheduler', DeadlineScheduler),
+                          ('SlotScheduler', SlotScheduler)):
+        push_s, pop_s, errors = run(factory(), workload)
+        n = len(errors)
+        print(f"{name:<18}{push_s / n * 1e9:>12.0f}{pop_s / n * 1e9:>12.0f}"
+              f"{percentile(errors, 50):>12.2f}{percentile(errors, 99):>12.2f}{max(errors):>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""
+Benchmark suite: every examples.py preset against synthetic and pcap traffic (no driver),
+reporting throughput, per-packet cost, release accuracy and delay-queue memory as JSON
+so runs from different releases can be diffed
+
+Per preset:
+- synthetic / pcap: as fast as possible with queue_overflow_policy=block (lossless) ->
+  pps and ns/packet for capture + effects
+- paced: synthetic traffic at --paced-pps with tail_drop -> release error and queue delay
+  percentiles from the engine histograms, recv->send latency from the backend
+- memory: bytes of Python heap per packet held in the delay queue (packets themselves
+  excluded), measured with tracemalloc from before the queue is sized: the bytes each
+  preallocated slot costs plus what enqueueing adds, running batches through the pipeline
+  without release threads (queue_slot_bytes reports the per-slot part alone)
+
+Usage: python bench/bench_suite.py [--out results.json] [--compare baseline.json]
+       [--presets MINIMAL,POOR_WIFI] [--packets 50000] [--paced-pps 5000] [--pcap file.pcap]
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import examples
+from backends import PcapBackend, SyntheticBackend
+from bench_pipeline import percentile, run_pipeline
+from network import NetworkImpairmentEngine
+from packets import build_udp_packet
+
+SCHEMA = 2  # 2: queue_bytes_per_packet รวม slots ที่ preallocate (+ queue_slot_bytes)
+IMIX = ((40, 7), (576, 4), (1500, 1))  # (IP packet bytes, weight) แบบ simple IMIX
+MEMORY_PACKETS = 20000
+# metric -> (+1 ถ้ามากกว่าดีกว่า / -1 ถ้าน้อยกว่าดีกว่า, ผลต่างขั้นต่ำที่นับเป็น regression)
+# ขั้นต่ำกัน jitter ระดับ sub-ms ของ timer ไม่ให้กลายเป็น +50% (ใช้กับ --compare)
+METRICS = {
+    'pps': (1, 0),
+    'ns_per_packet': (-1, 0),
+    'release_error_p99_ms': (-1, 0.25),
+    'recv_to_send_p99_ms': (-1, 1.0),
+    'queue_bytes_per_packet': (-1, 1),
+    'queue_slot_bytes': (-1, 1),
+}
+
+
+def load_presets(names=None):
+    """{name: config} ของ dicts ใน examples.py (+ PASSTHROUGH = ไม่มี effect)"""
+    presets = {'PASSTHROUGH': {}}
+    for name in dir(examples):
+        value = getattr(examples, name)
+        if name.isupper() and isinstance(value, dict):
+            presets[name] = dict(value)
+    if names:
+        unknown = set(names) - set(presets)
+        if unknown:
+            raise SystemExit(f"Unknown presets: {', '.join(sorted(unknown))}")
+        presets = {name: presets[name] for name in names}
+    return presets
+
+
+def write_imix_pcap(path, count, flows=256):
+    """pcap ของ UDP packets ขนาดตาม IMIX กระจาย flows (ใช้เมื่อไม่ได้ให้ --pcap)"""
+    sizes = [size for size, weight in IMIX for _ in range(weight)]
+    writer = PcapBackend(write_path=path)
+    writer.open()
+    batch = []
+    for i in range(count):
+        flow = i % flows
+        payload = bytes(max(0, sizes[i % len(sizes)] - 28))
+        batch.append(build_udp_packet(f"10.1.{flow >> 8}.{flow & 0xFF}", "198.51.100.7",
+                                      20000 + flow, 443, payload))
+        if len(batch) >= 1024:
+            writer.send_batch(batch)
+            batch = []
+    writer.send_batch(batch)
+    writer.close()
+
+
+def run_throughput(config, make_backend, expected, repeat=1):
+    """Run ที่เร็วที่สุดใน repeat ครั้ง (make_backend() สร้าง backend ใหม่ทุกครั้ง)"""
+    config = dict(config, queue_expected_pps=200000, queue_overflow_policy='block')
+    elapsed, stats = min((run_pipeline(config, make_backend(), expected, settle_s=30)
+                          for _ in range(max(1, repeat))), key=lambda run: run[0])
+    processed = max(stats['processed'], 1)
+    return {
+        'packets': stats['processed'],
+        'pps': round(processed / elapsed),
+        'ns_per_packet': round(elapsed / processed * 1e9),
+        'dropped': stats['dropped'],
+        'overflow': stats['overflow'],
+    }
+
+
+def run_paced(config, pps, seconds):
+    count = int(pps * seconds)
+    backend = SyntheticBackend(flows=64, payload_size=200, pps=pps, count=count, record_latency=True)
+    config = dict(config, queue_expected_pps=int(pps), queue_overflow_policy='tail_drop')
+    _, stats = run_pipeline(config, backend, count, settle_s=30)
+    latency = stats['latency']
+    recv_to_send = [value * 1000.0 for value in backend.latencies]
+    return {
+        'offered_pps': pps,
+        'release_error_ms': latency['release_error_ms'],
+        'queue_delay_ms': latency['queue_delay_ms'],
+        'processing_ms': latency['processing_ms'],
+        'release_error_p99_ms': latency['release_error_ms']['p99'],
+        'recv_to_send_p50_ms': round(percentile(recv_to_send, 50), 3),
+        'recv_to_send_p99_ms': round(percentile(recv_to_send, 99), 3),
+        'overflow': stats['overflow'],
+    }
+
+
+def measure_queue_memory(config, count=MEMORY_PACKETS):
+    """(heap bytes ต่อ packet ที่ค้างใน delay queue, bytes ต่อ slot ที่ preallocate) หรือ (None, None)
+    ถ้า preset ไม่ queue อะไร
+
+    ใส่ batches ผ่าน _process_batch ตรง ๆ (ไม่ start engine จึงไม่มี release thread)
+    packets ถูกสร้างก่อน tracemalloc เริ่ม จึงนับแค่ที่ queue / scheduler / reorder ถือไว้;
+    tracemalloc เริ่มก่อนขยาย queue เป็น count slots ต่อทิศ ดังนั้น bytes ต่อ packet =
+    bytes ต่อ slot (slot table ต้องมีให้ทุก packet ที่ค้าง) + bytes ที่ enqueue เพิ่มต่อ packet
+    """
+    engine = NetworkImpairmentEngine()
+    config = dict(config, queue_max_bytes=count * 1500, queue_overflow_policy='tail_drop', flows_enabled=False)
+    engine.update_config(config)  # compile plan / lag tables ก่อน trace
+    backend = SyntheticBackend(flows=64, payload_size=200, count=count)
+    backend.open()
+    engine.backend = backend
+    batches = []
+    while not backend.exhausted:
+        batches.append(backend.recv_batch(64, 0))
+    shard = engine.shards[0]
+    slots_before = sum(len(queue._packets) for queue in shard.queues)
+    now = time.monotonic()
+
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    engine.update_config(dict(config, queue_max_packets=count))
+    sized = tracemalloc.get_traced_memory()[0]
+    for batch in batches:
+        engine._process_batch(shard, batch, now)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    slots = sum(len(queue._packets) for queue in shard.queues) - slots_before
+    queued = sum(len(queue) for queue in shard.queues) + shard.reorder.held
+    if not queued or not slots:
+        return None, None
+    per_slot = (sized - start) / slots
+    return round(per_slot + (after - sized) / queued, 1), round(per_slot, 1)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(baseline, current, threshold):
+    """พิมพ์ % เปลี่ยนแปลงต่อ (preset, traffic, metric) คืนจำนวน regressions ที่เกิน threshold"""
+    old_rows = {(row['preset'], row['traffic']): row for row in baseline['results']}
+    if baseline.get('schema') != current['schema']:
+        print(f"warning: schema differs (baseline {baseline.get('schema')!r}, current {current['schema']!r}); "
+              f"metric definitions may have changed", file=sys.stderr)
+    for key in ('packets', 'paced_pps', 'paced_seconds', 'pcap', 'machine', 'python'):
+        if baseline['meta'].get(key) != current['meta'].get(key):
+            print(f"warning: {key} differs (baseline {baseline['meta'].get(key)!r}, "
+                  f"current {current['meta'].get(key)!r}); results may not be comparable", file=sys.stderr)
+    regressions = 0
+    print(f"\n{'preset':<22}{'traffic':<11}{'metric':<24}{'baseline':>12}{'current':>12}{'change':>9}",
+          file=sys.stderr)
+    for row in current['results']:
+        old = old_rows.get((row['preset'], row['traffic']))
+        if old is None:
+            continue
+        for metric, (sign, floor) in METRICS.items():
+            before, after = old.get(metric), row.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100.0
+            worse = change * sign < -threshold and abs(after - before) > floor
+            regressions += worse
+            print(f"{row['preset']:<22}{row['traffic']:<11}{metric:<24}{before:>12,.1f}{after:>12,.1f}"
+                  f"{change:>+8.1f}%{'  REGRESSION' if worse else ''}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--presets', default=None, help='comma-separated examples.py names (default: all)')
+    parser.add_argument('--packets', type=int, default=50000, help='packets per throughput run')
+    parser.add_argument('--paced-pps', type=float, default=5000)
+    parser.add_argument('--paced-seconds', type=float, default=2.0)
+    parser.add_argument('--pcap', default=None, help='replay this pcap (default: generated IMIX pcap)')
+    parser.add_argument('--out', default=None, help='write JSON here (default: stdout)')
+    parser.add_argument('--compare', default=None, help='baseline JSON from an earlier run')
+    parser.add_argument('--threshold', type=float, default=20.0, help='regression threshold in percent')
+    parser.add_argument('--repeat', type=int, default=1, help='throughput runs per preset (best is kept)')
+    args = parser.parse_args()
+
+    presets = load_presets(args.presets.split(',') if args.presets else None)
+    with tempfile.TemporaryDirectory() as tmp:
+        pcap_path = args.pcap
+        if pcap_path is None:
+            pcap_path = os.path.join(tmp, 'imix.pcap')
+            write_imix_pcap(pcap_path, args.packets)
+        reader = PcapBackend(read_path=pcap_path)
+        reader.open()
+        pcap_packets = len(reader.records)
+        reader.close()
+        results = []
+        for name, config in presets.items():
+            print(f"[{name}]", file=sys.stderr)
+            row = {'preset': name, 'traffic': 'synthetic'}
+            row.update(run_throughput(config, lambda: SyntheticBackend(flows=64, payload_size=64, count=args.packets),
+                                      args.packets, args.repeat))
+            row['queue_bytes_per_packet'], row['queue_slot_bytes'] = measure_queue_memory(config)
+            results.append(row)
+
+            row = {'preset': name, 'traffic': 'pcap'}
+            row.update(run_throughput(config, lambda: PcapBackend(read_path=pcap_path), pcap_packets, args.repeat))
+            results.append(row)
+
+            row = {'preset': name, 'traffic': 'paced'}
+            row.update(run_paced(config, args.paced_pps, args.paced_seconds))
+            results.append(row)
+
+    report = {
+        'schema': SCHEMA,
+        'meta': {
+            'revision': git_revision(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'packets': args.packets,
+            'paced_pps': args.paced_pps,
+            'paced_seconds': args.paced_seconds,
+            'repeat': args.repeat,
+            'pcap': args.pcap or 'generated-imix',
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    print(f"\n{'preset':<22}{'traffic':<11}{'pps':>10}{'ns/pkt':>9}{'B/queued':>10}{'B/slot':>8}"
+          f"{'rel.err p99':>13}{'recv->send p99':>16}", file=sys.stderr)
+    for row in results:
+        if row['traffic'] == 'paced':
+            print(f"{row['preset']:<22}{row['traffic']:<11}{row['offered_pps']:>10,.0f}{'':>27}"
+                  f"{row['release_error_p99_ms']:>10.3f} ms{row['recv_to_send_p99_ms']:>13.3f} ms", file=sys.stderr)
+            continue
+        memory = row.get('queue_bytes_per_packet')
+        slot = row.get('queue_slot_bytes')
+        print(f"{row['preset']:<22}{row['traffic']:<11}{row['pps']:>10,}{row['ns_per_packet']:>9,}"
+              f"{'' if memory is None else f'{memory:,.0f}':>10}{'' if slot is None else f'{slot:,.0f}':>8}",
+              file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
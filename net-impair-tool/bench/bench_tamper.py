@@ -0,0 +1,93 @@
+"""
+Tamper and duplicate cost: copy-based (payload copy + full checksum) vs in-place
+bit flip with RFC 1624 incremental checksum, and packet.copy() vs shared duplicates
+
+Usage: python bench/bench_tamper.py [--payload 1200] [--packets 100000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corruption import Corruptor
+from packets import build_udp_packet
+
+
+def tamper_copy(packet, rng):
+    """แบบเดิม: copy payload -> bytearray -> flip -> bytes -> setter -> checksum ทั้ง packet"""
+    payload = bytearray(packet.payload)
+    payload[rng.randint(0, len(payload) - 1)] ^= 0x01
+    packet.payload = bytes(payload)
+    packet.recalculate_checksums()
+
+
+def measure(fn, packets, rng, keep: bool):
+    """(ns/packet, allocated blocks ที่ยังอยู่ต่อ packet, peak bytes ต่อ op)"""
+    out = [] if keep else None
+    start = time.perf_counter()
+    for packet in packets:
+        result = fn(packet, rng)
+        if keep:
+            out.append(result)
+    ns = (time.perf_counter() - start) / len(packets) * 1e9
+
+    sample = packets[:1000]
+    retained = [] if keep else None
+    blocks = sys.getallocatedblocks()
+    for packet in sample:
+        result = fn(packet, rng)
+        if keep:
+            retained.append(result)
+    blocks = (sys.getallocatedblocks() - blocks) / len(sample)
+
+    tracemalloc.start()
+    peak = 0
+    for packet in sample[:200]:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn(packet, rng)
+        peak += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return ns, blocks, peak / 200
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--payload', type=int, default=1200)
+    parser.add_argument('--packets', type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    template = build_udp_packet("10.0.0.1", "192.0.2.1", 40000, 27015,
+                                bytes(rng.getrandbits(8) for _ in range(args.payload)))
+    packets = [template.copy() for _ in range(min(args.packets, 20000))]
+    packets = (packets * (args.packets // len(packets) + 1))[:args.packets]
+
+    def mode(corruptor):
+        if corruptor.per_bit:
+            return lambda p, r: corruptor.corrupt_stream([p], r)
+        return lambda p, r: corruptor.corrupt([p], [0], r)
+
+    rows = [
+        ('tamper: copy + full checksum', tamper_copy, False),
+        ('tamper: in-place + RFC 1624', mode(Corruptor('bitflip')), False),
+        ('corrupt: ber 1e-5', mode(Corruptor('ber', ber=1e-5)), False),
+        ('corrupt: burst 8 bytes', mode(Corruptor('burst', burst_bytes=8)), False),
+        ('corrupt: header ttl+dscp', mode(Corruptor('header', ttl=1, dscp=46)), False),
+        ('duplicate: packet.copy()', lambda p, r: p.copy(), True),
+        ('duplicate: shared reference', lambda p, r: p, True),
+    ]
+    print(f"payload={args.payload} bytes packets={args.packets}")
+    print(f"{'':<32}{'ns/packet':>10}{'blocks/pkt':>12}{'peak B/op':>11}")
+    for name, fn, keep in rows:
+        ns, blocks, peak = measure(fn, packets, rng, keep)
+        print(f"{name:<32}{ns:>10,.0f}{blocks:>12.1f}{peak:>11,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Trace export cost: TraceRing.record per packet, writer drain per record, and the
+pipeline with tracing off/on at a fixed offered load and at max rate
+
+Usage: python bench/bench_trace.py [--pps 50000] [--packets 200000] [--preset POOR_WIFI]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import examples
+from backends import SyntheticBackend
+from bench_pipeline import run_pipeline
+from tracing import VERDICT_QUEUED, TraceRing, TraceWriter
+
+
+def bench_record(batch: int, rounds: int = 2000):
+    """ns/packet ของ record() และ ของ writer drain"""
+    backend = SyntheticBackend(flows=64, payload_size=64)
+    backend.open()
+    packets = backend.recv_batch(batch, 0)
+    delays = [12.5] * len(packets)
+    ring = TraceRing(1 << 20)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        ring.record(packets, delays, VERDICT_QUEUED, 1.0)
+    record_ns = (time.perf_counter() - start) / (rounds * batch) * 1e9
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.pcapng')
+    writer = TraceWriter(path, lambda: [ring])
+    writer._pcap = open(path, 'wb')
+    writer._sidecar = open(os.path.splitext(path)[0] + '.trace', 'wb')
+    start = time.perf_counter()
+    writer._drain()
+    drain_ns = (time.perf_counter() - start) / (rounds * batch) * 1e9
+    writer._pcap.close()
+    writer._sidecar.close()
+    return record_ns, drain_ns
+
+
+def bench_pipeline(config, pps: float, packets: int):
+    """(capture+effects ns/packet, processing p50/p99 ms, stats)"""
+    backend = SyntheticBackend(flows=64, payload_size=64, pps=pps, count=packets)
+    elapsed, stats = run_pipeline(config, backend, packets)
+    processing = stats['latency']['processing_ms']
+    return elapsed / packets * 1e9, processing['p50'], processing['p99'], stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pps', type=float, default=50000)
+    parser.add_argument('--packets', type=int, default=200000)
+    parser.add_argument('--preset', default='POOR_WIFI')
+    args = parser.parse_args()
+
+    record_ns, drain_ns = bench_record(64)
+    budget_ns = 1e9 / args.pps
+    print(f"record (hot path): {record_ns:,.0f} ns/packet ({record_ns / budget_ns:.1%} of the "
+          f"{budget_ns:,.0f} ns budget at {args.pps:,.0f} pps)   writer drain: {drain_ns:,.0f} ns/record")
+
+    base = dict(getattr(examples, args.preset))
+    base.update(queue_expected_pps=int(args.pps), queue_overflow_policy='block')
+    traced = dict(base, trace_enabled=True, trace_file=os.path.join(tempfile.mkdtemp(), 'run.pcapng'))
+    for pps, label in ((args.pps, f"{args.pps:,.0f} pps"), (0, "max rate")):
+        print(f"preset={args.preset} {label} packets={args.packets}")
+        results = {}
+        for name, config in (('trace off', base), ('trace on', traced)):
+            ns, p50, p99, stats = bench_pipeline(config, pps, args.packets)
+            results[name] = ns
+            print(f"  {name:<10} {1e9 / ns:>9,.0f} pps  processing p50={p50:.3f} p99={p99:.3f} ms  "
+                  f"trace lost={stats['trace_lost']}")
+        if not pps:
+            overhead = results['trace on'] / results['trace off'] - 1.0
+            print(f"  tracing overhead at max rate: {overhead:+.1%} ns/packet")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Sharded pipeline scaling: unpaced synthetic traffic through 1/2/4/8 workers
+Scaling beyond one core requires a free-threaded (no-GIL) Python build
+
+Usage: python bench/bench_workers.py [--workers 1,2,4,8] [--packets 200000] [--preset POOR_WIFI]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import examples
+from backends import SyntheticBackend
+from bench_pipeline import percentile, run_pipeline
+from network import _gil_disabled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4,8')
+    parser.add_argument('--packets', type=int, default=200000)
+    parser.add_argument('--flows', type=int, default=1024)
+    parser.add_argument('--preset', default='POOR_WIFI', help='config dict name in examples.py')
+    args = parser.parse_args()
+
+    base = dict(getattr(examples, args.preset)) if args.preset else {}
+    print(f"preset={args.preset} python={sys.version.split()[0]} "
+          f"GIL={'disabled' if _gil_disabled() else 'enabled'}")
+    print(f"{'workers':>8}{'pps':>12}{'speedup':>9}{'CPU us/pkt':>12}{'lat p99 ms':>12}")
+    baseline = None
+    for workers in (int(w) for w in args.workers.split(',')):
+        backend = SyntheticBackend(flows=args.flows, count=args.packets, record_latency=True)
+        config = dict(base, workers=workers, queue_expected_pps=200000,
+                      queue_overflow_policy='block')
+        cpu0 = time.process_time()
+        elapsed, stats = run_pipeline(config, backend, args.packets)
+        cpu = time.process_time() - cpu0
+        pps = stats['processed'] / elapsed
+        baseline = baseline or pps
+        latencies = [lat * 1000.0 for lat in backend.latencies]
+        print(f"{workers:>8}{pps:>12,.0f}{pps / baseline:>8.2f}x"
+              f"{cpu / max(stats['processed'], 1) * 1e6:>12.2f}{percentile(latencies, 99):>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Preallocated, size-classed packet buffers and GC pause instrumentation
+Offline backends (synthetic / pcap) fill pooled packets on receive; the engine returns
+them on send or drop, so steady-state traffic allocates no new objects per packet
+"""
+
+import gc
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Tuple
+
+from counters import StatCounters
+from histogram import LatencyHistogram, summarize
+from packets import SimPacket
+
+SIZE_CLASSES = (128, 256, 512, 1024, 2048)  # bytes; packets ใหญ่กว่านี้ allocate ตามปกติ
+POOL_MAX_FREE = 8192  # buffers ที่เก็บไว้ได้ต่อ size class (เกินนี้ปล่อยให้ GC)
+
+POOL_STAT_NAMES = ('acquired', 'allocated', 'oversize', 'recycled', 'discarded')
+P_ACQUIRED, P_ALLOCATED, P_OVERSIZE, P_RECYCLED, P_DISCARDED = range(len(POOL_STAT_NAMES))
+
+
+class PooledPacket(SimPacket):
+    """SimPacket ที่ raw ชี้เข้า buffer ของ pool
+
+    view: memoryview ขนาดเท่า packet ล่าสุด (ใช้ซ้ำถ้า packet ถัดไปยาวเท่ากัน จึงไม่สร้าง
+    memoryview ใหม่); refs: references ที่ยังค้างใน pipeline (duplicates เพิ่ม);
+    size_class -1 = ใหญ่เกิน SIZE_CLASSES ไม่กลับเข้า pool
+    """
+
+    __slots__ = ('buffer', 'view', 'size_class', 'refs')
+
+    def __init__(self, size: int, size_class: int):
+        self.buffer = memoryview(bytearray(size))
+        self.view = self.buffer
+        self.size_class = size_class
+        self.refs = 0
+        super().__init__(self.buffer, True, 0.0)
+
+
+class BufferPool:
+    """Free lists ของ PooledPacket ต่อ size class
+
+    - acquire_batch(): copy bytes ลง buffer ของ class เล็กสุดที่พอ (ไม่มีในคิว = allocate ใหม่)
+    - retain(): duplicate copies อ้าง packet object เดิม จึงเพิ่ม refs แทนการ copy
+    - release(): ลด refs ต่อ reference ที่ส่ง/ทิ้งแล้ว ครบ 0 กลับเข้า free list
+    acquire มาจาก capture thread เดียว ส่วน release มาจาก release threads และ capture/worker
+    (drops) list.append/pop เป็น atomic จึงไม่ต้อง lock; refs -= 1 จากสอง threads พร้อมกัน
+    อาจหายหนึ่งครั้ง ผลคือ packet นั้นไม่กลับ pool (GC เก็บไปแทน) ไม่มีทางกลับก่อนเวลา
+    เพราะ retain เกิดก่อน packet ถูกส่งต่อให้ thread อื่น
+    recycle=False (ระหว่าง trace: ring ถือ references ไว้ตัด bytes ทีหลัง) release ไม่คืนอะไรเลย
+    """
+
+    def __init__(self, max_free: int = POOL_MAX_FREE, size_classes: Tuple[int, ...] = SIZE_CLASSES):
+        self.sizes = tuple(sorted(size_classes))
+        self.max_free = max(0, int(max_free))
+        self.recycle = True
+        self.counters = StatCounters(POOL_STAT_NAMES)
+        self._free: List[List[PooledPacket]] = [[] for _ in self.sizes]
+        # length -> size class (list index แทน bisect ทุก packet)
+        self._class_of = [next(i for i, size in enumerate(self.sizes) if size >= length)
+                          for length in range(self.sizes[-1] + 1)]
+
+    def acquire_batch(self, items: Iterable[Tuple[Any, bool]], timestamp: float) -> List[PooledPacket]:
+        """Packets จาก (bytes, is_outbound) ทั้ง batch"""
+        free = self._free
+        sizes = self.sizes
+        class_of = self._class_of
+        limit = len(class_of)
+        allocated = 0
+        oversize = 0
+        batch = []
+        for data, is_outbound in items:
+            length = len(data)
+            if length < limit:
+                size_class = class_of[length]
+                bucket = free[size_class]
+                if bucket:
+                    packet = bucket.pop()
+                else:
+                    packet = PooledPacket(sizes[size_class], size_class)
+                    allocated += 1
+            else:
+                packet = PooledPacket(length, -1)
+                oversize += 1
+            view = packet.view
+            if len(view) != length:
+                view = packet.view = packet.buffer[:length]
+            view[:] = data
+            packet.raw = view
+            packet.is_outbound = is_outbound
+            packet.timestamp = timestamp
+            packet.bad_checksum = False
+            packet.refs = 1
+            batch.append(packet)
+        c = self.counters.slot()
+        c[P_ACQUIRED] += len(batch)
+        c[P_ALLOCATED] += allocated
+        c[P_OVERSIZE] += oversize
+        return batch
+
+    def retain(self, packets: Iterable, count: int = 1):
+        """เพิ่ม references (duplicate copies ที่อ้าง object เดิม)"""
+        for packet in packets:
+            try:
+                packet.refs += count
+            except AttributeError:
+                continue  # ไม่ได้มาจาก pool
+
+    def release(self, packets: Iterable):
+        """คืน references ของ packets ที่ส่งหรือทิ้งแล้ว"""
+        if not self.recycle:
+            return
+        free = self._free
+        max_free = self.max_free
+        recycled = 0
+        discarded = 0
+        for packet in packets:
+            try:
+                refs = packet.refs - 1
+            except AttributeError:
+                continue
+            packet.refs = refs
+            if refs:
+                continue
+            size_class = packet.size_class
+            if size_class >= 0 and len(free[size_class]) < max_free:
+                free[size_class].append(packet)
+                recycled += 1
+            else:
+                discarded += 1
+        if recycled or discarded:
+            c = self.counters.slot()
+            c[P_RECYCLED] += recycled
+            c[P_DISCARDED] += discarded
+
+    def snapshot(self, reset: bool = False) -> Dict[str, Any]:
+        """Counters + hit rate และจำนวน buffers ว่างต่อ size class (reset=True: reset แบบ atomic)"""
+        stats = self.counters.snapshot_and_reset() if reset else self.counters.snapshot()
+        acquired = stats['acquired']
+        stats['hit_rate'] = round(1.0 - (stats['allocated'] + stats['oversize']) / acquired, 4) if acquired else 0.0
+        stats['free'] = {size: len(bucket) for size, bucket in zip(self.sizes, self._free)}
+        stats['recycle'] = self.recycle
+        return stats
+
+
+class GcMonitor:
+    """GC pauses ของทั้ง process ผ่าน gc.callbacks
+
+    นับ collections และ objects ที่เก็บได้ต่อ generation, เวลาหยุดรวม และ histogram ของ
+    pause (rolling window เหมือน latency histograms) ไว้เทียบกับ release_error ว่า jitter
+    ตามจังหวะ GC หรือไม่; callbacks ถูกเรียกทีละครั้ง (collector ทำงานทีละ thread)
+    จึงเขียน histogram ได้โดยไม่ต้อง lock
+    """
+
+    def __init__(self, window_s: float = 10.0, slices: int = 10):
+        self.pauses = LatencyHistogram(window_s, slices)
+        self.collections = [0, 0, 0]
+        self.collected = [0, 0, 0]
+        self.pause_s = [0.0, 0.0, 0.0]
+        self._started = 0.0
+        self._active = False
+
+    def start(self):
+        if not self._active:
+            gc.callbacks.append(self._callback)
+            self._active = True
+
+    def stop(self):
+        if self._active:
+            gc.callbacks.remove(self._callback)
+            self._active = False
+
+    def _callback(self, phase: str, info: Dict[str, int]):
+        if phase == 'start':
+            self._started = time.monotonic()
+            return
+        now = time.monotonic()
+        generation = info['generation']
+        self.collections[generation] += 1
+        self.collected[generation] += info['collected']
+        self.pause_s[generation] += now - self._started
+        self.pauses.record_elapsed(now, [self._started])
+
+    def reset(self):
+        self.collections = [0, 0, 0]
+        self.collected = [0, 0, 0]
+        self.pause_s = [0.0, 0.0, 0.0]
+        self.pauses.reset()
+
+    def snapshot(self, now: float = None) -> Dict[str, Any]:
+        """Counters ต่อ generation + pause percentiles (ms) ใน window ล่าสุด"""
+        return {
+            'collections': list(self.collections),
+            'collected': list(self.collected),
+            'pause_total_ms': [round(seconds * 1000.0, 3) for seconds in self.pause_s],
+            'pause_ms': summarize([self.pauses], now),
+            'pending': gc.get_count()[0],  # container allocations - deallocations ตั้งแต่ gen0 ครั้งล่าสุด
+            'allocated_blocks': sys.getallocatedblocks(),
+        }
@@ -0,0 +1,200 @@
+"""
+Packet corruption modes สำหรับ tamper stage
+Bit flips, bit-error rate, burst errors, header rewrites and truncation applied
+in place, with IPv4 header / TCP / UDP checksums patched incrementally (RFC 1624)
+"""
+
+import math
+from typing import List, Optional
+
+from packets import IPPROTO_TCP, flip_bits, ones_sum, patch_checksum, transport_layout
+
+CORRUPTION_MODES = ('bitflip', 'ber', 'burst', 'header', 'truncate')
+
+
+def _set_word(raw, offset: int, value: int, checksum_offset: int = -1, is_udp: bool = False):
+    """เขียน 16-bit word ที่ offset (คู่) แล้ว patch checksum ที่ครอบคลุม word นี้"""
+    old = (raw[offset] << 8) | raw[offset + 1]
+    if old == value:
+        return
+    raw[offset] = value >> 8
+    raw[offset + 1] = value & 0xFF
+    if checksum_offset >= 0:
+        patch_checksum(raw, checksum_offset, old, value, is_udp)
+
+
+class Corruptor:
+    """ทำ corruption mode หนึ่งกับ packets แบบ in-place (immutable หลังสร้าง, ใช้ร่วมทุก shard)
+
+    - bitflip: flip 1 bit ที่ตำแหน่งสุ่มใน payload ของ packet ที่โดน (tamper_chance)
+    - ber: ทุก packet, แต่ละ bit ของ payload ผิดด้วยความน่าจะเป็น ber; สุ่มระยะห่าง
+      (geometric) ถึง bit ผิดถัดไปต่อเนื่องข้าม packets จึง draw หนึ่งครั้งต่อ error
+      และ packet ที่ไม่โดนไม่ถูกแตะเลย
+    - burst: bytes ติดกัน burst_bytes ตัวจาก offset สุ่มถูก XOR ด้วยค่าสุ่มไม่เป็น 0
+    - header: ตั้ง TTL/hop limit, DSCP (คง ECN) และ TCP window เป็นค่าที่กำหนด (-1 = ไม่แก้)
+    - truncate: ตัด payload เหลือความยาวสุ่ม (แก้ length fields ด้วย)
+    keep_bad_checksum: ไม่ patch checksums และตั้ง packet.bad_checksum ให้ backend
+    ส่งออกไปทั้งที่ checksum ผิด (ทดสอบ receiver validation)
+    """
+
+    def __init__(self, mode: str = 'bitflip', ber: float = 0.0, burst_bytes: int = 8,
+                 ttl: int = -1, dscp: int = -1, tcp_window: int = -1,
+                 keep_bad_checksum: bool = False):
+        if mode not in CORRUPTION_MODES:
+            raise ValueError(f"Unknown tamper mode: {mode}")
+        self.mode = mode
+        self.ber = min(max(float(ber), 0.0), 1.0)
+        self.burst_bytes = max(1, int(burst_bytes))
+        self.ttl = int(ttl)
+        self.dscp = int(dscp)
+        self.tcp_window = int(tcp_window)
+        self.keep_bad_checksum = keep_bad_checksum
+        self._apply = getattr(self, f'_{mode}')
+
+    @property
+    def per_bit(self) -> bool:
+        """True = ทุก packet (ber) แทนที่จะเลือก packets ด้วย tamper_chance"""
+        return self.mode == 'ber'
+
+    def corrupt(self, packets: List, hit: List[int], rng, changed: Optional[List[int]] = None) -> int:
+        """Corrupt packets ที่ indices hit คืนจำนวนที่ถูกแก้จริง (indices ต่อท้ายใน changed ถ้าให้มา)"""
+        apply = self._apply
+        count = 0
+        for i in hit:
+            packet = packets[i]
+            try:
+                if not apply(packet, rng):
+                    continue
+            except IndexError:
+                continue  # packet สั้นผิดปกติ (header ไม่ครบ)
+            count += 1
+            if changed is not None:
+                changed.append(i)
+            if self.keep_bad_checksum:
+                packet.bad_checksum = True
+        return count
+
+    def corrupt_stream(self, packets: List, rng, changed: Optional[List[int]] = None) -> int:
+        """BER: bit errors ตามระยะห่าง geometric ต่อเนื่องทั้ง batch คืนจำนวน packets ที่โดน"""
+        ber = self.ber
+        if ber <= 0.0:
+            return 0
+        log = math.log
+        rand = rng.random
+        log_q = log(1.0 - ber) if ber < 1.0 else -math.inf
+        keep_bad = self.keep_bad_checksum
+        gap = int(log(1.0 - rand()) / log_q)
+        count = 0
+        for index, packet in enumerate(packets):
+            raw = packet.raw
+            try:
+                start, checksum_offset, is_udp = transport_layout(raw)
+            except IndexError:
+                continue
+            bits = (len(raw) - start) * 8
+            if gap >= bits:
+                gap -= bits
+                continue
+            if keep_bad:
+                checksum_offset = -1
+                packet.bad_checksum = True
+            while gap < bits:
+                flip_bits(raw, start + (gap >> 3), 0x80 >> (gap & 7), checksum_offset, is_udp)
+                gap += 1 + int(log(1.0 - rand()) / log_q)
+            gap -= bits
+            count += 1
+            if changed is not None:
+                changed.append(index)
+        return count
+
+    def _bitflip(self, packet, rng) -> bool:
+        raw = packet.raw
+        start, checksum_offset, is_udp = transport_layout(raw)
+        if start >= len(raw):
+            return False
+        if self.keep_bad_checksum:
+            checksum_offset = -1
+        flip_bits(raw, rng.randrange(start, len(raw)), 0x01, checksum_offset, is_udp)
+        return True
+
+    def _ber(self, packet, rng) -> bool:
+        # ber ใช้ corrupt_stream ทั้ง batch; corrupt() ทีละ packet = bitflip
+        return self._bitflip(packet, rng)
+
+    def _burst(self, packet, rng) -> bool:
+        raw = packet.raw
+        start, checksum_offset, is_udp = transport_layout(raw)
+        end = len(raw)
+        if start >= end:
+            return False
+        if self.keep_bad_checksum:
+            checksum_offset = -1
+        first = rng.randrange(start, end)
+        last = min(end, first + self.burst_bytes)
+        odd = bool(first & 1)
+        if checksum_offset >= 0:
+            old_sum = ones_sum(raw[first:last], odd)
+        noise = rng.getrandbits(8 * (last - first)).to_bytes(last - first, 'big')
+        for index, value in enumerate(noise, first):
+            raw[index] ^= value or 0xFF
+        if checksum_offset >= 0:
+            # patch ครั้งเดียวด้วยผลต่างของผลรวมช่วงที่เปลี่ยน (RFC 1624 ใช้กับผลรวมหลาย words ได้)
+            patch_checksum(raw, checksum_offset, old_sum, ones_sum(raw[first:last], odd), is_udp)
+        return True
+
+    def _header(self, packet, rng) -> bool:
+        raw = packet.raw
+        keep_bad = self.keep_bad_checksum
+        changed = False
+        if raw[0] >> 4 == 6:
+            ihl = 40
+            protocol = raw[6]
+            if self.ttl >= 0:
+                raw[7] = self.ttl & 0xFF
+                changed = True
+            if self.dscp >= 0:
+                # Traffic class = low nibble ของ byte 0 + high nibble ของ byte 1; DSCP = 6 bits บน
+                tclass = ((raw[0] & 0x0F) << 4) | (raw[1] >> 4)
+                tclass = ((self.dscp & 0x3F) << 2) | (tclass & 0x03)
+                raw[0] = (raw[0] & 0xF0) | (tclass >> 4)
+                raw[1] = ((tclass & 0x0F) << 4) | (raw[1] & 0x0F)
+                changed = True
+        else:
+            ihl = (raw[0] & 0x0F) * 4
+            protocol = raw[9]
+            ip_checksum = -1 if keep_bad else 10
+            if self.ttl >= 0:
+                _set_word(raw, 8, ((self.ttl & 0xFF) << 8) | raw[9], ip_checksum)
+                changed = True
+            if self.dscp >= 0:
+                tos = ((self.dscp & 0x3F) << 2) | (raw[1] & 0x03)
+                _set_word(raw, 0, (raw[0] << 8) | tos, ip_checksum)
+                changed = True
+        if self.tcp_window >= 0 and protocol == IPPROTO_TCP and len(raw) >= ihl + 18:
+            _set_word(raw, ihl + 14, self.tcp_window & 0xFFFF, -1 if keep_bad else ihl + 16)
+            changed = True
+        return changed
+
+    def _truncate(self, packet, rng) -> bool:
+        raw = packet.raw
+        start, checksum_offset, is_udp = transport_layout(raw)
+        old_len = len(raw)
+        if start >= old_len:
+            return False
+        new_len = rng.randrange(start, old_len)
+        keep_bad = self.keep_bad_checksum
+        if raw[0] >> 4 == 6:
+            ihl = 40
+            _set_word(raw, 4, new_len - 40)
+        else:
+            ihl = (raw[0] & 0x0F) * 4
+            _set_word(raw, 2, new_len, -1 if keep_bad else 10)
+        if checksum_offset >= 0 and not keep_bad:
+            # ตัด bytes ท้าย = ลบผลรวมของมันออก; length ใน pseudo header เปลี่ยนด้วย
+            removed = ones_sum(raw[new_len:old_len], odd_start=bool(new_len & 1))
+            patch_checksum(raw, checksum_offset, removed, 0, is_udp)
+            patch_checksum(raw, checksum_offset, old_len - ihl, new_len - ihl, is_udp)
+        if is_udp:
+            _set_word(raw, ihl + 4, new_len - ihl, -1 if keep_bad else checksum_offset, True)
+        packet.raw = raw[:new_len]
+        return True
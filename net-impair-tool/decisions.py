@@ -0,0 +1,108 @@
+"""
+Batch decision engine สำหรับ effects (drop/duplicate/tamper/delay)
+Draws the random decisions for a whole receive batch at once, seedable for reproducible runs
+"""
+
+import math
+import random
+import weakref
+from typing import List, Optional
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+# Geometric gap ถูกกว่าการสุ่มทีละ packet เมื่อ p ต่ำและ batch ใหญ่พอ
+# (หนึ่ง gap draw ราคา ~4 เท่าของ rand() < p; ดู bench/bench_decisions.py)
+GAP_SAMPLING_MAX_P = 0.2
+GAP_SAMPLING_MIN_BATCH = 16
+
+# numpy มี overhead ต่อ call คงที่ ใช้เฉพาะ batch ที่ใหญ่พอ
+NUMPY_MIN_BATCH = 256
+
+
+class DecisionEngine:
+    """แหล่งสุ่มของ shard หนึ่ง: คืนผลการตัดสินใจของทั้ง batch ในครั้งเดียว
+
+    - hits(n, p): indices (เรียงจากน้อยไปมาก) ของ packets ที่โดน effect ความน่าจะเป็น p
+      ไม่มี numpy จะใช้ geometric gap sampling: สุ่มระยะห่างถึง hit ถัดไป
+      แทนการสุ่มทุก packet จึงใช้ random draws ~n·p ครั้งแทน n ครั้ง
+      (memoryless จึงไม่ต้องจำ gap ข้าม batch)
+    - uniform(k, scale): k ค่าใน [0, scale) สำหรับ random delay ของ packets ที่โดน
+    - take(table, n): n ค่าถัดไปจาก table ที่ precompute ไว้ (เช่น delaymodels)
+      แบบวนรอบ cursor แยกต่อ table ต่อ shard; เริ่มที่ offset สุ่ม cursor ถูกลบเมื่อ
+      table ถูกเก็บ (weakref) tables ที่สร้างใหม่ทุกครั้งที่ apply config จึงไม่สะสม
+    - rng: random.Random ตัวเดียวกัน สำหรับ draw อื่น ๆ (เช่นตำแหน่ง byte ที่ tamper)
+
+    seed เดียวกัน + batch sizes เดียวกันให้ผลเหมือนเดิมทุกครั้ง
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.np_rng = np.random.default_rng(seed) if HAS_NUMPY else None
+        self._cursors = {}  # id(table) -> (weakref ของ table, ตำแหน่งถัดไป)
+
+    def hits(self, n: int, p: float) -> List[int]:
+        """Indices ใน range(n) ที่ Bernoulli(p) สำเร็จ"""
+        if p <= 0.0 or n <= 0:
+            return []
+        if p >= 1.0:
+            return list(range(n))
+        if self.np_rng is not None and n >= NUMPY_MIN_BATCH:
+            return np.flatnonzero(self.np_rng.random(n) < p).tolist()
+
+        rand = self.rng.random
+        if p > GAP_SAMPLING_MAX_P or n < GAP_SAMPLING_MIN_BATCH:
+            return [i for i in range(n) if rand() < p]
+
+        log = math.log
+        log_q = log(1.0 - p)
+        out = []
+        i = int(log(1.0 - rand()) / log_q)
+        while i < n:
+            out.append(i)
+            i += 1 + int(log(1.0 - rand()) / log_q)
+        return out
+
+    def uniform(self, k: int, scale: float) -> List[float]:
+        """k ค่าสุ่มใน [0, scale)"""
+        if k <= 0:
+            return []
+        if self.np_rng is not None and k >= NUMPY_MIN_BATCH:
+            return (self.np_rng.random(k) * scale).tolist()
+        rand = self.rng.random
+        return [rand() * scale for _ in range(k)]
+
+    def take(self, table, n: int):
+        """n ค่าถัดไปของ table แบบวนรอบ (slice เดียวในกรณีปกติ)"""
+        size = len(table)
+        key = id(table)
+        entry = self._cursors.get(key)
+        if entry is not None and entry[0]() is table:
+            ref, pos = entry
+        else:
+            # table ใหม่ (หรือ id ที่ table เก่าเคยใช้): เริ่มที่ offset สุ่ม
+            ref = weakref.ref(table, self._forget(key))
+            pos = self.rng.randrange(size)
+        end = pos + n
+        if end <= size:
+            out = table[pos:end]
+        else:
+            out = table[pos:]
+            while len(out) < n:
+                out += table[:n - len(out)]
+        self._cursors[key] = (ref, end % size)
+        return out
+
+    def _forget(self, key: int):
+        """Callback ของ weakref: ลบ cursor เมื่อ table ถูกเก็บ (ถ้า id ยังไม่ถูกใช้ใหม่)"""
+        cursors = self._cursors
+
+        def forget(ref):
+            entry = cursors.get(key)
+            if entry is not None and entry[0] is ref:
+                cursors.pop(key, None)
+        return forget
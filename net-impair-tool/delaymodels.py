@@ -0,0 +1,90 @@
+"""
+Delay distributions สำหรับ lag stage (netem-style)
+Builds precomputed delay tables (uniform/normal/pareto/paretonormal with
+correlation, or a recorded trace) so the hot path only slices a table
+"""
+
+import functools
+import math
+import random
+from array import array
+from typing import List, Optional
+
+DELAY_MODELS = ('constant', 'uniform', 'normal', 'pareto', 'paretonormal', 'trace')
+
+# ขนาด table: sequence วนซ้ำทุก TABLE_SIZE packets (~13s ที่ 5000 pps) แต่ละ shard
+# เริ่มที่ offset สุ่มของตัวเอง
+TABLE_SIZE = 65536
+
+# Pareto alpha=3 (เหมือน netem): mean 1.5, variance 0.75
+PARETO_ALPHA = 3.0
+_PARETO_MEAN = PARETO_ALPHA / (PARETO_ALPHA - 1)
+_PARETO_SD = math.sqrt(PARETO_ALPHA / ((PARETO_ALPHA - 1) ** 2 * (PARETO_ALPHA - 2)))
+_PARETONORMAL_SD = math.sqrt(0.25 ** 2 + 0.75 ** 2)
+
+
+def load_trace(path: str) -> List[float]:
+    """อ่าน delays (ms) จากไฟล์: หนึ่งค่าต่อบรรทัด (คอลัมน์แรกถ้าเป็น CSV), # = comment"""
+    values = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            field = line.replace(',', ' ').split()[0]
+            try:
+                values.append(max(0.0, float(field)))
+            except ValueError:
+                continue  # header
+    if not values:
+        raise ValueError(f"No delay values in trace file: {path}")
+    return values
+
+
+def _standard_sampler(model: str, rng: random.Random):
+    """Sampler ที่คืนค่า mean 0 (sd 1 ยกเว้น uniform ซึ่งอยู่ใน [-1, 1))"""
+    if model == 'uniform':
+        return lambda: rng.random() * 2.0 - 1.0
+    if model == 'normal':
+        return lambda: rng.gauss(0.0, 1.0)
+    if model == 'pareto':
+        return lambda: (rng.paretovariate(PARETO_ALPHA) - _PARETO_MEAN) / _PARETO_SD
+    if model == 'paretonormal':
+        # netem: 1/4 normal + 3/4 pareto
+        return lambda: (0.25 * rng.gauss(0.0, 1.0)
+                        + 0.75 * (rng.paretovariate(PARETO_ALPHA) - _PARETO_MEAN) / _PARETO_SD
+                        ) / _PARETONORMAL_SD
+    raise ValueError(f"Unknown delay model: {model}")
+
+
+def build_table(model: str, mean_ms: float, jitter_ms: float, correlation: float = 0.0,
+                trace_path: str = '', seed: Optional[int] = None, size: int = TABLE_SIZE) -> array:
+    """Delay table (ms) ของ model
+
+    - uniform: mean ± jitter; normal/pareto/paretonormal: jitter คือ standard deviation
+    - correlation (0-1): AR(1) ระหว่าง packets ติดกัน s = ρ·s + √(1-ρ²)·x
+      (คง mean/variance ไว้) ค่าที่ได้ clip ที่ 0
+    - trace: ค่าจากไฟล์ตามลำดับ อ่านใหม่ทุกครั้ง (mean/jitter/correlation ไม่มีผล)
+    """
+    if model == 'trace':
+        return array('d', load_trace(trace_path))
+    if model == 'constant' or jitter_ms <= 0:
+        return array('d', [max(0.0, mean_ms)])
+    return _distribution_table(model, mean_ms, jitter_ms, correlation, seed, size)
+
+
+@functools.lru_cache(maxsize=16)
+def _distribution_table(model: str, mean_ms: float, jitter_ms: float, correlation: float,
+                        seed: Optional[int], size: int) -> array:
+    # Cache ตาม parameters เพราะการสร้าง table ใช้เวลาหลายสิบ ms
+    rng = random.Random(seed)
+    sample = _standard_sampler(model, rng)
+    rho = min(max(correlation, 0.0), 0.999)
+    innovation = math.sqrt(1.0 - rho * rho)
+    table = array('d', bytes(8 * size))
+    s = sample()
+    for i in range(size):
+        s = rho * s + innovation * sample() if rho else sample()
+        value = mean_ms + jitter_ms * s
+        table[i] = value if value > 0.0 else 0.0
+    return table
@@ -0,0 +1,242 @@
+"""
+Per-flow statistics สำหรับดูว่า connection ไหนโดน impairment เท่าไร
+Each shard owns a bounded flow table keyed by packets.flow_key (directional 5-tuple)
+with approximate-LRU order and idle expiry; all updates are O(1) per packet
+"""
+
+import heapq
+import ipaddress
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from packets import flow_key
+
+FLOW_TABLE_MAX = 131072  # flows ทั้ง engine (แบ่งเท่า ๆ กันต่อ shard)
+FLOW_IDLE_TIMEOUT_S = 60.0  # flow ที่ไม่มี packet นานกว่านี้ถูกลบ
+FLOW_RATE_WINDOW_S = 1.0  # rate = sliding window ประมาณจาก window ปัจจุบัน + ก่อนหน้า
+FLOW_EXPIRE_BATCH = 256  # idle flows ที่ลบได้สูงสุดต่อ batch (ไม่ให้ batch เดียวหน่วง)
+FLOW_SORT_KEYS = ('pps', 'bps', 'packets', 'bytes', 'dropped', 'duplicated', 'avg_delay_ms', 'last_seen')
+
+
+class FlowStats:
+    """Counters ของ flow เดียว (__slots__: ~15 fields ต่อ flow ไม่มี __dict__)
+
+    window: เลข rate window ปัจจุบัน (int(now / FLOW_RATE_WINDOW_S)); mark_*: packets/bytes
+    ตอนเริ่ม window นั้น (counts ของ window = packets - mark_packets จึงไม่ต้องนับซ้ำทุก packet)
+    prev_*: counts ของ window ก่อนหน้า (0 ถ้าไม่มี packet)
+    """
+
+    __slots__ = ('key', 'outbound', 'packets', 'bytes', 'dropped', 'duplicated', 'delayed',
+                 'delay_ms', 'first_seen', 'last_seen', 'window', 'mark_packets',
+                 'mark_bytes', 'prev_packets', 'prev_bytes')
+
+    def __init__(self, key: bytes, outbound: bool, now: float, window: int):
+        self.key = key
+        self.outbound = outbound
+        self.packets = 0
+        self.bytes = 0
+        self.dropped = 0
+        self.duplicated = 0
+        self.delayed = 0
+        self.delay_ms = 0.0
+        self.first_seen = now
+        self.last_seen = now
+        self.window = window
+        self.mark_packets = 0
+        self.mark_bytes = 0
+        self.prev_packets = 0
+        self.prev_bytes = 0
+
+    def roll(self, window: int):
+        """เริ่ม rate window ใหม่ (window ก่อนหน้าเก็บไว้ถ้าติดกัน)"""
+        if window == self.window + 1:
+            self.prev_packets = self.packets - self.mark_packets
+            self.prev_bytes = self.bytes - self.mark_bytes
+        else:
+            self.prev_packets = 0
+            self.prev_bytes = 0
+        self.window = window
+        self.mark_packets = self.packets
+        self.mark_bytes = self.bytes
+
+    def rates(self, now: float):
+        """(pps, bps) ประมาณ sliding window ยาว FLOW_RATE_WINDOW_S ที่จบตอน now"""
+        position = now / FLOW_RATE_WINDOW_S
+        window = int(position)
+        remaining = 1.0 - (position - window)  # ส่วนของ window ก่อนหน้าที่ยังอยู่ใน sliding window
+        packets = self.packets - self.mark_packets
+        nbytes = self.bytes - self.mark_bytes
+        if self.window == window:
+            packets += self.prev_packets * remaining
+            nbytes += self.prev_bytes * remaining
+        elif self.window == window - 1:
+            packets *= remaining
+            nbytes *= remaining
+        else:
+            return 0.0, 0.0
+        return packets / FLOW_RATE_WINDOW_S, nbytes * 8 / FLOW_RATE_WINDOW_S
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        pps, bps = self.rates(now)
+        return {
+            **describe_key(self.key),
+            'direction': 'outbound' if self.outbound else 'inbound',
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'dropped': self.dropped,
+            'duplicated': self.duplicated,
+            'delayed': self.delayed,
+            'avg_delay_ms': round(self.delay_ms / self.delayed, 3) if self.delayed else 0.0,
+            'pps': round(pps, 1),
+            'bps': round(bps),
+            'age_s': round(now - self.first_seen, 3),
+            'idle_s': round(now - self.last_seen, 3),
+        }
+
+
+def describe_key(key: bytes) -> Dict[str, Any]:
+    """flow_key bytes -> proto, src, dst, sport, dport (ports เป็น None ถ้าไม่ใช่ TCP/UDP)"""
+    alen = 4 if len(key) in (9, 13) else 16
+    ports = key[1 + 2 * alen:]
+    return {
+        'proto': {6: 'tcp', 17: 'udp', 1: 'icmp', 58: 'icmpv6'}.get(key[0], str(key[0])),
+        'src': str(ipaddress.ip_address(key[1:1 + alen])),
+        'dst': str(ipaddress.ip_address(key[1 + alen:1 + 2 * alen])),
+        'sport': (ports[0] << 8) | ports[1] if ports else None,
+        'dport': (ports[2] << 8) | ports[3] if ports else None,
+    }
+
+
+class FlowTable:
+    """Flow table ของ shard เดียว: writer เดียว (capture/worker thread ของ shard)
+
+    - flows: OrderedDict {flow_key: FlowStats} เรียงตาม window ที่เห็นล่าสุด (approximate LRU):
+      flow ถูกย้ายไปท้ายแค่ครั้งแรกที่เห็นใน rate window ใหม่ ไม่ใช่ทุก packet
+      ต้นตารางจึงเป็น flows ที่เงียบนานที่สุด; idle expiry และ eviction เมื่อเต็ม
+      pop จากต้นตารางได้ใน O(1)
+    - observe() ตอน packets เข้า: packets/bytes/rate/last_seen และจำ records ของ batch
+      ไว้ขนานกับ packets ให้ dropped/duplicated/queued ไม่ต้องคำนวณ flow_key ซ้ำ:
+      ถ้า stages คืน list เดิม (ไม่มี drop/duplicate) zip ตรง ๆ ได้เลย ไม่งั้นสร้าง
+      {id(packet): FlowStats} ครั้งเดียวต่อ batch (packets จาก batch ก่อน เช่นที่
+      reorder hold ไว้ ใช้ flow_key ตามปกติ)
+    - reader (API thread) copy list ของ records แล้วอ่าน fields เอง; ค่าอาจเหลื่อมกัน
+      ระหว่าง fields ได้เล็กน้อยแต่ไม่ต้อง lock บน hot path
+    """
+
+    def __init__(self, max_flows: int = FLOW_TABLE_MAX, idle_timeout_s: float = FLOW_IDLE_TIMEOUT_S):
+        self.max_flows = max(1, int(max_flows))
+        self.idle_timeout_s = float(idle_timeout_s)
+        self.flows: 'OrderedDict[bytes, FlowStats]' = OrderedDict()
+        self.evicted = 0  # ลบเพราะตารางเต็ม
+        self.expired = 0  # ลบเพราะ idle
+        self._packets: List = []  # batch ล่าสุดที่ observe (ถือ reference ไว้ ids จึงไม่ซ้ำ)
+        self._seen: List[FlowStats] = []  # record ของแต่ละ packet ใน _packets
+        self._by_id: Optional[Dict[int, FlowStats]] = None
+
+    def __len__(self):
+        return len(self.flows)
+
+    def observe(self, packets: List, outbound: bool, now: float):
+        """นับ packets ที่เข้ามาใน batch (ทิศเดียว) แล้วลบ idle flows ที่ต้นตาราง"""
+        flows = self.flows
+        get = flows.get
+        move = flows.move_to_end
+        window = int(now / FLOW_RATE_WINDOW_S)
+        seen = []
+        append = seen.append
+        for packet in packets:
+            raw = packet.raw
+            key = flow_key(raw)
+            flow = get(key)
+            if flow is None:
+                flow = self._insert(key, outbound, now, window)
+            elif flow.window != window:
+                flow.roll(window)
+                move(key)
+            flow.packets += 1
+            flow.bytes += len(raw)
+            flow.last_seen = now
+            append(flow)
+        self._packets = packets
+        self._seen = seen
+        self._by_id = None
+        self._expire(now)
+
+    def _insert(self, key: bytes, outbound: bool, now: float, window: int) -> FlowStats:
+        flows = self.flows
+        if len(flows) >= self.max_flows:
+            flows.popitem(last=False)
+            self.evicted += 1
+        flow = flows[key] = FlowStats(key, outbound, now, window)
+        return flow
+
+    def _expire(self, now: float):
+        flows = self.flows
+        deadline = now - self.idle_timeout_s
+        for _ in range(FLOW_EXPIRE_BATCH):
+            if not flows:
+                return
+            oldest = next(iter(flows.values()))
+            if oldest.last_seen >= deadline:
+                return
+            flows.popitem(last=False)
+            self.expired += 1
+
+    def _lookup(self, packets: Iterable) -> List[Optional[FlowStats]]:
+        """FlowStats ของแต่ละ packet (None ถ้า flow ถูกลบไปแล้ว)"""
+        if packets is self._packets:
+            return self._seen
+        by_id = self._by_id
+        if by_id is None:
+            by_id = self._by_id = dict(zip(map(id, self._packets), self._seen))
+        get = self.flows.get
+        out = []
+        for packet in packets:
+            flow = by_id.get(id(packet))
+            if flow is None:
+                flow = get(flow_key(packet.raw))
+            out.append(flow)
+        return out
+
+    def dropped(self, packets: List):
+        for flow in self._lookup(packets):
+            if flow is not None:
+                flow.dropped += 1
+
+    def duplicated(self, packets: List, count: int):
+        for flow in self._lookup(packets):
+            if flow is not None:
+                flow.duplicated += count
+
+    def queued(self, packets: List, delays: List[float]):
+        """Packets ที่เข้า delay queue พร้อม delay (ms) ที่ได้"""
+        for flow, delay in zip(self._lookup(packets), delays):
+            if flow is not None and delay > 0:
+                flow.delayed += 1
+                flow.delay_ms += delay
+
+    def records(self) -> List[FlowStats]:
+        """Copy ของ records ปัจจุบัน (เรียกจาก thread อื่นได้)"""
+        for _ in range(3):
+            try:
+                return list(self.flows.values())
+            except RuntimeError:
+                continue  # ตารางเปลี่ยนระหว่าง copy (free-threaded build) ลองใหม่
+        return []
+
+
+def top_flows(tables: Iterable[FlowTable], now: float, limit: int = 20,
+              sort: str = 'pps') -> List[Dict[str, Any]]:
+    """Flows ที่ค่า sort สูงสุด limit อันดับจากทุก shard"""
+    if sort not in FLOW_SORT_KEYS:
+        raise ValueError(f"Unknown flow sort key: {sort} (use one of {', '.join(FLOW_SORT_KEYS)})")
+    records = [flow for table in tables for flow in table.records()]
+    if sort in ('pps', 'bps'):
+        index = 0 if sort == 'pps' else 1
+        best = heapq.nlargest(limit, records, key=lambda flow: flow.rates(now)[index])
+    elif sort == 'avg_delay_ms':
+        best = heapq.nlargest(limit, records,
+                              key=lambda flow: flow.delay_ms / flow.delayed if flow.delayed else 0.0)
+    else:
+        best = heapq.nlargest(limit, records, key=lambda flow: getattr(flow, sort))
+    return [flow.to_dict(now) for flow in best]
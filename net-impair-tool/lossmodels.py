@@ -0,0 +1,227 @@
+"""
+Burst loss models สำหรับ drop stage
+Per-flow Gilbert-Elliott (two-state Markov) loss and loss-trace replay, with
+loss-burst-length statistics
+"""
+
+import functools
+import math
+import sys
+from typing import Dict, List
+
+LOSS_MODELS = ('bernoulli', 'gilbert_elliott', 'trace')
+
+# Per-flow state ต่อ model: ล้างทั้งก้อนเมื่อเต็ม
+FLOW_STATE_MAX = 65536
+
+NEVER = sys.maxsize
+
+# ขอบบนของแต่ละช่องใน burst length histogram (ช่องสุดท้ายคือ > 16)
+BURST_BUCKETS = (1, 2, 3, 4, 8, 16)
+BURST_LABELS = ('1', '2', '3', '4', '5-8', '9-16', '17+')
+
+
+def _gap_sampler(q: float):
+    """จำนวน packets ก่อน event ถัดไป (geometric) สำหรับความน่าจะเป็นต่อ packet q"""
+    if q <= 0.0:
+        return lambda rand: NEVER
+    if q >= 1.0:
+        return lambda rand: 0
+    log_q = math.log(1.0 - q)
+    log = math.log
+    return lambda rand: int(log(1.0 - rand()) / log_q)
+
+
+def load_loss_trace(path: str) -> bytes:
+    """อ่าน loss pattern: ตัวอักษร 0/1 (1 = lost) เว้นวรรค/comma/บรรทัดได้, # = comment"""
+    pattern = bytearray()
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.split('#', 1)[0]
+            pattern.extend(1 if ch == '1' else 0 for ch in line if ch in '01')
+    if not pattern:
+        raise ValueError(f"No loss pattern in trace file: {path}")
+    return bytes(pattern)
+
+
+class BurstStats:
+    """สถิติความยาว loss bursts (writer เดียวต่อ instance เช่น worker ของ shard)"""
+
+    __slots__ = ('buckets', 'count', 'packets', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * len(BURST_LABELS)
+        self.count = 0
+        self.packets = 0
+        self.max = 0
+
+    def record(self, length: int):
+        for i, bound in enumerate(BURST_BUCKETS):
+            if length <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.count += 1
+        self.packets += length
+        if length > self.max:
+            self.max = length
+
+    def reset(self):
+        self.buckets = [0] * len(BURST_LABELS)
+        self.count = 0
+        self.packets = 0
+        self.max = 0
+
+
+def summarize_bursts(stats_list: List[BurstStats]) -> Dict:
+    """รวม BurstStats หลายตัว (ทุก shard) เป็น dict สำหรับ /api/stats"""
+    buckets = [0] * len(BURST_LABELS)
+    count = packets = peak = 0
+    for stats in stats_list:
+        for i, n in enumerate(list(stats.buckets)):
+            buckets[i] += n
+        count += stats.count
+        packets += stats.packets
+        peak = max(peak, stats.max)
+    return {
+        'count': count,
+        'mean': round(packets / count, 2) if count else 0.0,
+        'max': peak,
+        'histogram': dict(zip(BURST_LABELS, buckets)),
+    }
+
+
+class GilbertElliott:
+    """Two-state (good/bad) Markov loss model ต่อ flow
+
+    p = P(good -> bad), r = P(bad -> good) ต่อ packet; loss_good / loss_bad =
+    ความน่าจะเป็นที่ packet หายในแต่ละ state (Gilbert: 0 / 1) ทุกค่าเป็น 0-1
+
+    แทนที่จะสุ่มทุก packet จะสุ่ม "อีกกี่ packets จะเปลี่ยน state" และ
+    "อีกกี่ packets จะหาย" แบบ geometric เมื่อเข้า state หรือหลังแต่ละ loss แล้วเก็บ
+    skip = จำนวน packets ก่อน event ถัดไป; packets ระหว่างนั้นเป็นแค่ลด skip และเปรียบเทียบ
+    State ต่อ flow: [skip, bad, until_switch, until_loss, burst]
+    """
+
+    def __init__(self, p: float, r: float, loss_good: float = 0.0, loss_bad: float = 1.0):
+        self.p = p
+        self.r = r
+        self.loss_good = loss_good
+        self.loss_bad = loss_bad
+        self._switch = (_gap_sampler(p), _gap_sampler(r))
+        self._loss = (_gap_sampler(loss_good), _gap_sampler(loss_bad))
+
+    @property
+    def expected_loss(self) -> float:
+        """Loss rate ระยะยาว (stationary)"""
+        if self.p + self.r <= 0:
+            return self.loss_good
+        bad = self.p / (self.p + self.r)
+        return (1 - bad) * self.loss_good + bad * self.loss_bad
+
+    def lost(self, keys: List[bytes], flows: Dict, rand, bursts: BurstStats) -> List[int]:
+        """Indices ของ packets (ตาม keys) ที่หาย พร้อมอัปเดต state ของแต่ละ flow"""
+        switch = self._switch
+        loss = self._loss
+        out = []
+        for i, key in enumerate(keys):
+            state = flows.get(key)
+            if state is None:
+                if len(flows) >= FLOW_STATE_MAX:
+                    flows.clear()
+                state = [0, 0, switch[0](rand), loss[0](rand), 0]
+                flows[key] = state
+            elif state[0]:
+                state[0] -= 1
+                continue
+
+            # Event: packet นี้หาย และ/หรือ state เปลี่ยนหลัง packet นี้
+            bad = state[1]
+            until_switch = state[2]
+            until_loss = state[3]
+            if until_loss:
+                until_loss -= 1
+            else:
+                out.append(i)
+                state[4] += 1
+                until_loss = loss[bad](rand)
+            if until_switch:
+                until_switch -= 1
+            else:
+                bad ^= 1
+                until_switch = switch[bad](rand)
+                until_loss = loss[bad](rand)
+            if until_loss and state[4]:
+                # packet ถัดไปไม่หาย: burst จบแล้ว
+                bursts.record(state[4])
+                state[4] = 0
+            skip = until_switch if until_switch < until_loss else until_loss
+            state[0] = skip
+            state[1] = bad
+            state[2] = until_switch - skip
+            state[3] = until_loss - skip
+        return out
+
+
+class LossTrace:
+    """Replay loss pattern (1 = lost) ต่อ flow: ทุก flow เริ่มที่ต้น pattern แล้ววนซ้ำ
+
+    State ต่อ flow: [position, burst]
+    """
+
+    def __init__(self, pattern: bytes):
+        self.pattern = pattern
+
+    @property
+    def expected_loss(self) -> float:
+        return sum(self.pattern) / len(self.pattern)
+
+    def lost(self, keys: List[bytes], flows: Dict, rand, bursts: BurstStats) -> List[int]:
+        pattern = self.pattern
+        size = len(pattern)
+        out = []
+        for i, key in enumerate(keys):
+            state = flows.get(key)
+            if state is None:
+                if len(flows) >= FLOW_STATE_MAX:
+                    flows.clear()
+                state = [0, 0]
+                flows[key] = state
+            pos = state[0]
+            if pattern[pos]:
+                out.append(i)
+                state[1] += 1
+            elif state[1]:
+                bursts.record(state[1])
+                state[1] = 0
+            state[0] = pos + 1 if pos + 1 < size else 0
+        return out
+
+
+@functools.lru_cache(maxsize=16)
+def _gilbert_elliott(p: float, r: float, loss_good: float, loss_bad: float) -> GilbertElliott:
+    # Cache ตาม parameters: apply config ใหม่ที่ค่าเดิมได้ object เดิม per-flow state จึงไม่ถูกล้าง
+    return GilbertElliott(p, r, loss_good, loss_bad)
+
+
+def _fraction(percent: float) -> float:
+    return min(max(float(percent), 0.0), 100.0) / 100.0
+
+
+def build_loss_model(cfg):
+    """Loss model ของ config (drop_model, drop_ge_*, drop_trace_file) หรือ None ถ้าเป็น bernoulli
+
+    trace อ่านไฟล์ใหม่ทุกครั้ง (ไฟล์อาจเปลี่ยน) จึงได้ object ใหม่และเริ่ม pattern ใหม่
+    """
+    model = cfg.drop_model
+    if model not in LOSS_MODELS:
+        raise ValueError(f"Unknown drop model: {model}")
+    if model == 'bernoulli':
+        return None
+    if model == 'trace':
+        if not cfg.drop_trace_file:
+            raise ValueError("drop_model=trace requires drop_trace_file")
+        return LossTrace(load_loss_trace(cfg.drop_trace_file))
+    return _gilbert_elliott(_fraction(cfg.drop_ge_p), _fraction(cfg.drop_ge_r),
+                            _fraction(cfg.drop_ge_loss_good), _fraction(cfg.drop_ge_loss_bad))
@@ -17,7 +17,7 @@ from pathlib import Path
 from functools import wraps
 
 # Import Flask สำหรับ HTTP server
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 import webview
 
 # Import pystray สำหรับ system tray
@@ -31,6 +31,8 @@ except ImportError:
 
 # Import network module
 from network import engine
+from streaming import StatsBroadcaster, STREAM_DEFAULT_HZ
+from scenario import Scenario, ScenarioRunner
 
 # Setup logging
 logging.basicConfig(
@@ -45,6 +47,12 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__, template_folder='templates', static_folder='static')
 
+# Producer เดียวของ /api/stats/stream ใช้ร่วมกันทุก client
+stats_broadcaster = StatsBroadcaster(engine.get_stats)
+
+# Timeline ของ config changes เล่นจาก thread ใน process (ไม่ผ่าน HTTP ต่อ step)
+scenario_runner = ScenarioRunner(engine)
+
 # CORS-like support สำหรับ local requests
 @app.after_request
 def add_cors_headers(response):
@@ -114,20 +122,85 @@ def stop():
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
-    """ได้ statistics"""
+    """ได้ statistics (?reset=1 = snapshot แล้ว reset แบบ atomic)"""
     try:
-        stats = engine.get_stats()
+        reset = request.args.get('reset', '').lower() in ('1', 'true', 'yes')
+        stats = engine.get_stats(reset=reset)
         return jsonify(stats), 200
     except Exception as e:
         logger.error(f"Error getting stats: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/stats/stream', methods=['GET'])
+def stream_stats():
+    """SSE stream ของ statistics (snapshot แรกแล้วตามด้วย delta, ?hz= อัตราส่ง)"""
+    try:
+        rate_hz = float(request.args.get('hz', STREAM_DEFAULT_HZ))
+    except ValueError:
+        return jsonify({'error': 'hz must be a number'}), 400
+    return Response(
+        stream_with_context(stats_broadcaster.stream(rate_hz)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@app.route('/api/flows', methods=['GET'])
+def get_flows():
+    """Top-N flows (?n=20&sort=pps|bps|packets|bytes|dropped|duplicated|avg_delay_ms|last_seen)"""
+    try:
+        limit = int(request.args.get('n', 20))
+        sort = request.args.get('sort', 'pps')
+        return jsonify(engine.get_flows(limit, sort)), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting flows: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/scenario', methods=['GET'])
+def get_scenario():
+    """สถานะของ scenario ที่เล่นอยู่ (หรือล่าสุด)"""
+    return jsonify(scenario_runner.status()), 200
+
+
+@app.route('/api/scenario', methods=['POST'])
+def start_scenario():
+    """เริ่ม scenario: JSON body, YAML body (Content-Type yaml) หรือ {"path": "file.yaml"}"""
+    try:
+        if 'yaml' in (request.mimetype or ''):
+            scenario = Scenario.loads(request.get_data(as_text=True), 'yaml')
+        else:
+            data = request.get_json() or {}
+            scenario = Scenario.load(data['path']) if 'path' in data else Scenario.parse(data)
+        scenario_runner.start(scenario)
+        return jsonify(scenario_runner.status()), 200
+    except (ValueError, KeyError, TypeError, OSError) as e:
+        logger.error(f"Invalid scenario: {e}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error starting scenario: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/scenario/stop', methods=['POST'])
+def stop_scenario():
+    """หยุด scenario (คืน config เดิมถ้า restore)"""
+    try:
+        scenario_runner.stop()
+        return jsonify(scenario_runner.status()), 200
+    except Exception as e:
+        logger.error(f"Error stopping scenario: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/reset-stats', methods=['POST'])
 def reset_stats():
     """Reset statistics"""
     try:
-        engine.packet_queue.reset_stats()
+        engine.reset_stats()
         return jsonify({'status': 'ok'}), 200
     except Exception as e:
         logger.error(f"Error resetting stats: {e}")
@@ -218,6 +291,7 @@ class TrayIconManager:
         logger.info("Performing self-destruct...")
         
         # Stop engine
+        scenario_runner.stop()
         engine.stop()
         
         # Close window
@@ -394,6 +468,7 @@ class NetworkImpairmentApp:
         finally:
             # Cleanup
             logger.info("Cleaning up...")
+            scenario_runner.stop()
             engine.stop()
             
             if self.tray_manager and self.tray_manager.icon:
@@ -1,21 +1,81 @@
 """
 Network packet manipulation module using pydivert/WinDivert
 Provides lag, drop, throttle, duplicate, out-of-order, and tamper effects
+Packet I/O goes through a PacketBackend (see backends.py) so the effect
+pipeline can also run offline against synthetic or pcap traffic
 """
 
-import pydivert
+import os
+import sys
+import ctypes
 import threading
 import time
-import random
 import struct
+from array import array
 from collections import deque
-from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from dataclasses import dataclass, field, fields, replace
+from typing import Optional, Dict, Any, Callable, List, Tuple
 from enum import Enum
 import logging
 
+from backends import PacketBackend, create_backend
+from bufferpool import POOL_MAX_FREE, BufferPool, GcMonitor
+from corruption import CORRUPTION_MODES, Corruptor
+from counters import StatCounters
+from decisions import DecisionEngine
+from delaymodels import DELAY_MODELS, build_table
+from flows import FLOW_IDLE_TIMEOUT_S, FLOW_TABLE_MAX, FlowTable, top_flows
+from histogram import LatencyHistogram, summarize
+from lossmodels import BurstStats, build_loss_model, summarize_bursts
+from packets import flow_key
+from reorder import ReorderBuffer
+from rules import NO_MATCH, RuleTable
+from scheduler import MAX_SLOTS, SlotScheduler
+from shaper import TokenBucket
+from tracing import (FLAG_REORDERED, FLAG_TAMPERED, TRACE_RING_RECORDS, TRACE_SNAPLEN,
+                     VERDICT_DROPPED, VERDICT_OVERFLOW, VERDICT_PASS, VERDICT_QUEUED, VERDICT_SHAPER_DROPPED,
+                     TraceRing, TraceWriter)
+
 logger = logging.getLogger(__name__)
 
+# Delay queue sizing
+MTU_BYTES = 1500
+MIN_QUEUE_PACKETS = 1024
+QUEUE_HEADROOM = 2.0  # capacity = max delay × expected pps × headroom
+OVERFLOW_POLICIES = ('tail_drop', 'head_drop', 'block')
+
+# Release thread: รอด้วย Condition จนใกล้ deadline แล้ว spin ช่วงสุดท้าย
+# (Windows timer ละเอียดแค่ ~1ms แม้หลัง timeBeginPeriod(1))
+RELEASE_SPIN_S = 0.002 if sys.platform == 'win32' else 0.0002
+RELEASE_IDLE_TIMEOUT_S = 0.1
+
+# Capture loop: recv timeout ให้ตรวจ is_running ได้เป็นระยะ
+RECV_TIMEOUT_MS = 100
+
+# Stat counters (per-thread slots ใน counters.StatCounters); *_bytes คู่กับจำนวน packets
+STAT_NAMES = (
+    'processed', 'processed_bytes',
+    'dropped', 'dropped_bytes',
+    'delayed', 'duplicated', 'tampered', 'out_of_order',
+    'overflow', 'shaped', 'shaper_dropped',
+    'released', 'released_bytes',
+)
+(S_PROCESSED, S_PROCESSED_BYTES,
+ S_DROPPED, S_DROPPED_BYTES,
+ S_DELAYED, S_DUPLICATED, S_TAMPERED, S_OUT_OF_ORDER,
+ S_OVERFLOW, S_SHAPED, S_SHAPER_DROPPED,
+ S_RELEASED, S_RELEASED_BYTES) = range(len(STAT_NAMES))
+
+# Sharded pipeline: batches ที่รอใน inbox ของแต่ละ shard ได้สูงสุด
+SHARD_INBOX_BATCHES = 256
+
+# Loss models ที่ shard เก็บ per-flow state ไว้พร้อมกัน (base + profiles)
+LOSS_MODELS_PER_SHARD = 16
+
+# Latency histograms: rolling window ของ percentiles ใน get_stats()['latency']
+LATENCY_WINDOW_S = 10.0
+LATENCY_SLICES = 10
+
 
 class PacketEffect(Enum):
     """ประเภทของ effect ที่ apply ให้ packets"""
@@ -33,13 +93,30 @@ class NetworkConfig:
     enabled: bool = False
     filter_str: str = "outbound and udp"
     
-    # Lag settings
+    # Packet I/O backend: windivert / synthetic / pcap (ดู backends.py)
+    backend: str = "windivert"
+    backend_options: Dict[str, Any] = field(default_factory=dict)
+    batch_size: int = 64  # packets ต่อ recv/effects/send batch
+    workers: int = 1  # จำนวน shards (มีผลตอน start)
+    seed: Optional[int] = None  # seed ของ effect decisions (None = สุ่มทุกครั้ง)
+    
+    # Lag settings (lag_distribution: constant / uniform / normal / pareto / paretonormal / trace)
     lag_enabled: bool = False
     lag_ms: int = 100
+    lag_distribution: str = "constant"
+    lag_jitter_ms: float = 0  # uniform: ±jitter, อื่น ๆ: standard deviation
+    lag_correlation: float = 0.0  # percentage ระหว่าง packets ติดกัน
+    lag_trace_file: str = ""  # delays (ms) หนึ่งค่าต่อบรรทัด สำหรับ lag_distribution=trace
     
-    # Drop settings
+    # Drop settings (drop_model: bernoulli / gilbert_elliott / trace ดู lossmodels.py)
     drop_enabled: bool = False
-    drop_chance: float = 5.0  # percentage
+    drop_chance: float = 5.0  # percentage (bernoulli)
+    drop_model: str = "bernoulli"
+    drop_ge_p: float = 1.0  # percentage good -> bad ต่อ packet
+    drop_ge_r: float = 30.0  # percentage bad -> good ต่อ packet
+    drop_ge_loss_good: float = 0.0  # percentage loss ใน good state
+    drop_ge_loss_bad: float = 100.0  # percentage loss ใน bad state
+    drop_trace_file: str = ""  # loss pattern 0/1 สำหรับ drop_model=trace
     
     # Throttle settings
     throttle_enabled: bool = False
@@ -51,63 +128,829 @@ class NetworkConfig:
     duplicate_count: int = 1
     duplicate_chance: float = 10.0  # percentage
     
-    # Out-of-order settings
+    # Out-of-order settings (hold แล้วปล่อยตามหลัง packets ของ flow เดียวกัน ดู reorder.py)
     out_of_order_enabled: bool = False
-    out_of_order_chance: float = 20.0  # percentage
-    ooo_queue_size: int = 5
+    out_of_order_chance: float = 20.0  # percentage ที่ packet ถูก hold
+    ooo_queue_size: int = 5  # packets ที่ hold ได้พร้อมกันต่อ flow
+    ooo_gap: int = 3  # packets ของ flow เดียวกันที่แซง packet ที่ถูก hold
+    ooo_timeout_ms: float = 50.0  # hold นานสุดก่อนปล่อยตาม deadline เดิม
     
-    # Tamper settings
+    # Tamper settings (tamper_mode: bitflip / ber / burst / header / truncate ดู corruption.py)
     tamper_enabled: bool = False
-    tamper_chance: float = 5.0  # percentage
+    tamper_chance: float = 5.0  # percentage (ทุก mode ยกเว้น ber)
+    tamper_mode: str = "bitflip"
+    tamper_ber: float = 1e-5  # bit error rate ของ payload ทุก packet (mode ber)
+    tamper_burst_bytes: int = 8  # mode burst
+    tamper_ttl: int = -1  # mode header: -1 = ไม่แก้
+    tamper_dscp: int = -1
+    tamper_tcp_window: int = -1
+    tamper_keep_bad_checksum: bool = False  # ไม่ patch checksum (ทดสอบ receiver validation)
+    
+    # Shaper settings (token bucket ต่อทิศทาง, kbps 0 = ไม่จำกัด)
+    shaper_enabled: bool = False
+    shaper_outbound_kbps: float = 2000
+    shaper_inbound_kbps: float = 0
+    shaper_burst_bytes: int = 15000
+    shaper_queue_bytes: int = 64000
+    
+    # Delay queue settings (0 = auto size จาก max delay × queue_expected_pps)
+    queue_expected_pps: int = 5000
+    queue_max_packets: int = 0
+    queue_max_bytes: int = 0
+    queue_overflow_policy: str = "tail_drop"  # tail_drop / head_drop / block
+    # block: capture thread (ใช้ร่วมกันทั้งสองทิศ) รอ ดังนั้น queue ทิศหนึ่งเต็ม = อีกทิศรอด้วย
+    queue_block_timeout_ms: float = 50
+    
+    # Per-flow rules: list ของ {"proto", "src", "dst", "src_port", "dst_port", "profile"}
+    # (ตรวจตามลำดับ rule แรกที่ match ชนะ); profiles = {name: effect settings ที่ override}
+    # flows ที่ไม่ match rule ไหนใช้ effects หลักด้านบน
+    rules: List[Dict[str, Any]] = field(default_factory=list)
+    profiles: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    
+    # Per-direction overrides: effect settings ที่ override config หลักเฉพาะ packets ทิศนั้น
+    # (เช่น lag 30 ms ขาออก / 120 ms ขาเข้า); แต่ละทิศมี delay queue, release thread
+    # และ stats ของตัวเองเสมอ filter_str ต้อง capture ทั้งสองทิศ (เช่น "udp")
+    inbound: Dict[str, Any] = field(default_factory=dict)
+    outbound: Dict[str, Any] = field(default_factory=dict)
+    
+    # Trace export: verdict + delay ต่อ packet ลง pcapng + sidecar .trace (ดู tracing.py)
+    trace_enabled: bool = False
+    trace_file: str = "impairment_trace.pcapng"
+    trace_snaplen: int = TRACE_SNAPLEN
+    trace_ring_records: int = TRACE_RING_RECORDS  # ต่อ shard; เต็ม = records ใหม่หาย (trace_lost)
+    
+    # Flow table: packets/bytes/drops/delays/duplicates ต่อ 5-tuple (ดู flows.py และ /api/flows)
+    # ปิดไว้ default: observe() ทุก packet ทำให้ passthrough ช้าลงราวครึ่งหนึ่ง
+    flows_enabled: bool = False
+    flow_table_max: int = FLOW_TABLE_MAX  # ทั้ง engine; เต็ม = flow ที่เงียบนานสุดถูกลบ
+    flow_idle_timeout_s: float = FLOW_IDLE_TIMEOUT_S
+    
+    # Buffer pool: synthetic/pcap backends ใช้ packets/buffers ซ้ำแทน allocate ใหม่ทุก packet
+    # (ดู bufferpool.py; WinDivert ใช้ buffers ของ pydivert) มีผลตอน start
+    buffer_pool_enabled: bool = True
+    buffer_pool_max_free: int = POOL_MAX_FREE  # buffers ว่างที่เก็บไว้ต่อ size class
+
+
+# Fields ที่ profile override ไม่ได้ (เป็นของทั้ง engine ไม่ใช่ของ flow)
+ENGINE_ONLY_FIELDS = ('enabled', 'filter_str', 'backend', 'backend_options', 'batch_size',
+                      'workers', 'seed', 'rules', 'profiles', 'inbound', 'outbound',
+                      'trace_enabled', 'trace_file', 'trace_snaplen', 'trace_ring_records',
+                      'flows_enabled', 'flow_table_max', 'flow_idle_timeout_s',
+                      'buffer_pool_enabled', 'buffer_pool_max_free')
+TRACE_FIELDS = ('trace_enabled', 'trace_file', 'trace_snaplen', 'trace_ring_records')
+FLOW_FIELDS = ('flows_enabled', 'flow_table_max', 'flow_idle_timeout_s')
+
+
+# Shaper settings ที่ profile override ไม่ได้ (token buckets เป็นของทิศ ไม่ใช่ของ flow)
+PROFILE_SHAPER_FIELDS = ('shaper_outbound_kbps', 'shaper_inbound_kbps', 'shaper_burst_bytes', 'shaper_queue_bytes')
+
+
+def _profile_config(base: NetworkConfig, overrides: Dict[str, Any]) -> NetworkConfig:
+    """Config ของ profile = config หลัก + overrides (ไม่มี rules ซ้อน, shaper แค่เปิด/ปิด)"""
+    names = {f.name for f in fields(NetworkConfig)} - set(ENGINE_ONLY_FIELDS) - set(PROFILE_SHAPER_FIELDS)
+    unknown = set(overrides) - names
+    if unknown:
+        raise ValueError(f"Unknown profile settings: {sorted(unknown)}")
+    return replace(base, rules=[], profiles={}, inbound={}, outbound={}, **overrides)
+
+
+def _direction_config(base: NetworkConfig, outbound: bool) -> NetworkConfig:
+    """Config ของทิศหนึ่ง = config หลัก + overrides ของทิศนั้น (rules/profiles ยังใช้ได้
+    และ profiles override ต่อจาก config ของทิศ); token bucket ของทิศ configure จาก
+    shaper settings ของ config นี้ ส่วน rate ของอีกทิศ override ไม่ได้"""
+    overrides = base.outbound if outbound else base.inbound
+    direction = 'outbound' if outbound else 'inbound'
+    names = {f.name for f in fields(NetworkConfig)} - set(ENGINE_ONLY_FIELDS)
+    names.discard('shaper_inbound_kbps' if outbound else 'shaper_outbound_kbps')
+    unknown = set(overrides) - names
+    if unknown:
+        raise ValueError(f"Unknown {direction} settings: {sorted(unknown)}")
+    return replace(base, inbound={}, outbound={}, **overrides)
+
+
+@dataclass(frozen=True)
+class ImpairmentPlan:
+    """Effect chain ที่ compile จาก NetworkConfig หนึ่งชุด (immutable)
+
+    stages มีเฉพาะ effects ที่เปิดอยู่ เรียงตามลำดับที่ apply และทำงานทีละ batch
+    ความน่าจะเป็นถูก scale เป็น 0-1 ไว้แล้ว; engine สลับ plan ทั้งก้อนด้วย
+    assignment เดียว capture thread อ่าน self.plan ครั้งเดียวต่อ batch จึงไม่เห็น
+    config ครึ่ง ๆ กลาง ๆ; passthrough = ไม่มี stage เลย (ส่งต่อโดยไม่ผ่าน delay queue)
+    """
+    config: NetworkConfig
+    stages: Tuple[Callable, ...] = ()
+    drop_p: float = 0.0
+    loss_model: Any = None  # lossmodels.GilbertElliott / LossTrace เมื่อ drop_model ไม่ใช่ bernoulli
+    tamper_p: float = 0.0
+    corruptor: Optional[Corruptor] = None
+    ooo_p: float = 0.0
+    ooo_queue_size: int = 0
+    ooo_gap: int = 0
+    ooo_timeout_s: float = 0.0
+    throttle_p: float = 0.0
+    throttle_ms: float = 0.0
+    lag_ms: float = 0.0
+    lag_table: Any = None  # array('d') ของ delays เมื่อ lag มี distribution
+    duplicate_p: float = 0.0
+    duplicate_count: int = 0
+    shapers: Tuple[Any, Any] = (None, None)  # (inbound, outbound) TokenBucket หรือ None
+    shaper_lock: Any = None
+    rules: Optional[RuleTable] = None  # classify flow -> index ใน profile_plans
+    profile_plans: Tuple['ImpairmentPlan', ...] = ()
+    directions: Tuple['ImpairmentPlan', ...] = ()  # (inbound, outbound) เมื่อมี direction overrides
+    
+    @property
+    def passthrough(self) -> bool:
+        return not self.stages and self.rules is None and not self.directions
+    
+    @classmethod
+    def compile(cls, config: NetworkConfig, shapers: Dict[bool, 'TokenBucket'] = None,
+                shaper_lock: Any = None) -> 'ImpairmentPlan':
+        """สร้าง plan จาก config (stage ที่ความน่าจะเป็นเป็น 0 ถูกตัดทิ้ง)"""
+        if config.inbound or config.outbound:
+            # plan ต่อทิศ (index = is_outbound); plan บนสุดแค่พาไปหา plan ของทิศ
+            directions = tuple(cls.compile(_direction_config(config, outbound), shapers, shaper_lock)
+                               for outbound in (False, True))
+            return cls(config=config, directions=directions)
+        stages = []
+        params = {}
+        if config.drop_enabled:
+            loss_model = build_loss_model(config)
+            if loss_model is not None:
+                stages.append(_stage_loss_model)
+                params['loss_model'] = loss_model
+            elif config.drop_chance > 0:
+                stages.append(_stage_drop)
+                params['drop_p'] = config.drop_chance / 100.0
+        if config.tamper_enabled:
+            corruptor = _corruptor(config)
+            active = corruptor.ber > 0 if corruptor.per_bit else config.tamper_chance > 0
+            if active:
+                stages.append(_stage_tamper)
+                params['corruptor'] = corruptor
+                params['tamper_p'] = config.tamper_chance / 100.0
+        if config.throttle_enabled and config.throttle_chance > 0 and config.throttle_ms > 0:
+            stages.append(_stage_throttle)
+            params['throttle_p'] = config.throttle_chance / 100.0
+            params['throttle_ms'] = float(config.throttle_ms)
+        if config.lag_enabled:
+            table = _lag_table(config)
+            if table is None:
+                stages.append(_stage_lag)
+                params['lag_ms'] = float(config.lag_ms)
+            else:
+                stages.append(_stage_lag_model)
+                params['lag_table'] = table
+        if config.duplicate_enabled and config.duplicate_chance > 0 and config.duplicate_count > 0:
+            stages.append(_stage_duplicate)
+            params['duplicate_p'] = config.duplicate_chance / 100.0
+            params['duplicate_count'] = int(config.duplicate_count)
+        if config.shaper_enabled and shapers:
+            rates = (config.shaper_inbound_kbps, config.shaper_outbound_kbps)
+            buckets = tuple(b if rate > 0 else None for b, rate in zip((shapers[False], shapers[True]), rates))
+            if any(buckets):
+                stages.append(_stage_shaper)
+                params['shapers'] = buckets
+                params['shaper_lock'] = shaper_lock
+        if (config.out_of_order_enabled and config.out_of_order_chance > 0
+                and config.ooo_queue_size > 0 and config.ooo_gap > 0):
+            # ท้ายสุด: packet ที่ถูก hold ได้ delay ของ packet ที่ปล่อยมัน (หลัง lag/shaper แล้ว)
+            stages.append(_stage_reorder)
+            params['ooo_p'] = config.out_of_order_chance / 100.0
+            params['ooo_queue_size'] = int(config.ooo_queue_size)
+            params['ooo_gap'] = int(config.ooo_gap)
+            params['ooo_timeout_s'] = max(0.0, float(config.ooo_timeout_ms)) / 1000.0
+        if config.rules:
+            names = list(config.profiles)
+            params['rules'] = RuleTable.compile(config.rules, names)
+            params['profile_plans'] = tuple(
+                cls.compile(_profile_config(config, config.profiles[name]), shapers, shaper_lock)
+                for name in names
+            )
+        return cls(config=config, stages=tuple(stages), **params)
+
+
+# Batch stages: (plan, packets, delays, shard, c, now) -> (packets, delays)
+# packets/delays เป็น lists ขนานกัน; shard.decisions คือ DecisionEngine ที่สุ่มผล
+# ของทั้ง batch ในครั้งเดียว (hits = indices ที่โดน) และ state อื่นต่อ shard
+# (เช่น loss state ต่อ flow) เขียนโดย worker ของ shard เท่านั้น; c คือ counter slot
+# shard.trace (TraceRing หรือ None) รับ drops และ flags ระหว่างทาง; packets ที่ออกจาก
+# stages ถูก record ตอน enqueue/send; shard.flows (FlowTable หรือ None) เช่นกัน
+# shard.pool (BufferPool หรือ None): packets ที่ทิ้งคืน pool, duplicates เพิ่ม refs
+
+def _stage_drop(plan, packets, delays, shard, c, now):
+    hit = shard.decisions.hits(len(packets), plan.drop_p)
+    return _drop_hits(packets, delays, hit, shard, c, now)
+
+
+def _stage_loss_model(plan, packets, delays, shard, c, now):
+    # Burst loss ต่อ flow: state แยกต่อ model (ค่าเดิม = model เดิม ดู build_loss_model)
+    model = plan.loss_model
+    flows = shard.loss_flows.get(model)
+    if flows is None:
+        if len(shard.loss_flows) >= LOSS_MODELS_PER_SHARD:
+            shard.loss_flows.clear()
+        flows = shard.loss_flows[model] = {}
+    keys = [flow_key(packet.raw) for packet in packets]
+    hit = model.lost(keys, flows, shard.decisions.rng.random, shard.loss_bursts)
+    return _drop_hits(packets, delays, hit, shard, c, now)
+
+
+def _drop_hits(packets, delays, hit, shard, c, now):
+    """ตัด packets ที่ indices hit (เรียงจากน้อยไปมาก) ออกพร้อม delays"""
+    if not hit:
+        return packets, delays
+    dropped = [packets[i] for i in hit]
+    if shard.trace is not None:
+        shard.trace.record(dropped, None, VERDICT_DROPPED, now)
+    if shard.flows is not None:
+        shard.flows.dropped(dropped)
+    kept = []
+    kept_delays = []
+    dropped_bytes = 0
+    start = 0
+    for i in hit:
+        kept += packets[start:i]
+        kept_delays += delays[start:i]
+        dropped_bytes += len(packets[i].raw)
+        start = i + 1
+    kept += packets[start:]
+    kept_delays += delays[start:]
+    c[S_DROPPED] += len(hit)
+    c[S_DROPPED_BYTES] += dropped_bytes
+    if shard.pool is not None:
+        shard.pool.release(dropped)
+    return kept, kept_delays
+
+
+def _stage_tamper(plan, packets, delays, shard, c, now):
+    corruptor = plan.corruptor
+    rng = shard.decisions.rng
+    changed = [] if shard.trace is not None else None
+    if corruptor.per_bit:
+        c[S_TAMPERED] += corruptor.corrupt_stream(packets, rng, changed)
+    else:
+        hit = shard.decisions.hits(len(packets), plan.tamper_p)
+        c[S_TAMPERED] += corruptor.corrupt(packets, hit, rng, changed)
+    if changed:
+        shard.trace.mark(packets, changed, FLAG_TAMPERED)
+    return packets, delays
+
+
+def _stage_throttle(plan, packets, delays, shard, c, now):
+    hit = shard.decisions.hits(len(packets), plan.throttle_p)
+    for i, extra in zip(hit, shard.decisions.uniform(len(hit), plan.throttle_ms)):
+        delays[i] += extra
+    return packets, delays
+
+
+def _stage_lag(plan, packets, delays, shard, c, now):
+    lag_ms = plan.lag_ms
+    c[S_DELAYED] += len(packets)
+    return packets, [delay + lag_ms for delay in delays]
+
+
+def _stage_lag_model(plan, packets, delays, shard, c, now):
+    # delays จาก table ที่ precompute ไว้: slice เดียวต่อ batch
+    c[S_DELAYED] += len(packets)
+    samples = shard.decisions.take(plan.lag_table, len(delays))
+    return packets, [delay + sample for delay, sample in zip(delays, samples)]
+
+
+def _stage_duplicate(plan, packets, delays, shard, c, now):
+    # Copies ต่อท้าย original และได้ delay เดียวกัน (corrupt แล้วถ้าโดน)
+    # Copies อ้าง packet object เดียวกับ original (ไม่ copy buffer): stages หลังจากนี้
+    # ห้ามเขียน packet.raw ต้อง copy() ก่อนถ้าจำเป็น
+    hit = shard.decisions.hits(len(packets), plan.duplicate_p)
+    if not hit:
+        return packets, delays
+    count = plan.duplicate_count
+    out_packets = []
+    out_delays = []
+    start = 0
+    for i in hit:
+        out_packets += packets[start:i + 1]
+        out_delays += delays[start:i + 1]
+        out_packets += [packets[i]] * count
+        out_delays += [delays[i]] * count
+        start = i + 1
+    out_packets += packets[start:]
+    out_delays += delays[start:]
+    c[S_DUPLICATED] += len(hit) * count
+    if shard.flows is not None or shard.pool is not None:
+        originals = [packets[i] for i in hit]
+        if shard.flows is not None:
+            shard.flows.duplicated(originals, count)
+        if shard.pool is not None:
+            shard.pool.retain(originals, count)
+    return out_packets, out_delays
+
+
+def _stage_shaper(plan, packets, delays, shard, c, now):
+    # Admit ทุก copy ตามลำดับภายใต้ shaper_lock ครั้งเดียวต่อ batch (tail drop เมื่อ queue เต็ม)
+    shapers = plan.shapers
+    out_packets = []
+    out_delays = []
+    dropped = []
+    shaped = 0
+    with plan.shaper_lock:
+        for packet, delay in zip(packets, delays):
+            bucket = shapers[getattr(packet, 'is_outbound', True)]
+            if bucket is not None:
+                length = len(packet.raw)
+                shaping_delay = bucket.admit(length, now)
+                if shaping_delay is None:
+                    c[S_SHAPER_DROPPED] += 1
+                    c[S_DROPPED] += 1
+                    c[S_DROPPED_BYTES] += length
+                    dropped.append(packet)
+                    continue
+                if shaping_delay:
+                    delay += shaping_delay
+                    shaped += 1
+            out_packets.append(packet)
+            out_delays.append(delay)
+    c[S_SHAPED] += shaped
+    if dropped and shard.trace is not None:
+        shard.trace.record(dropped, None, VERDICT_SHAPER_DROPPED, now)
+    if dropped and shard.flows is not None:
+        shard.flows.dropped(dropped)
+    if dropped and shard.pool is not None:
+        shard.pool.release(dropped)
+    return out_packets, out_delays
+
+
+def _stage_reorder(plan, packets, delays, shard, c, now):
+    # Hold บาง packets ต่อ flow; ปล่อยเมื่อ packets ของ flow เดียวกันผ่านไป ooo_gap ตัว
+    reorder = shard.reorder
+    hit = shard.decisions.hits(len(packets), plan.ooo_p)
+    if not hit and not reorder.held:
+        return packets, delays
+    keys = [flow_key(packet.raw) for packet in packets]
+    packets, delays, held = reorder.process(packets, delays, keys, hit, plan.ooo_queue_size,
+                                            plan.ooo_gap, plan.ooo_timeout_s, now)
+    c[S_OUT_OF_ORDER] += held
+    if held and shard.trace is not None:
+        # entries ที่ hold ใน batch นี้อยู่ท้าย expiry deque
+        expiry = reorder.expiry
+        shard.trace.mark([expiry[-1 - k].packet for k in range(held)], range(held), FLAG_REORDERED)
+    return packets, delays
+
+
+def _split_direction(packets):
+    """[(is_outbound, packets)] ของ batch (ไม่สร้าง list ใหม่เมื่อทั้ง batch ทิศเดียวกัน)"""
+    if not packets:
+        return ()
+    outbound = [packet for packet in packets if packet.is_outbound]
+    if len(outbound) == len(packets):
+        return ((True, packets),)
+    if not outbound:
+        return ((False, packets),)
+    return ((False, [packet for packet in packets if not packet.is_outbound]), (True, outbound))
+
+
+def _set_timer_resolution(enable: bool):
+    """Windows: ขอ system timer 1ms (default ~15.6ms) ระหว่าง engine ทำงาน"""
+    if sys.platform != 'win32':
+        return
+    try:
+        if enable:
+            ctypes.windll.winmm.timeBeginPeriod(1)
+        else:
+            ctypes.windll.winmm.timeEndPeriod(1)
+    except Exception as e:
+        logger.debug(f"Timer resolution error: {e}")
+
+
+def _gil_disabled() -> bool:
+    """True บน free-threaded build (python3.13t+) ที่ปิด GIL อยู่"""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def _lag_table(cfg: NetworkConfig):
+    """Delay table ของ lag distribution หรือ None ถ้าเป็น lag คงที่"""
+    model = cfg.lag_distribution
+    if model not in DELAY_MODELS:
+        raise ValueError(f"Unknown lag distribution: {model}")
+    if model == 'constant' or (model != 'trace' and cfg.lag_jitter_ms <= 0):
+        return None
+    if model == 'trace' and not cfg.lag_trace_file:
+        raise ValueError("lag_distribution=trace requires lag_trace_file")
+    return build_table(model, float(cfg.lag_ms), float(cfg.lag_jitter_ms),
+                       cfg.lag_correlation / 100.0, cfg.lag_trace_file, cfg.seed)
+
+
+def _corruptor(cfg: NetworkConfig) -> Corruptor:
+    """Corruptor ของ tamper settings"""
+    if cfg.tamper_mode not in CORRUPTION_MODES:
+        raise ValueError(f"Unknown tamper mode: {cfg.tamper_mode}")
+    return Corruptor(cfg.tamper_mode, cfg.tamper_ber, cfg.tamper_burst_bytes, cfg.tamper_ttl,
+                     cfg.tamper_dscp, cfg.tamper_tcp_window, cfg.tamper_keep_bad_checksum)
+
+
+def _max_delay_ms(cfg: NetworkConfig, outbound: Optional[bool] = None) -> float:
+    """Delay สูงสุดที่ config นี้ใส่ให้ packet ได้ (ใช้ size delay queue)
+
+    outbound: นับเฉพาะ shaper rate ของทิศนั้น (None = ทิศที่ช้ากว่า)
+    """
+    max_delay_ms = 0
+    if cfg.lag_enabled:
+        table = _lag_table(cfg)
+        max_delay_ms += cfg.lag_ms if table is None else max(table)
+    if cfg.throttle_enabled:
+        max_delay_ms += cfg.throttle_ms
+    if cfg.shaper_enabled:
+        if outbound is None:
+            rates = (cfg.shaper_outbound_kbps, cfg.shaper_inbound_kbps)
+        else:
+            rates = (cfg.shaper_outbound_kbps if outbound else cfg.shaper_inbound_kbps,)
+        rates = [r for r in rates if r > 0]
+        if rates:
+            max_delay_ms += cfg.shaper_queue_bytes * 8 / min(rates)
+    return max_delay_ms
+
+
+def _packet_length(packet: Any) -> int:
+    """ขนาด packet เป็น bytes (0 ถ้าไม่รู้)"""
+    try:
+        return len(packet.raw)
+    except Exception:
+        return 0
 
 
 class PacketQueue:
-    """Queue สำหรับ packets ที่ต้อง delay / reorder"""
-    def __init__(self, max_size: int = 100):
-        self.queue = deque(maxlen=max_size)
+    """Bounded delay buffer สำหรับ packets ที่ต้อง delay / reorder
+
+    Packets ถูกปล่อยตาม ready_time (deadline) ไม่ใช่ลำดับที่เข้ามา ดังนั้น
+    packet ที่ delay ยาวจะไม่ block packets ที่ delay สั้นกว่าที่อยู่ข้างหลัง
+
+    จำกัดทั้งจำนวน packets และ bytes; packets เก็บใน slot table ที่ allocate
+    ไว้ล่วงหน้า (list ของ packets + arrays ของ length/enqueue time/next slot)
+    packets ใน batch เดียวกันที่ deadline เท่ากัน (ปกติเกือบทั้ง batch เพราะ recv
+    time เดียวกัน) ต่อกันเป็น chain ผ่าน _next และใช้ int key เดียวใน scheduler
+    (deadline µs + slot หัว chain ดู SlotScheduler) จึงไม่มี object ต่อ packet
+    และออกตามลำดับที่เข้ามา เมื่อเต็มจะทำตาม overflow_policy:
+    - tail_drop: ทิ้ง packet ใหม่
+    - head_drop: ทิ้ง packet ที่ deadline ใกล้สุดจนมีที่ว่าง (ไม่รวม packets ของ batch
+      ที่กำลังเพิ่ม ถ้า batch เดียวเกินขนาด queue ส่วนที่เกินถูก tail drop)
+    - block: ให้ capture thread รอจนมีที่ว่าง (สูงสุด block_timeout_ms) แล้วค่อย tail drop
+      (capture ใช้ร่วมกันทั้งสองทิศ ระหว่างรอ packets ของอีกทิศก็ค้างด้วย)
+    ทุก packet ที่ถูกทิ้งเพราะเต็มนับใน overflow และ dropped ของ counters
+
+    Latency histograms (writer เดียวคือ release thread, บันทึกทีละ batch):
+    - queue_delay: enqueue -> release (เทียบกับ delay ที่ตั้งไว้)
+    - release_error: release - deadline (scheduler jitter)
+    - processing: recv -> send เสร็จ ไม่รวม delay ที่ตั้งใจ (ดู record_sent)
+    """
+    def __init__(self, max_packets: int = MIN_QUEUE_PACKETS, max_bytes: int = 0,
+                 overflow_policy: str = 'tail_drop', block_timeout_ms: float = 50,
+                 counters: Optional[StatCounters] = None):
+        self.scheduler = SlotScheduler()
         self.lock = threading.Lock()
-        self.stats = {
-            'processed': 0,
-            'dropped': 0,
-            'delayed': 0,
-            'duplicated': 0,
-            'tampered': 0,
-            'out_of_order': 0
-        }
+        self.not_full = threading.Condition(self.lock)
+        self.ready = threading.Condition(self.lock)
+        self._packets = []              # slot -> packet
+        self._lengths = array('I')      # slot -> packet length
+        self._enqueued = array('d')     # slot -> enqueue time (deadline อยู่ใน key ของ scheduler)
+        self._next = array('i')         # slot -> slot ถัดไปที่ deadline เดียวกัน (-1 = ท้าย chain)
+        self._free = array('i')         # free slot indices
+        self.count = 0                  # packets ในคิว (scheduler มี entry ละ chain)
+        self.pool = None                # BufferPool: packets ที่ overflow ทิ้งคืน pool
+        self.max_packets = 0
+        self.max_bytes = 0
+        self.queued_bytes = 0
+        self.overflow_policy = 'tail_drop'
+        self.block_timeout = 0.0
+        self.counters = counters or StatCounters(STAT_NAMES)
+        self.queue_delay = LatencyHistogram(LATENCY_WINDOW_S, LATENCY_SLICES)
+        self.release_error = LatencyHistogram(LATENCY_WINDOW_S, LATENCY_SLICES)
+        self.processing = LatencyHistogram(LATENCY_WINDOW_S, LATENCY_SLICES)
+        self._released_deadlines = []
+        self.configure(max_packets, max_bytes, overflow_policy, block_timeout_ms)
+    
+    def __len__(self):
+        return self.count
+    
+    def configure(self, max_packets: int, max_bytes: int = 0,
+                  overflow_policy: str = 'tail_drop', block_timeout_ms: float = 50):
+        """ตั้งขนาด buffer ใหม่ (slot table ขยายได้อย่างเดียว ไม่ย้าย packets ที่อยู่ในคิว)"""
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        max_packets = max(1, int(max_packets))
+        if max_packets > MAX_SLOTS:
+            raise ValueError(f"Delay queue too large: {max_packets} packets (max {MAX_SLOTS} per queue)")
+        
+        with self.lock:
+            grow = max_packets - len(self._packets)
+            if grow > 0:
+                first = len(self._packets)
+                self._packets.extend([None] * grow)
+                self._lengths.extend(array('I', bytes(4 * grow)))
+                self._enqueued.extend(array('d', bytes(8 * grow)))
+                self._next.extend(array('i', bytes(4 * grow)))
+                self._free.extend(range(first + grow - 1, first - 1, -1))
+            self.max_packets = max_packets
+            self.max_bytes = int(max_bytes) or max_packets * MTU_BYTES
+            self.overflow_policy = overflow_policy
+            self.block_timeout = block_timeout_ms / 1000.0
+            self.not_full.notify_all()
+    
+    def add(self, packet: Any, delay_ms: float = 0, timestamp: Optional[float] = None) -> bool:
+        """เพิ่ม packet ลงใน queue พร้อม timestamp (time.monotonic)
+
+        คืน False ถ้า packet ถูกทิ้งเพราะ buffer เต็ม
+        """
+        return self.add_batch(((packet, delay_ms),), timestamp) == 1
     
-    def add(self, packet: Any, delay_ms: float = 0, timestamp: Optional[float] = None):
-        """เพิ่ม packet ลงใน queue พร้อม timestamp"""
+    def add_batch(self, items, timestamp: Optional[float] = None, overflow: Optional[list] = None) -> int:
+        """เพิ่ม (packet, delay_ms) หลายตัวภายใต้ lock เดียว คืนจำนวนที่เข้า queue ได้
+
+        overflow: ถ้าส่ง list มา packets ที่ถูกทิ้งเพราะเต็มจะถูก append เป็น (index, packet)
+        (index ใน items ของ packet ใหม่ที่ถูก tail drop, -1 = packet เก่าที่ head_drop ไล่ออก)
+        และไม่คืน pool ให้ caller trace / นับ flow ก่อนแล้วคืนเอง
+        """
         if timestamp is None:
-            timestamp = time.time()
+            timestamp = time.monotonic()
+        packets = self._packets
+        lengths = self._lengths
+        enqueued = self._enqueued
+        chain = self._next
+        free = self._free
+        heads = {}  # ready_time -> slot หัว chain ของ batch นี้ (ยังไม่อยู่ใน scheduler)
+        tails = {}  # ready_time -> slot ท้าย chain
+        queued = 0
+        c = self.counters.slot()
         
         with self.lock:
-            self.queue.append({
-                'packet': packet,
-                'timestamp': timestamp,
-                'delay': delay_ms,
-                'ready_time': timestamp + (delay_ms / 1000.0)
-            })
+            for index, (packet, delay_ms) in enumerate(items):
+                length = _packet_length(packet)
+                if not self._has_room(length):
+                    if self.overflow_policy == 'block':
+                        # release thread ต้องเห็น packets ของ batch นี้ระหว่างรอ (chains หลัง
+                        # จุดนี้เริ่มใหม่ FIFO ข้ามจุดนี้ไม่รับประกันถ้า deadline เท่ากัน)
+                        self._push_chains(heads, tails)
+                    if not self._make_room(length, c, overflow):
+                        c[S_OVERFLOW] += 1
+                        c[S_DROPPED] += 1
+                        c[S_DROPPED_BYTES] += length
+                        if overflow is not None:
+                            overflow.append((index, packet))
+                        elif self.pool is not None:
+                            self.pool.release((packet,))
+                        continue
+                
+                ready_time = timestamp + (delay_ms / 1000.0)
+                slot = free.pop()
+                packets[slot] = packet
+                lengths[slot] = length
+                enqueued[slot] = timestamp
+                chain[slot] = -1
+                tail = tails.get(ready_time)
+                if tail is None:
+                    heads[ready_time] = slot
+                else:
+                    chain[tail] = slot
+                tails[ready_time] = slot
+                self.queued_bytes += length
+                self.count += 1
+                queued += 1
+            
+            self._push_chains(heads, tails)
+        return queued
+    
+    def _push_chains(self, heads, tails):
+        """ใส่ chains ที่รวบรวมไว้ลง scheduler (ต้องถือ lock อยู่) แล้วล้าง heads / tails
+
+        ปลุก release thread เฉพาะเมื่อ deadline ใหม่กลายเป็นหัวของ heap
+        """
+        if not heads:
+            return
+        scheduler = self.scheduler
+        for ready_time, slot in heads.items():
+            scheduler.push(ready_time, slot)
+        if scheduler.next_deadline() >= min(heads):
+            self.ready.notify()
+        heads.clear()
+        tails.clear()
     
     def get_ready_packets(self):
-        """ได้ packets ที่ ready ส่ง (delay time expired)"""
-        current_time = time.time()
-        ready = []
-        
+        """ได้ packets ที่ ready ส่ง (delay time expired) เรียงตาม deadline"""
+        with self.lock:
+            return self._pop_ready(time.monotonic())
+    
+    def wait_ready(self, timeout: float = RELEASE_IDLE_TIMEOUT_S):
+        """Block จนถึง deadline ถัดไปแล้วคืน packets ที่ ready
+
+        หลับด้วย Condition.wait จนเหลือ RELEASE_SPIN_S ก่อน deadline แล้ว yield-spin
+        ช่วงสุดท้ายเพื่อให้ release error ต่ำกว่า 1ms; ถูกปลุกเมื่อมี packet ที่
+        deadline เร็วกว่าเข้ามา คืน [] เมื่อครบ timeout หรือถูก wake()
+        """
+        end = time.monotonic() + timeout
         with self.lock:
-            while self.queue and self.queue[0]['ready_time'] <= current_time:
-                ready.append(self.queue.popleft())
+            while True:
+                now = time.monotonic()
+                deadline = self.scheduler.next_deadline()
+                if deadline is not None and deadline <= now:
+                    return self._pop_ready(now)
+                
+                wake_at = end if deadline is None else min(deadline, end)
+                remaining = wake_at - now
+                if remaining <= 0:
+                    return []
+                if remaining > RELEASE_SPIN_S:
+                    self.ready.wait(remaining - RELEASE_SPIN_S)
+                else:
+                    # ปล่อย lock ระหว่าง spin ให้ capture thread add ได้
+                    self.lock.release()
+                    try:
+                        time.sleep(0)
+                    finally:
+                        self.lock.acquire()
+    
+    def wake(self):
+        """ปลุก thread ที่รออยู่ใน wait_ready (เช่นตอน stop)"""
+        with self.lock:
+            self.ready.notify_all()
+            self.not_full.notify_all()
+    
+    def _pop_ready(self, now: float):
+        """Pop packets ที่ ready (ต้องถือ lock อยู่)"""
+        chain_deadlines = []
+        heads = self.scheduler.pop_ready(now, chain_deadlines)
+        if not heads:
+            return []
+        
+        chain = self._next
+        slots = []
+        released_deadlines = []
+        for slot, deadline in zip(heads, chain_deadlines):
+            while slot >= 0:
+                slots.append(slot)
+                slot = chain[slot]
+            released_deadlines += [deadline] * (len(slots) - len(released_deadlines))
         
+        enqueued = self._enqueued
+        self.queue_delay.record_elapsed(now, [enqueued[slot] for slot in slots])
+        self.release_error.record_elapsed(now, released_deadlines)
+        self._released_deadlines = released_deadlines
+        
+        queued_bytes = self.queued_bytes
+        ready = [self._release_slot(slot) for slot in slots]
+        c = self.counters.slot()
+        c[S_RELEASED] += len(ready)
+        c[S_RELEASED_BYTES] += queued_bytes - self.queued_bytes
+        if self.overflow_policy == 'block':
+            self.not_full.notify_all()
         return ready
     
+    def record_sent(self, now: float):
+        """บันทึก processing time ของ batch ล่าสุดที่ pop ไปหลังส่งเสร็จ ณ now
+
+        deadline = recv time + delay ที่ตั้งใจ ดังนั้น now - deadline คือเวลาที่
+        engine ใช้เองตั้งแต่ recv จนส่งเสร็จ; เรียกจาก consumer thread เดียวกับ wait_ready
+        """
+        deadlines = self._released_deadlines
+        if deadlines:
+            self.processing.record_elapsed(now, deadlines)
+            self._released_deadlines = []
+    
+    def _has_room(self, length: int) -> bool:
+        return (self.count < self.max_packets
+                and self.queued_bytes + length <= self.max_bytes)
+    
+    def _make_room(self, length: int, c, overflow: Optional[list] = None) -> bool:
+        """ทำตาม overflow policy (ต้องถือ lock อยู่) คืน True ถ้ามีที่ว่างแล้ว
+
+        packets ที่ head_drop ไล่ออกลง overflow เป็น (-1, packet) ถ้าส่ง list มา
+        """
+        if self.overflow_policy == 'head_drop':
+            scheduler = self.scheduler
+            while len(scheduler) and not self._has_room(length):
+                # ตัดหัว chain ที่ deadline ใกล้สุดทีละ packet
+                slot = scheduler.head_slot()
+                following = self._next[slot]
+                if following < 0:
+                    scheduler.pop_head()
+                else:
+                    scheduler.replace_head(following)
+                c[S_OVERFLOW] += 1
+                c[S_DROPPED] += 1
+                c[S_DROPPED_BYTES] += self._lengths[slot]
+                packet = self._release_slot(slot)
+                if overflow is not None:
+                    overflow.append((-1, packet))
+                elif self.pool is not None:
+                    self.pool.release((packet,))
+            return self._has_room(length)
+        
+        if self.overflow_policy == 'block':
+            deadline = time.monotonic() + self.block_timeout
+            while not self._has_room(length):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.not_full.wait(remaining)
+            return True
+        
+        return False
+    
+    def _release_slot(self, slot: int):
+        packet = self._packets[slot]
+        self._packets[slot] = None
+        self.queued_bytes -= self._lengths[slot]
+        self.count -= 1
+        self._free.append(slot)
+        return packet
+    
     def get_stats(self):
         """ได้ statistics"""
-        return self.stats.copy()
+        return self.counters.snapshot()
     
     def reset_stats(self):
         """Reset statistics"""
-        with self.lock:
-            for key in self.stats:
-                self.stats[key] = 0
+        self.counters.reset()
+        self.reset_latency()
+    
+    def reset_latency(self):
+        """ล้าง latency histograms"""
+        for histogram in (self.queue_delay, self.release_error, self.processing):
+            histogram.reset()
+
+
+class Shard:
+    """Pipeline shard: delay queue, decision engine และ threads ของ flows ที่ hash มาลง shard นี้
+
+    Packets ของ flow เดียวกันลง shard เดียวกันเสมอ ลำดับภายใน flow จึงคงเดิม
+    เมื่อ workers > 1 capture thread ส่ง batch เข้า inbox แล้ว worker thread
+    ของ shard เป็นคน apply effects; แต่ละทิศ (queues[is_outbound]) มี delay queue
+    และ release thread ของตัวเอง backlog ขาเข้าจึงไม่หน่วง packets ขาออก (และกลับกัน)
+    ยกเว้น overflow policy block ที่ queue เต็มทำให้ capture / worker ของ shard รอทั้งสองทิศ
+    """
+    
+    def __init__(self, index: int, counters: Tuple[StatCounters, StatCounters], seed: Optional[int] = None):
+        self.index = index
+        self.queues = tuple(PacketQueue(counters=direction) for direction in counters)  # (inbound, outbound)
+        self.direct_processing = tuple(LatencyHistogram(LATENCY_WINDOW_S, LATENCY_SLICES)
+                                       for _ in counters)  # passthrough ต่อทิศ
+        self.decisions = DecisionEngine(seed)
+        self.loss_flows = {}  # loss model -> {flow_key: state}
+        self.loss_bursts = BurstStats()
+        self.reorder = ReorderBuffer()
+        self.trace = None  # TraceRing เมื่อ trace_enabled และ engine ทำงานอยู่
+        self.flows = None  # FlowTable เมื่อ flows_enabled (เก็บไว้หลัง stop ให้ดูผลได้)
+        self.pool = None  # BufferPool ของ backend (None = packets ไม่ได้มาจาก pool)
+        self.inbox = deque()
+        self.inbox_lock = threading.Lock()
+        self.inbox_ready = threading.Condition(self.inbox_lock)
+        self.inbox_space = threading.Condition(self.inbox_lock)
+        self.worker_thread = None
+        self.release_threads = []
+    
+    def submit(self, packets, now: float, is_running):
+        """ส่ง batch ให้ worker (รอถ้า inbox เต็ม - backpressure ไปที่ capture thread)"""
+        with self.inbox_lock:
+            while len(self.inbox) >= SHARD_INBOX_BATCHES and is_running():
+                self.inbox_space.wait(RELEASE_IDLE_TIMEOUT_S)
+            self.inbox.append((packets, now))
+            self.inbox_ready.notify()
+    
+    def take(self, timeout: float):
+        """รับ batch ถัดไปจาก inbox หรือ None เมื่อ timeout"""
+        with self.inbox_lock:
+            if not self.inbox:
+                self.inbox_ready.wait(timeout)
+                if not self.inbox:
+                    return None
+            item = self.inbox.popleft()
+            self.inbox_space.notify()
+            return item
+    
+    def idle_timeout(self, now: float, timeout: float) -> float:
+        """เวลารอ recv/inbox สูงสุด: สั้นลงเมื่อมี packet ที่ hold อยู่ใกล้ครบ timeout"""
+        if not self.reorder.held:
+            return timeout
+        expires = self.reorder.next_expiry()
+        if expires is None:
+            return timeout
+        return min(timeout, max(0.001, expires - now))
+    
+    def reset_latency(self):
+        for packet_queue, direct in zip(self.queues, self.direct_processing):
+            packet_queue.reset_latency()
+            direct.reset()
+    
+    def reset_stats(self):
+        """ล้าง latency histograms และ loss burst stats (counters อยู่ที่ engine)"""
+        self.reset_latency()
+        self.loss_bursts.reset()
+    
+    def wake(self):
+        for packet_queue in self.queues:
+            packet_queue.wake()
+        with self.inbox_lock:
+            self.inbox_ready.notify_all()
+            self.inbox_space.notify_all()
 
 
 class NetworkImpairmentEngine:
@@ -115,27 +958,82 @@ class NetworkImpairmentEngine:
     
     def __init__(self):
         self.config = NetworkConfig()
-        self.packet_queue = PacketQueue()
+        self.counters = (StatCounters(STAT_NAMES), StatCounters(STAT_NAMES))  # (inbound, outbound)
+        self.shards = [Shard(0, self.counters)]
+        self.shapers = {True: TokenBucket(), False: TokenBucket()}  # key = is_outbound
+        self.shaper_lock = threading.Lock()
+        self._configure_queue()
+        self._configure_shapers()
+        self.plan = ImpairmentPlan.compile(self.config, self.shapers, self.shaper_lock)
         self.is_running = False
         self.capture_thread = None
-        self.process_thread = None
-        self.divert_handle = None
+        self.backend = None
+        self.trace_writer = None
+        self.pool = None  # BufferPool ของ run ล่าสุด (เก็บไว้หลัง stop ให้ดู stats ได้)
+        self.gc_monitor = GcMonitor(LATENCY_WINDOW_S, LATENCY_SLICES)
         self.lock = threading.Lock()
-        self.ooo_buffer = deque(maxlen=10)  # สำหรับ out-of-order
     
-    def start(self):
-        """เริ่ม capture และ process packets"""
+    @property
+    def packet_queue(self) -> PacketQueue:
+        """Delay queue ขาออกของ shard แรก (เดิมมี queue เดียว)"""
+        return self.shards[0].queues[True]
+    
+    def _shard_seed(self, index: int) -> Optional[int]:
+        """Seed ของ shard ที่ index (แต่ละ shard ได้ stream ของตัวเองจาก config.seed)"""
+        seed = self.config.seed
+        return None if seed is None else int(seed) * 1000003 + index
+    
+    def _seed_shards(self):
+        """เริ่ม decision streams และ per-flow state ใหม่ (run ที่ seed และ traffic เดียวกันได้ผลเหมือนเดิม)
+
+        ไม่แตะ reorder buffer: ระหว่างทำงานเป็นของ capture/worker thread และ packets ที่ hold
+        อยู่ต้องถูกปล่อยตามปกติ (start ล้างให้เองก่อน threads เริ่ม)
+        """
+        for shard in self.shards:
+            shard.decisions = DecisionEngine(self._shard_seed(shard.index))
+            shard.loss_flows = {}
+    
+    def _build_shards(self):
+        """สร้าง shards ตาม config.workers (counters ใช้ร่วมกันทั้ง engine)"""
+        count = max(1, int(self.config.workers))
+        if count == len(self.shards):
+            return
+        self.shards = [Shard(i, self.counters, self._shard_seed(i)) for i in range(count)]
+        self._configure_queue()
+        if count > 1 and not _gil_disabled():
+            logger.warning(f"{count} workers on a GIL build: effect processing "
+                           f"still serializes on the GIL")
+    
+    def start(self, backend: Optional[PacketBackend] = None):
+        """เริ่ม capture และ process packets
+
+        ถ้าไม่ได้ส่ง backend มา จะสร้างตาม config.backend (default WinDivert)
+        """
         if self.is_running:
             logger.warning("Network engine is already running")
             return False
         
         try:
+            self._build_shards()
+            self._seed_shards()
+            for shard in self.shards:
+                shard.reorder.clear()
+            self._configure_flows()
+            self._configure_trace()
             self.is_running = True
+            _set_timer_resolution(True)
             
-            # Create WinDivert handle กับ filter string
-            logger.info(f"Opening WinDivert with filter: {self.config.filter_str}")
-            self.divert_handle = pydivert.WinDivert(self.config.filter_str)
-            self.divert_handle.open()
+            # Open packet backend (WinDivert ใช้ filter string)
+            if backend is None:
+                backend = create_backend(
+                    self.config.backend,
+                    self.config.filter_str,
+                    self.config.backend_options,
+                )
+            self._configure_pool(backend)
+            backend.open()
+            self.backend = backend
+            self.gc_monitor.start()
             
             # Start capture thread
             self.capture_thread = threading.Thread(
@@ -145,20 +1043,39 @@ class NetworkImpairmentEngine:
             )
             self.capture_thread.start()
             
-            # Start process thread (สำหรับ delayed packets)
-            self.process_thread = threading.Thread(
-                target=self._process_loop,
-                daemon=True,
-                name="PacketProcess"
-            )
-            self.process_thread.start()
+            # Start worker ต่อ shard + process thread ต่อ shard ต่อทิศ (สำหรับ delayed packets)
+            sharded = len(self.shards) > 1
+            for shard in self.shards:
+                if sharded:
+                    shard.worker_thread = threading.Thread(
+                        target=self._worker_loop,
+                        args=(shard,),
+                        daemon=True,
+                        name=f"PacketWorker-{shard.index}"
+                    )
+                    shard.worker_thread.start()
+                shard.release_threads = []
+                for outbound in (False, True):
+                    thread = threading.Thread(
+                        target=self._process_loop,
+                        args=(shard, outbound),
+                        daemon=True,
+                        name=f"PacketProcess-{shard.index}-{'out' if outbound else 'in'}"
+                    )
+                    thread.start()
+                    shard.release_threads.append(thread)
             
-            logger.info("Network impairment engine started")
+            logger.info(f"Network impairment engine started ({backend.name} backend, "
+                        f"{len(self.shards)} worker(s))")
             return True
             
         except Exception as e:
             logger.error(f"Failed to start engine: {e}")
             self.is_running = False
+            self.backend = None
+            self._stop_trace()
+            self.gc_monitor.stop()
+            _set_timer_resolution(False)
             return False
     
     def stop(self):
@@ -167,20 +1084,28 @@ class NetworkImpairmentEngine:
             return True
         
         self.is_running = False
+        for shard in self.shards:
+            shard.wake()
+        for shard in self.shards:
+            for thread in [shard.worker_thread] + shard.release_threads:
+                if thread:
+                    thread.join(timeout=2)
+            shard.worker_thread = None
+            shard.release_threads = []
         
-        # Close WinDivert handle
-        if self.divert_handle:
+        # Close backend (ปลด recv ที่ block อยู่ใน capture thread)
+        if self.backend:
             try:
-                self.divert_handle.close()
+                self.backend.close()
             except Exception as e:
-                logger.error(f"Error closing divert handle: {e}")
-            self.divert_handle = None
+                logger.error(f"Error closing packet backend: {e}")
         
-        # Wait for threads
         if self.capture_thread:
             self.capture_thread.join(timeout=2)
-        if self.process_thread:
-            self.process_thread.join(timeout=2)
+        self.backend = None
+        self._stop_trace()
+        self.gc_monitor.stop()
+        _set_timer_resolution(False)
         
         logger.info("Network impairment engine stopped")
         return True
@@ -188,21 +1113,37 @@ class NetworkImpairmentEngine:
     def _capture_loop(self):
         """Main loop สำหรับ capture packets"""
         logger.info("Packet capture loop started")
+        backend = self.backend
+        shards = self.shards
+        count = len(shards)
+        is_running = lambda: self.is_running
         
         try:
-            while self.is_running and self.divert_handle:
+            while self.is_running:
                 try:
-                    # Receive packet
-                    packets = self.divert_handle.recv(timeout=100)
+                    # Receive batch (ว่างเมื่อ timeout)
+                    timeout_ms = RECV_TIMEOUT_MS
+                    if count == 1 and shards[0].reorder.held:
+                        timeout_ms = int(shards[0].idle_timeout(time.monotonic(), RECV_TIMEOUT_MS / 1000.0) * 1000) or 1
+                    packets = backend.recv_batch(max(1, self.config.batch_size), timeout_ms)
                     
                     if not packets:
+                        if count == 1 and shards[0].reorder.held:
+                            self._flush_reorder(shards[0], time.monotonic())
+                        continue
+                    
+                    now = time.monotonic()
+                    if count == 1:
+                        self._process_batch(shards[0], packets, now)
                         continue
                     
+                    # Hash 5-tuple -> shard (flow เดียวกันอยู่ shard เดียวกัน)
+                    buckets = [[] for _ in range(count)]
                     for packet in packets:
-                        # Apply effects ตาม config
-                        self._apply_effects(packet)
-                        
-                        self.packet_queue.stats['processed'] += 1
+                        buckets[hash(flow_key(packet.raw)) % count].append(packet)
+                    for shard, bucket in zip(shards, buckets):
+                        if bucket:
+                            shard.submit(bucket, now, is_running)
                 
                 except Exception as e:
                     if self.is_running:
@@ -214,126 +1155,442 @@ class NetworkImpairmentEngine:
         finally:
             logger.info("Packet capture loop ended")
     
-    def _process_loop(self):
-        """Loop สำหรับ process delayed packets"""
-        logger.info("Packet process loop started")
-        
+    def _worker_loop(self, shard: Shard):
+        """Worker thread ของ shard: apply effects ให้ batches จาก inbox"""
         try:
             while self.is_running:
-                # ได้ packets ที่ ready
-                ready_packets = self.packet_queue.get_ready_packets()
-                
-                # ส่ง packets
-                for item in ready_packets:
-                    try:
-                        if self.divert_handle:
-                            self.divert_handle.send(item['packet'])
-                    except Exception as e:
-                        logger.debug(f"Send error: {e}")
-                
-                time.sleep(0.001)  # 1ms loop
-        
+                item = shard.take(shard.idle_timeout(time.monotonic(), RELEASE_IDLE_TIMEOUT_S))
+                if item is not None:
+                    self._process_batch(shard, item[0], item[1])
+                elif shard.reorder.held:
+                    self._flush_reorder(shard, time.monotonic())
         except Exception as e:
-            logger.error(f"Process loop error: {e}")
-        finally:
-            logger.info("Packet process loop ended")
+            logger.error(f"Worker {shard.index} loop error: {e}")
     
-    def _apply_effects(self, packet):
-        """Apply effects ให้กับ packet ตาม config"""
-        
-        # Drop check
-        if self.config.drop_enabled:
-            if random.random() * 100 < self.config.drop_chance:
-                self.packet_queue.stats['dropped'] += 1
-                return  # drop packet นี้
-        
-        # Duplicate check (ทำก่อน lag เพื่อให้ duplicate ได้ lag ด้วย)
-        duplicate_count = 0
-        if self.config.duplicate_enabled:
-            if random.random() * 100 < self.config.duplicate_chance:
-                duplicate_count = self.config.duplicate_count
-                self.packet_queue.stats['duplicated'] += duplicate_count
-        
-        # Tamper check
-        if self.config.tamper_enabled:
-            if random.random() * 100 < self.config.tamper_chance:
-                self._tamper_packet(packet)
-                self.packet_queue.stats['tampered'] += 1
-        
-        # Out-of-order check (ใช้ simple random delay within range)
-        delay = 0
-        if self.config.out_of_order_enabled:
-            if random.random() * 100 < self.config.out_of_order_chance:
-                # Random delay 0-100ms เพื่อ reorder
-                delay = random.random() * 100
-                self.packet_queue.stats['out_of_order'] += 1
+    def _process_batch(self, shard: Shard, packets, now: float):
+        """แยก batch ตามทิศ แล้ว run stages ของ plan ปัจจุบันและ enqueue ทีละทิศ"""
+        plan = self.plan  # อ่านครั้งเดียว: ทั้ง batch ใช้ plan เดียวกัน
+        if shard.reorder.held:
+            self._flush_reorder(shard, now)
+        directions = plan.directions
+        for outbound, group in _split_direction(packets):
+            self._process_direction(shard, directions[outbound] if directions else plan,
+                                    group, outbound, now)
+    
+    def _process_direction(self, shard: Shard, plan: ImpairmentPlan, packets, outbound: bool, now: float):
+        """Packets ทิศเดียว: counters, delay queue และ passthrough histogram ของทิศนั้น"""
+        c = self.counters[outbound].slot()
+        c[S_PROCESSED] += len(packets)
+        nbytes = sum([len(packet.raw) for packet in packets])
+        c[S_PROCESSED_BYTES] += nbytes
+        if shard.flows is not None:
+            shard.flows.observe(packets, outbound, now)
         
-        # Throttle check
-        if self.config.throttle_enabled:
-            if random.random() * 100 < self.config.throttle_chance:
-                delay += random.random() * self.config.throttle_ms
+        if plan.passthrough:
+            self._send_direct(shard, packets, nbytes, outbound, now, c)
+            return
+        if plan.rules is not None:
+            self._process_classified(shard, plan, packets, outbound, now, c)
+            return
         
-        # Lag
-        if self.config.lag_enabled:
-            delay += self.config.lag_ms
-            self.packet_queue.stats['delayed'] += 1
+        packets, delays = self._run_stages(plan, packets, shard, c, now)
+        if packets:
+            self._enqueue(shard, packets, delays, outbound, now)
+    
+    def _enqueue(self, shard: Shard, packets, delays, outbound: bool, now: float):
+        """ส่ง packets ทิศเดียวเข้า delay queue ของทิศนั้นใน lock เดียว
+
+        trace / flow table นับ queued เฉพาะ packets ที่เข้าคิวได้ ส่วนที่ overflow (tail drop
+        ของ batch นี้ หรือ packets เก่าที่ head_drop ไล่ออก) เป็น overflow / dropped ของ flow
+        """
+        trace = shard.trace
+        flows = shard.flows
+        if trace is None and flows is None:
+            shard.queues[outbound].add_batch(zip(packets, delays), now)
+            return
+        overflow = []
+        shard.queues[outbound].add_batch(zip(packets, delays), now, overflow)
+        if overflow:
+            rejected = {index for index, _ in overflow if index >= 0}
+            if rejected:
+                admitted = [i for i in range(len(packets)) if i not in rejected]
+                packets = [packets[i] for i in admitted]
+                delays = [delays[i] for i in admitted]
+        if trace is not None:
+            trace.record(packets, delays, VERDICT_QUEUED, now)
+        if flows is not None:
+            flows.queued(packets, delays)
+        if overflow:
+            dropped = [packet for _, packet in overflow]
+            if trace is not None:
+                trace.record(dropped, None, VERDICT_OVERFLOW, now)
+            if flows is not None:
+                flows.dropped(dropped)
+            if shard.pool is not None:
+                shard.pool.release(dropped)
+    
+    def _run_stages(self, plan: ImpairmentPlan, packets, shard: 'Shard', c, now: float):
+        """Run stages ของ plan คืน (packets, delays_ms) ที่เหลือ"""
+        delays = [0.0] * len(packets)
+        for stage in plan.stages:
+            packets, delays = stage(plan, packets, delays, shard, c, now)
+            if not packets:
+                break
+        return packets, delays
+    
+    def _process_classified(self, shard: Shard, plan: ImpairmentPlan, packets, outbound: bool,
+                            now: float, c):
+        """แบ่ง batch ตาม profile ของแต่ละ flow (rule table) แล้ว run stages ของ profile นั้น"""
+        classify = plan.rules.classify
+        groups = {}
+        for packet in packets:
+            profile = classify(flow_key(packet.raw))
+            group = groups.get(profile)
+            if group is None:
+                groups[profile] = [packet]
+            else:
+                group.append(packet)
         
-        # Add to queue (พร้อม delay)
-        self.packet_queue.add(packet, delay)
+        direct = []
+        out_packets = []
+        out_delays = []
+        for profile, group in groups.items():
+            sub_plan = plan if profile == NO_MATCH else plan.profile_plans[profile]
+            if not sub_plan.stages:
+                direct += group
+                continue
+            group, delays = self._run_stages(sub_plan, group, shard, c, now)
+            out_packets += group
+            out_delays += delays
         
-        # Add duplicates
-        for _ in range(duplicate_count):
-            # Deep copy packet สำหรับ duplicate
-            try:
-                dup_packet = packet.copy()
-                self.packet_queue.add(dup_packet, delay)
-            except Exception as e:
-                logger.debug(f"Duplicate copy error: {e}")
+        if direct:
+            self._send_direct(shard, direct, sum([len(packet.raw) for packet in direct]), outbound, now, c)
+        if out_packets:
+            self._enqueue(shard, out_packets, out_delays, outbound, now)
+    
+    def _flush_reorder(self, shard: Shard, now: float):
+        """ส่ง packets ที่ hold ครบ ooo_timeout เข้า delay queue ตาม deadline เดิมของมัน"""
+        packets, delays = shard.reorder.expire(now)
+        for outbound, group in _split_direction(packets):
+            if group is not packets:
+                group_delays = [delay for packet, delay in zip(packets, delays) if packet.is_outbound == outbound]
+            else:
+                group_delays = delays
+            self._enqueue(shard, group, group_delays, outbound, now)
     
-    def _tamper_packet(self, packet):
-        """แก้ไข packet payload เล็กน้อย"""
+    def _send_direct(self, shard: Shard, packets, nbytes: int, outbound: bool, now: float, c):
+        """Passthrough: ส่งจาก thread นี้เลยโดยไม่ผ่าน delay queue / release thread"""
+        if shard.trace is not None:
+            shard.trace.record(packets, None, VERDICT_PASS, now)
         try:
-            if hasattr(packet, 'payload') and packet.payload:
-                # Flip bit ใน payload ถ้า payload มี
-                payload = bytearray(packet.payload)
-                if len(payload) > 0:
-                    # Flip bit แรก
-                    idx = random.randint(0, len(payload) - 1)
-                    payload[idx] ^= 0x01
-                    packet.payload = bytes(payload)
-                    
-                    # Recalculate checksums
+            self.backend.send_batch(packets)
+        except Exception as e:
+            logger.debug(f"Send error: {e}")
+        c[S_RELEASED] += len(packets)
+        c[S_RELEASED_BYTES] += nbytes
+        shard.direct_processing[outbound].record_elapsed(time.monotonic(), [now] * len(packets))
+    
+    def _process_loop(self, shard: Shard, outbound: bool):
+        """Loop สำหรับ process delayed packets ของ shard ทิศเดียว"""
+        name = f"{shard.index}-{'out' if outbound else 'in'}"
+        logger.info(f"Packet process loop {name} started")
+        backend = self.backend
+        packet_queue = shard.queues[outbound]
+        
+        try:
+            while self.is_running:
+                # หลับจนถึง deadline ถัดไป (ถูกปลุกเมื่อมี deadline ที่เร็วกว่า)
+                ready_packets = packet_queue.wait_ready()
+                
+                # ส่ง packets
+                if ready_packets:
                     try:
-                        packet.calc_checksums()
+                        backend.send_batch(ready_packets)
                     except Exception as e:
-                        logger.debug(f"Checksum error: {e}")
+                        logger.debug(f"Send error: {e}")
+                    packet_queue.record_sent(time.monotonic())
+        
         except Exception as e:
-            logger.debug(f"Tamper error: {e}")
+            logger.error(f"Process loop error: {e}")
+        finally:
+            logger.info(f"Packet process loop {name} ended")
     
     def update_config(self, config_dict: Dict[str, Any]):
         """Update configuration"""
+        policy = config_dict.get('queue_overflow_policy', self.config.queue_overflow_policy)
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        
+        names = {f.name for f in fields(NetworkConfig)}
         with self.lock:
-            for key, value in config_dict.items():
-                if hasattr(self.config, key):
-                    setattr(self.config, key, value)
+            # สร้าง config ชุดใหม่แทนการแก้ของเดิม แล้วสลับ plan ทั้งก้อน
+            config = replace(self.config, **{k: v for k, v in config_dict.items() if k in names})
+            # compile และตรวจขนาด queue ก่อน: rules/profiles/ขนาดที่ผิดจะ raise โดยไม่แตะ config เดิม
+            plan = ImpairmentPlan.compile(config, self.shapers, self.shaper_lock)
+            self._queue_sizes(config)
+            reseed = config.seed != self.config.seed
+            retrace = any(getattr(config, name) != getattr(self.config, name) for name in TRACE_FIELDS)
+            reflow = any(getattr(config, name) != getattr(self.config, name) for name in FLOW_FIELDS)
+            # เปิดไฟล์ trace ใหม่ก่อนแก้อะไร: path ที่เปิดไม่ได้ไม่ทำให้ engine ค้างครึ่งทาง
+            writer = self._open_trace(config) if retrace and self.is_running else None
+            old_config, old_plan = self.config, self.plan
+            try:
+                self.config, self.plan = config, plan
+                if reseed:
+                    self._seed_shards()
+                self._configure_queue()
+                self._configure_shapers()
+                if reflow and self.is_running:
+                    self._configure_flows()
+                if retrace and self.is_running:
+                    self._start_trace(writer)
+            except Exception:
+                # คืน config / plan เดิมแล้ว apply ค่าเดิมกลับให้ส่วนที่อาจเปลี่ยนไปแล้ว
+                self.config, self.plan = old_config, old_plan
+                if reseed:
+                    self._seed_shards()
+                self._configure_queue()
+                self._configure_shapers()
+                if reflow and self.is_running:
+                    self._configure_flows()
+                if writer is not None and writer is not self.trace_writer:
+                    writer.close()
+                raise
             logger.info(f"Config updated: {config_dict}")
     
-    def get_stats(self):
-        """ได้ statistics ปัจจุบัน"""
-        stats = self.packet_queue.get_stats()
+    def _queue_sizes(self, cfg: NetworkConfig) -> Dict[bool, Tuple[int, int]]:
+        """(max_packets, max_bytes) ต่อ shard ของแต่ละทิศจาก lag × expected rate (ถ้าไม่ได้กำหนดเอง)
+
+        raise ValueError ถ้าเกิน MAX_SLOTS ต่อ queue (เรียกก่อนแก้ config / queues)
+        """
+        count = len(self.shards)
+        sizes = {}
+        for outbound in (False, True):
+            max_packets = cfg.queue_max_packets
+            if not max_packets:
+                # profile ที่ delay นานสุดของทิศนี้เป็นตัวกำหนดขนาด
+                direction_cfg = _direction_config(cfg, outbound)
+                configs = [direction_cfg] + [_profile_config(direction_cfg, overrides)
+                                             for overrides in cfg.profiles.values()]
+                max_delay_ms = max(_max_delay_ms(profile_cfg, outbound) for profile_cfg in configs)
+                max_packets = max(
+                    MIN_QUEUE_PACKETS,
+                    int(max_delay_ms / 1000.0 * cfg.queue_expected_pps * QUEUE_HEADROOM)
+                )
+            # แบ่ง capacity ให้แต่ละ shard เท่า ๆ กัน
+            per_shard = -(-int(max_packets) // count)
+            if per_shard > MAX_SLOTS:
+                raise ValueError(f"Delay queue too large: {per_shard} packets per shard "
+                                 f"(max {MAX_SLOTS}); lower queue_max_packets, queue_expected_pps "
+                                 f"or the maximum delay")
+            sizes[outbound] = (per_shard, -(-int(cfg.queue_max_bytes) // count))
+        return sizes
+    
+    def _configure_queue(self):
+        """Size delay queue ของแต่ละทิศตาม _queue_sizes"""
+        cfg = self.config
+        for outbound, (max_packets, max_bytes) in self._queue_sizes(cfg).items():
+            for shard in self.shards:
+                shard.queues[outbound].configure(
+                    max_packets,
+                    max_bytes,
+                    cfg.queue_overflow_policy,
+                    cfg.queue_block_timeout_ms,
+                )
+    
+    def _configure_pool(self, backend: PacketBackend):
+        """สร้าง BufferPool ใหม่ให้ backend ที่รองรับ (ต้องเรียกก่อน backend.open)"""
+        cfg = self.config
+        pool = None
+        if cfg.buffer_pool_enabled and backend.supports_pool:
+            pool = BufferPool(cfg.buffer_pool_max_free)
+            pool.recycle = self.trace_writer is None
+        backend.pool = pool
+        self.pool = pool
+        for shard in self.shards:
+            shard.pool = pool
+            for packet_queue in shard.queues:
+                packet_queue.pool = pool
+    
+    def _configure_trace(self):
+        """เปิด (หรือเปิดใหม่) trace writer ตาม config; แต่ละ shard ได้ ring ของตัวเอง"""
+        self._start_trace(self._open_trace(self.config))
+    
+    def _open_trace(self, cfg: NetworkConfig) -> Optional[TraceWriter]:
+        """TraceWriter ของ cfg ที่เปิดไฟล์แล้วแต่ยังไม่ start (None = trace ปิด)
+
+        ไม่แตะ shards / writer เดิม จึงเรียกก่อน apply config ได้ ไฟล์ที่เปิดไม่ได้ raise
+        ValueError; path เดียวกับ writer เดิมเปิดตอน start (หลัง writer เดิมปิดไฟล์แล้ว)
+        """
+        if not cfg.trace_enabled:
+            return None
+        writer = TraceWriter(cfg.trace_file, lambda: [s.trace for s in self.shards if s.trace is not None],
+                             max(20, int(cfg.trace_snaplen)))
+        current = self.trace_writer
+        if current is not None and os.path.abspath(current.path) == os.path.abspath(writer.path):
+            return writer
+        try:
+            writer.open()
+        except OSError as e:
+            raise ValueError(f"Cannot open trace file {cfg.trace_file}: {e}")
+        return writer
+    
+    def _start_trace(self, writer: Optional[TraceWriter]):
+        """ปิด trace เดิมแล้ว start writer จาก _open_trace พร้อม rings ใหม่ของทุก shard"""
+        self._stop_trace()
+        if writer is None:
+            return
+        # rings ถือ references ไว้ตัด bytes ทีหลัง: ห้าม buffers กลับ pool ระหว่าง trace
+        if self.pool is not None:
+            self.pool.recycle = False
+        for shard in self.shards:
+            shard.trace = TraceRing(self.config.trace_ring_records, writer.snaplen)
+        try:
+            writer.start()
+        except OSError as e:
+            for shard in self.shards:
+                shard.trace = None
+            if self.pool is not None:
+                self.pool.recycle = True
+            raise ValueError(f"Cannot open trace file {writer.path}: {e}")
+        self.trace_writer = writer
+    
+    def _stop_trace(self):
+        """ปลด rings จาก shards แล้วให้ writer drain ที่เหลือและปิดไฟล์"""
+        writer = self.trace_writer
+        rings = [shard.trace for shard in self.shards if shard.trace is not None]
+        for shard in self.shards:
+            shard.trace = None
+        if writer is not None:
+            writer.rings = lambda: rings
+            writer.stop()
+            self.trace_writer = None
+        if self.pool is not None:
+            self.pool.recycle = True
+    
+    def _configure_flows(self):
+        """สร้าง flow table ใหม่ให้ทุก shard ตาม config (flows_enabled=False = ไม่เก็บ)"""
+        cfg = self.config
+        for shard in self.shards:
+            if cfg.flows_enabled:
+                shard.flows = FlowTable(-(-int(cfg.flow_table_max) // len(self.shards)),
+                                        cfg.flow_idle_timeout_s)
+            else:
+                shard.flows = None
+    
+    def get_flows(self, limit: int = 20, sort: str = 'pps'):
+        """Top flows ตาม sort (pps, bps, packets, bytes, dropped, ...) จากทุก shard"""
+        tables = [shard.flows for shard in self.shards if shard.flows is not None]
+        now = time.monotonic()
+        return {
+            'enabled': self.config.flows_enabled,
+            'active': sum(len(table) for table in tables),
+            'evicted': sum(table.evicted for table in tables),
+            'expired': sum(table.expired for table in tables),
+            'sort': sort,
+            'flows': top_flows(tables, now, max(1, int(limit)), sort),
+        }
+    
+    def _configure_shapers(self):
+        """Apply shaper settings ให้ token bucket ทั้งสองทิศ (รวม inbound / outbound overrides)"""
+        outbound_cfg = _direction_config(self.config, True)
+        inbound_cfg = _direction_config(self.config, False)
+        with self.shaper_lock:
+            self.shapers[True].configure(outbound_cfg.shaper_outbound_kbps, outbound_cfg.shaper_burst_bytes,
+                                         outbound_cfg.shaper_queue_bytes)
+            self.shapers[False].configure(inbound_cfg.shaper_inbound_kbps, inbound_cfg.shaper_burst_bytes,
+                                          inbound_cfg.shaper_queue_bytes)
+    
+    def get_stats(self, reset: bool = False):
+        """ได้ statistics ปัจจุบัน (reset=True: snapshot แล้ว reset แบบ atomic)"""
+        if reset:
+            directions = [counters.snapshot_and_reset() for counters in self.counters]
+        else:
+            directions = [counters.snapshot() for counters in self.counters]
+        now = time.monotonic()
+        # ยอดรวมทั้งสองทิศ + แยกทิศใน stats['inbound'] / stats['outbound']
+        stats = {name: directions[0][name] + directions[1][name] for name in STAT_NAMES}
+        for outbound, direction in zip((False, True), directions):
+            queues = [shard.queues[outbound] for shard in self.shards]
+            direction['queue_size'] = sum(len(q) for q in queues)
+            direction['queue_bytes'] = sum(q.queued_bytes for q in queues)
+            direction['queue_capacity'] = sum(q.max_packets for q in queues)
+            direction['shaper_backlog'] = self.shapers[outbound].backlog(now)
+            direction['latency'] = self.get_latency(now, outbound)
+            stats['outbound' if outbound else 'inbound'] = direction
+        stats['shaper_outbound_backlog'] = directions[1]['shaper_backlog']
+        stats['shaper_inbound_backlog'] = directions[0]['shaper_backlog']
         stats['running'] = self.is_running
-        stats['queue_size'] = len(self.packet_queue.queue)
+        stats['workers'] = len(self.shards)
+        for name in ('queue_size', 'queue_bytes', 'queue_capacity'):
+            stats[name] = directions[0][name] + directions[1][name]
+        rules = self.plan.rules
+        stats['flow_cache_size'] = len(rules.cache) if rules is not None else 0
+        stats['latency'] = self.get_latency(now)
+        stats['reorder_held'] = sum(shard.reorder.held for shard in self.shards)
+        stats['loss_bursts'] = summarize_bursts([shard.loss_bursts for shard in self.shards])
+        writer = self.trace_writer
+        stats['trace_records'] = writer.records if writer is not None else 0
+        stats['trace_lost'] = sum(shard.trace.lost for shard in self.shards if shard.trace is not None)
+        stats['flows_active'] = sum(len(shard.flows) for shard in self.shards if shard.flows is not None)
+        pool = self.pool
+        stats['buffer_pool'] = pool.snapshot(reset) if pool is not None else None
+        stats['gc'] = self.gc_monitor.snapshot(now)
+        if reset:
+            for shard in self.shards:
+                shard.reset_stats()
+            self.gc_monitor.reset()
         return stats
     
+    def get_latency(self, now: Optional[float] = None, outbound: Optional[bool] = None):
+        """Percentiles (ms) ของ latency histograms ทุก shard ใน LATENCY_WINDOW_S ล่าสุด
+        (outbound None = ทั้งสองทิศ)"""
+        if now is None:
+            now = time.monotonic()
+        directions = (False, True) if outbound is None else (outbound,)
+        queues = [shard.queues[d] for shard in self.shards for d in directions]
+        direct = [shard.direct_processing[d] for shard in self.shards for d in directions]
+        return {
+            'window_s': LATENCY_WINDOW_S,
+            'queue_delay_ms': summarize((q.queue_delay for q in queues), now),
+            'release_error_ms': summarize((q.release_error for q in queues), now),
+            'processing_ms': summarize([q.processing for q in queues] + direct, now),
+        }
+    
+    def reset_stats(self):
+        """Reset statistics"""
+        for counters in self.counters:
+            counters.reset()
+        for shard in self.shards:
+            shard.reset_stats()
+        if self.pool is not None:
+            self.pool.counters.reset()
+        self.gc_monitor.reset()
+    
     def get_config(self):
         """ได้ config ปัจจุบัน"""
         return {
             'enabled': self.config.enabled,
             'filter_str': self.config.filter_str,
+            'backend': self.config.backend,
+            'backend_options': self.config.backend_options,
+            'batch_size': self.config.batch_size,
+            'workers': self.config.workers,
+            'seed': self.config.seed,
             'lag_enabled': self.config.lag_enabled,
             'lag_ms': self.config.lag_ms,
+            'lag_distribution': self.config.lag_distribution,
+            'lag_jitter_ms': self.config.lag_jitter_ms,
+            'lag_correlation': self.config.lag_correlation,
+            'lag_trace_file': self.config.lag_trace_file,
             'drop_enabled': self.config.drop_enabled,
             'drop_chance': self.config.drop_chance,
+            'drop_model': self.config.drop_model,
+            'drop_ge_p': self.config.drop_ge_p,
+            'drop_ge_r': self.config.drop_ge_r,
+            'drop_ge_loss_good': self.config.drop_ge_loss_good,
+            'drop_ge_loss_bad': self.config.drop_ge_loss_bad,
+            'drop_trace_file': self.config.drop_trace_file,
             'throttle_enabled': self.config.throttle_enabled,
             'throttle_ms': self.config.throttle_ms,
             'throttle_chance': self.config.throttle_chance,
@@ -343,8 +1600,40 @@ class NetworkImpairmentEngine:
             'out_of_order_enabled': self.config.out_of_order_enabled,
             'out_of_order_chance': self.config.out_of_order_chance,
             'ooo_queue_size': self.config.ooo_queue_size,
+            'ooo_gap': self.config.ooo_gap,
+            'ooo_timeout_ms': self.config.ooo_timeout_ms,
             'tamper_enabled': self.config.tamper_enabled,
             'tamper_chance': self.config.tamper_chance,
+            'tamper_mode': self.config.tamper_mode,
+            'tamper_ber': self.config.tamper_ber,
+            'tamper_burst_bytes': self.config.tamper_burst_bytes,
+            'tamper_ttl': self.config.tamper_ttl,
+            'tamper_dscp': self.config.tamper_dscp,
+            'tamper_tcp_window': self.config.tamper_tcp_window,
+            'tamper_keep_bad_checksum': self.config.tamper_keep_bad_checksum,
+            'shaper_enabled': self.config.shaper_enabled,
+            'shaper_outbound_kbps': self.config.shaper_outbound_kbps,
+            'shaper_inbound_kbps': self.config.shaper_inbound_kbps,
+            'shaper_burst_bytes': self.config.shaper_burst_bytes,
+            'shaper_queue_bytes': self.config.shaper_queue_bytes,
+            'queue_expected_pps': self.config.queue_expected_pps,
+            'queue_max_packets': self.config.queue_max_packets,
+            'queue_max_bytes': self.config.queue_max_bytes,
+            'queue_overflow_policy': self.config.queue_overflow_policy,
+            'queue_block_timeout_ms': self.config.queue_block_timeout_ms,
+            'rules': self.config.rules,
+            'profiles': self.config.profiles,
+            'inbound': self.config.inbound,
+            'outbound': self.config.outbound,
+            'trace_enabled': self.config.trace_enabled,
+            'trace_file': self.config.trace_file,
+            'trace_snaplen': self.config.trace_snaplen,
+            'trace_ring_records': self.config.trace_ring_records,
+            'flows_enabled': self.config.flows_enabled,
+            'flow_table_max': self.config.flow_table_max,
+            'flow_idle_timeout_s': self.config.flow_idle_timeout_s,
+            'buffer_pool_enabled': self.config.buffer_pool_enabled,
+            'buffer_pool_max_free': self.config.buffer_pool_max_free,
         }
 
 
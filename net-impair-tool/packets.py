@@ -0,0 +1,243 @@
+"""
+Lightweight IPv4/IPv6 packet helpers ที่ไม่ต้องพึ่ง pydivert
+SimPacket mimics the parts of pydivert.Packet the engine uses, for offline backends
+"""
+
+import socket
+import struct
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+
+# bytes 1 ตัวของแต่ละ protocol number (flow_key ไม่ต้องสร้าง bytes((protocol,)) ทุก packet)
+_PROTO_BYTE = tuple(bytes((value,)) for value in range(256))
+
+
+def internet_checksum(data, initial: int = 0) -> int:
+    """RFC 1071 one's complement checksum"""
+    if len(data) % 2:
+        data = bytes(data) + b'\x00'
+    total = initial + sum(struct.unpack(f'!{len(data) // 2}H', data))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def ones_sum(data, odd_start: bool = False) -> int:
+    """One's complement sum (16-bit, folded) ของ data; odd_start = byte แรกเป็น low byte ของ word"""
+    if odd_start:
+        data = b'\x00' + bytes(data)
+    return ~internet_checksum(data) & 0xFFFF
+
+
+def transport_layout(raw):
+    """(payload offset, transport checksum offset หรือ -1, is_udp) ของ raw IP packet"""
+    if raw[0] >> 4 == 6:
+        ihl = 40
+        protocol = raw[6]
+    else:
+        ihl = (raw[0] & 0x0F) * 4
+        protocol = raw[9]
+    if protocol == IPPROTO_UDP:
+        return ihl + 8, ihl + 6, True
+    if protocol == IPPROTO_TCP and len(raw) > ihl + 12:
+        return ihl + (raw[ihl + 12] >> 4) * 4, ihl + 16, False
+    return ihl, -1, False
+
+
+def patch_checksum(raw, offset: int, old_word: int, new_word: int, is_udp: bool = False):
+    """แก้ checksum ที่ offset แบบ in-place หลัง 16-bit word หนึ่งเปลี่ยน (RFC 1624 eqn. 3)
+
+    HC' = ~(~HC + ~m + m') ไม่ต้องอ่าน packet ทั้งก้อน; UDP checksum 0 (IPv4 ไม่ใช้
+    checksum) คงเป็น 0
+    """
+    checksum = (raw[offset] << 8) | raw[offset + 1]
+    if is_udp and checksum == 0:
+        return
+    total = (~checksum & 0xFFFF) + (~old_word & 0xFFFF) + new_word
+    total = (total & 0xFFFF) + (total >> 16)
+    total = (total & 0xFFFF) + (total >> 16)
+    checksum = ~total & 0xFFFF
+    if is_udp and checksum == 0:
+        checksum = 0xFFFF
+    raw[offset] = checksum >> 8
+    raw[offset + 1] = checksum & 0xFF
+
+
+def flip_bits(raw, index: int, mask: int, checksum_offset: int = -1, is_udp: bool = False):
+    """XOR byte ที่ index ด้วย mask แบบ in-place แล้วแก้ transport checksum แบบ incremental
+
+    IP/TCP/UDP headers มีความยาวเป็นเลขคู่ byte ที่ index คู่จึงเป็น high byte ของ word
+    """
+    if checksum_offset < 0:
+        raw[index] ^= mask
+        return
+    even = index & ~1
+    low = raw[even + 1] if even + 1 < len(raw) else 0
+    old_word = (raw[even] << 8) | low
+    raw[index] ^= mask
+    new_word = old_word ^ (mask << 8 if index == even else mask)
+    patch_checksum(raw, checksum_offset, old_word, new_word, is_udp)
+
+
+def flow_key(raw) -> bytes:
+    """5-tuple key (proto, src, dst, sport, dport) จาก raw IP packet เป็น bytes
+
+    ใช้เป็น dict key / hash สำหรับ sharding และ per-flow state; packets ที่
+    ไม่ใช่ TCP/UDP ใช้แค่ proto + addresses
+    """
+    first = raw[0]
+    if first == 0x45:
+        # IPv4 ไม่มี options (กรณีส่วนใหญ่): ports อยู่ที่ 20-24 ติดกับ addresses
+        protocol = raw[9]
+        if protocol == IPPROTO_TCP or protocol == IPPROTO_UDP:
+            return _PROTO_BYTE[protocol] + raw[12:24].tobytes()
+        return _PROTO_BYTE[protocol] + raw[12:20].tobytes()
+    if first >> 4 == 6:
+        protocol = raw[6]
+        key = _PROTO_BYTE[protocol] + raw[8:40].tobytes()
+        offset = 40
+    else:
+        protocol = raw[9]
+        key = _PROTO_BYTE[protocol] + raw[12:20].tobytes()
+        offset = (raw[0] & 0x0F) * 4
+    if protocol == IPPROTO_TCP or protocol == IPPROTO_UDP:
+        key += raw[offset:offset + 4].tobytes()
+    return key
+
+
+class SimPacket:
+    """Packet ใน memory สำหรับ synthetic/pcap backends
+
+    raw เป็น memoryview ของ bytearray เหมือน pydivert.Packet ดังนั้น
+    effect code เขียน in-place ได้เหมือนกันทั้งสองแบบ
+    """
+
+    __slots__ = ('raw', 'is_outbound', 'timestamp', 'bad_checksum')
+
+    def __init__(self, raw, is_outbound: bool = True, timestamp: float = 0.0):
+        if not isinstance(raw, memoryview):
+            raw = memoryview(bytearray(raw))
+        self.raw = raw
+        self.is_outbound = is_outbound
+        self.timestamp = timestamp
+        self.bad_checksum = False  # corruption ตั้งใจให้ checksum ผิด: backend ห้าม recalculate
+
+    @property
+    def is_inbound(self) -> bool:
+        return not self.is_outbound
+
+    @property
+    def ip_version(self) -> int:
+        return self.raw[0] >> 4
+
+    @property
+    def ip_header_len(self) -> int:
+        if self.ip_version == 6:
+            return 40
+        return (self.raw[0] & 0x0F) * 4
+
+    @property
+    def protocol(self) -> int:
+        return self.raw[6] if self.ip_version == 6 else self.raw[9]
+
+    @property
+    def src_addr(self) -> str:
+        if self.ip_version == 6:
+            return socket.inet_ntop(socket.AF_INET6, bytes(self.raw[8:24]))
+        return socket.inet_ntoa(bytes(self.raw[12:16]))
+
+    @property
+    def dst_addr(self) -> str:
+        if self.ip_version == 6:
+            return socket.inet_ntop(socket.AF_INET6, bytes(self.raw[24:40]))
+        return socket.inet_ntoa(bytes(self.raw[16:20]))
+
+    @property
+    def src_port(self):
+        if self.protocol not in (IPPROTO_TCP, IPPROTO_UDP):
+            return None
+        offset = self.ip_header_len
+        return (self.raw[offset] << 8) | self.raw[offset + 1]
+
+    @property
+    def dst_port(self):
+        if self.protocol not in (IPPROTO_TCP, IPPROTO_UDP):
+            return None
+        offset = self.ip_header_len + 2
+        return (self.raw[offset] << 8) | self.raw[offset + 1]
+
+    @property
+    def transport_header_len(self) -> int:
+        protocol = self.protocol
+        if protocol == IPPROTO_UDP:
+            return 8
+        if protocol == IPPROTO_TCP:
+            return (self.raw[self.ip_header_len + 12] >> 4) * 4
+        return 0
+
+    @property
+    def payload(self) -> bytes:
+        return bytes(self.raw[self.ip_header_len + self.transport_header_len:])
+
+    @payload.setter
+    def payload(self, value):
+        header = bytes(self.raw[:self.ip_header_len + self.transport_header_len])
+        self.raw = memoryview(bytearray(header + bytes(value)))
+        self._fix_lengths()
+
+    def copy(self) -> 'SimPacket':
+        return SimPacket(bytearray(self.raw), self.is_outbound, self.timestamp)
+
+    def _fix_lengths(self):
+        raw = self.raw
+        total = len(raw)
+        if self.ip_version == 6:
+            struct.pack_into('!H', raw, 4, total - 40)
+        else:
+            struct.pack_into('!H', raw, 2, total)
+        if self.protocol == IPPROTO_UDP:
+            struct.pack_into('!H', raw, self.ip_header_len + 4, total - self.ip_header_len)
+
+    def recalculate_checksums(self):
+        """คำนวณ IPv4 header checksum และ TCP/UDP checksum ใหม่ทั้งหมด"""
+        raw = self.raw
+        ihl = self.ip_header_len
+        version = self.ip_version
+        if version == 4:
+            raw[10:12] = b'\x00\x00'
+            struct.pack_into('!H', raw, 10, internet_checksum(raw[:ihl]))
+
+        protocol = self.protocol
+        if protocol == IPPROTO_UDP:
+            offset = ihl + 6
+        elif protocol == IPPROTO_TCP:
+            offset = ihl + 16
+        else:
+            return
+
+        segment_len = len(raw) - ihl
+        if version == 6:
+            pseudo = bytes(raw[8:40]) + struct.pack('!IxxxB', segment_len, protocol)
+        else:
+            pseudo = bytes(raw[12:20]) + struct.pack('!xBH', protocol, segment_len)
+        raw[offset:offset + 2] = b'\x00\x00'
+        checksum = internet_checksum(pseudo + bytes(raw[ihl:]))
+        if protocol == IPPROTO_UDP and checksum == 0:
+            checksum = 0xFFFF
+        struct.pack_into('!H', raw, offset, checksum)
+
+
+def build_udp_packet(src_addr: str, dst_addr: str, src_port: int, dst_port: int,
+                     payload: bytes = b'', is_outbound: bool = True) -> SimPacket:
+    """สร้าง IPv4/UDP SimPacket พร้อม checksum ที่ถูกต้อง"""
+    total = 20 + 8 + len(payload)
+    raw = bytearray(total)
+    struct.pack_into('!BBHHHBBH4s4s', raw, 0,
+                     0x45, 0, total, 0, 0x4000, 64, IPPROTO_UDP, 0,
+                     socket.inet_aton(src_addr), socket.inet_aton(dst_addr))
+    struct.pack_into('!HHHH', raw, 20, src_port, dst_port, 8 + len(payload), 0)
+    raw[28:] = payload
+    packet = SimPacket(raw, is_outbound)
+    packet.recalculate_checksums()
+    return packet
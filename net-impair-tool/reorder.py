@@ -0,0 +1,122 @@
+"""
+Bounded per-flow reorder buffer สำหรับ out-of-order stage
+Holds a packet until `gap` later packets of the same flow have passed (or a
+timeout expires), so packets swap places without a random extra delay
+"""
+
+from collections import deque
+from typing import List, Tuple
+
+# Packets ที่ hold ได้พร้อมกันทั้ง shard (เกินนี้ packet ใหม่ไม่ถูก hold)
+REORDER_MAX_HELD = 4096
+
+
+class _Held:
+    __slots__ = ('packet', 'key', 'delay', 'release_at', 'held_at', 'expires', 'done')
+
+    def __init__(self, packet, key, delay, release_at, held_at, expires):
+        self.packet = packet
+        self.key = key
+        self.delay = delay
+        self.release_at = release_at
+        self.held_at = held_at
+        self.expires = expires
+        self.done = False
+
+
+class ReorderBuffer:
+    """Hold buffer ของ shard หนึ่ง (writer เดียว: thread ที่ apply effects ให้ shard)
+
+    - flows: {flow_key: [passed, deque ของ _Held]} เฉพาะ flows ที่มี packet ถูก hold อยู่
+      passed นับ packets ของ flow ที่ผ่านไปแล้ว; packet ที่ hold จะออกเมื่อ passed
+      ถึง release_at = passed ตอน hold + gap (ต่อท้าย packet ที่ทำให้ครบ และได้ delay
+      เดียวกับมัน จึงออกจาก delay queue ตามหลังกัน)
+    - expiry: ทุก entry เรียงตามเวลา hold สำหรับ timeout flush (entries ที่ออกไปแล้ว
+      ถูกข้ามแบบ lazy)
+    งานต่อ packet เป็น O(1): dict lookup หนึ่งครั้ง + ตรวจหัว deque ของ flow
+    """
+
+    def __init__(self):
+        self.flows = {}
+        self.expiry = deque()
+        self.held = 0
+
+    def process(self, packets, delays, keys, hit: List[int], limit: int, gap: int,
+                timeout_s: float, now: float) -> Tuple[list, list, int]:
+        """Hold packets ที่ indices hit (ถ้า flow ยังมีที่ว่าง) แล้วปล่อย packets ที่ครบ gap
+
+        คืน (packets, delays, จำนวนที่ hold ใหม่)
+        """
+        flows = self.flows
+        out_packets = []
+        out_delays = []
+        held = 0
+        j = 0
+        next_hit = hit[0] if hit else -1
+        for i, packet in enumerate(packets):
+            key = keys[i]
+            flow = flows.get(key)
+            if i == next_hit:
+                j += 1
+                next_hit = hit[j] if j < len(hit) else -1
+                if self.held < REORDER_MAX_HELD and (flow is None or len(flow[1]) < limit):
+                    if flow is None:
+                        flow = flows[key] = [0, deque()]
+                    entry = _Held(packet, key, delays[i], flow[0] + gap, now, now + timeout_s)
+                    flow[1].append(entry)
+                    self.expiry.append(entry)
+                    self.held += 1
+                    held += 1
+                    continue
+
+            delay = delays[i]
+            out_packets.append(packet)
+            out_delays.append(delay)
+            if flow is not None:
+                flow[0] += 1
+                queue = flow[1]
+                while queue and queue[0].release_at <= flow[0]:
+                    entry = queue.popleft()
+                    entry.done = True
+                    self.held -= 1
+                    out_packets.append(entry.packet)
+                    out_delays.append(delay)
+                if not queue:
+                    del flows[key]
+        return out_packets, out_delays, held
+
+    def next_expiry(self):
+        """เวลา (monotonic) ที่ entry เก่าสุดจะครบ timeout หรือ None ถ้าไม่มี"""
+        expiry = self.expiry
+        while expiry and expiry[0].done:
+            expiry.popleft()
+        return expiry[0].expires if expiry else None
+
+    def expire(self, now: float) -> Tuple[list, list]:
+        """Packets ที่ hold ครบ timeout พร้อม delay ที่เหลือ (deadline เดิมของแต่ละตัว)"""
+        expiry = self.expiry
+        flows = self.flows
+        out_packets = []
+        out_delays = []
+        while expiry and (expiry[0].done or expiry[0].expires <= now):
+            entry = expiry.popleft()
+            if entry.done:
+                continue
+            # ปกติเป็นหัว deque ของ flow (ไม่ใช่ถ้า timeout เปลี่ยนระหว่างที่ hold อยู่)
+            flow = flows[entry.key]
+            if flow[1][0] is entry:
+                flow[1].popleft()
+            else:
+                flow[1].remove(entry)
+            if not flow[1]:
+                del flows[entry.key]
+            entry.done = True
+            self.held -= 1
+            out_packets.append(entry.packet)
+            out_delays.append(max(0.0, entry.delay - (now - entry.held_at) * 1000.0))
+        return out_packets, out_delays
+
+    def clear(self):
+        self.flows.clear()
+        self.expiry.clear()
+        self.held = 0
@@ -0,0 +1,237 @@
+"""
+Per-flow impairment rules
+Ordered rule table (proto / IP prefix / port range -> profile) compiled into an
+exact 5-tuple hash plus a destination-prefix LPM index, with a per-flow cache
+"""
+
+import ipaddress
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from packets import IPPROTO_TCP, IPPROTO_UDP
+
+PROTOCOLS = {'tcp': IPPROTO_TCP, 'udp': IPPROTO_UDP, 'icmp': 1, 'icmpv6': 58}
+
+# Per-flow cache: ล้างทั้งก้อนเมื่อเต็ม (flows ที่ยัง active จะถูก cache ใหม่ในไม่กี่ packets)
+FLOW_CACHE_MAX = 65536
+
+NO_MATCH = -1
+
+
+def _parse_ports(value) -> Optional[Tuple[int, int]]:
+    """'27015', 27015, '27015-27030' หรือ [lo, hi] -> (lo, hi); None = ทุก port"""
+    if value is None or value == '' or value == '*':
+        return None
+    if isinstance(value, int):
+        lo = hi = value
+    elif isinstance(value, (list, tuple)) and len(value) == 2:
+        lo, hi = int(value[0]), int(value[1])
+    else:
+        text = str(value)
+        lo_text, _, hi_text = text.partition('-')
+        lo = int(lo_text)
+        hi = int(hi_text) if hi_text else lo
+    if not 0 <= lo <= hi <= 65535:
+        raise ValueError(f"Invalid port range: {value}")
+    return lo, hi
+
+
+def _parse_proto(value) -> Optional[int]:
+    if value is None or value == '' or value == '*' or value == 'any':
+        return None
+    if isinstance(value, int):
+        return value
+    try:
+        return PROTOCOLS[str(value).lower()]
+    except KeyError:
+        raise ValueError(f"Unknown protocol: {value}")
+
+
+def _parse_prefix(value):
+    if value is None or value == '' or value == '*' or value == 'any':
+        return None
+    return ipaddress.ip_network(str(value), strict=False)
+
+
+@dataclass(frozen=True)
+class Rule:
+    """หนึ่งแถวของ rule table (field ที่เป็น None = match ทุกค่า)"""
+    order: int
+    name: str
+    profile: str
+    proto: Optional[int] = None
+    src: Optional[Any] = None   # ipaddress.IPv4Network / IPv6Network
+    dst: Optional[Any] = None
+    src_ports: Optional[Tuple[int, int]] = None
+    dst_ports: Optional[Tuple[int, int]] = None
+
+    @classmethod
+    def parse(cls, spec: Dict[str, Any], order: int) -> 'Rule':
+        """สร้างจาก dict เช่น {"proto": "udp", "dst": "203.0.113.0/24",
+        "dst_port": "27015-27030", "profile": "game"}"""
+        if 'profile' not in spec:
+            raise ValueError(f"Rule {order} has no profile")
+        src = _parse_prefix(spec.get('src'))
+        dst = _parse_prefix(spec.get('dst'))
+        if src is not None and dst is not None and src.version != dst.version:
+            raise ValueError(f"Rule {order} mixes IPv4 and IPv6 prefixes")
+        return cls(
+            order=order,
+            name=str(spec.get('name', f"rule{order}")),
+            profile=str(spec['profile']),
+            proto=_parse_proto(spec.get('proto')),
+            src=src,
+            dst=dst,
+            src_ports=_parse_ports(spec.get('src_port')),
+            dst_ports=_parse_ports(spec.get('dst_port')),
+        )
+
+    @property
+    def version(self) -> Optional[int]:
+        prefix = self.dst or self.src
+        return prefix.version if prefix is not None else None
+
+    @property
+    def is_exact(self) -> bool:
+        """ระบุครบทั้ง 5-tuple (host prefixes + port เดียว) -> ลง exact hash ได้"""
+        return (self.proto in (IPPROTO_TCP, IPPROTO_UDP)
+                and self.src is not None and self.src.prefixlen == self.src.max_prefixlen
+                and self.dst is not None and self.dst.prefixlen == self.dst.max_prefixlen
+                and self.src_ports is not None and self.src_ports[0] == self.src_ports[1]
+                and self.dst_ports is not None and self.dst_ports[0] == self.dst_ports[1])
+
+    def exact_key(self) -> bytes:
+        """Key รูปแบบเดียวกับ packets.flow_key"""
+        return (bytes([self.proto]) + self.src.network_address.packed
+                + self.dst.network_address.packed
+                + self.src_ports[0].to_bytes(2, 'big') + self.dst_ports[0].to_bytes(2, 'big'))
+
+    def matches(self, version: int, proto: int, src: int, dst: int, sport, dport) -> bool:
+        if self.proto is not None and proto != self.proto:
+            return False
+        if self.src is not None and (version != self.src.version
+                                     or src & self._src_mask != self._src_net):
+            return False
+        if self.dst is not None and (version != self.dst.version
+                                     or dst & self._dst_mask != self._dst_net):
+            return False
+        if self.src_ports is not None and (sport is None or not self.src_ports[0] <= sport <= self.src_ports[1]):
+            return False
+        if self.dst_ports is not None and (dport is None or not self.dst_ports[0] <= dport <= self.dst_ports[1]):
+            return False
+        return True
+
+    def __post_init__(self):
+        # integer masks สำหรับ matches() (คำนวณครั้งเดียว)
+        for side in ('src', 'dst'):
+            prefix = getattr(self, side)
+            if prefix is None:
+                mask = net = 0
+            else:
+                mask = int(prefix.netmask)
+                net = int(prefix.network_address)
+            object.__setattr__(self, f'_{side}_mask', mask)
+            object.__setattr__(self, f'_{side}_net', net)
+
+
+def _parse_key(key: bytes):
+    """flow_key bytes -> (version, proto, src, dst, sport, dport)"""
+    if len(key) in (9, 13):
+        version, alen = 4, 4
+    else:
+        version, alen = 6, 16
+    proto = key[0]
+    src = int.from_bytes(key[1:1 + alen], 'big')
+    dst = int.from_bytes(key[1 + alen:1 + 2 * alen], 'big')
+    ports = key[1 + 2 * alen:]
+    if ports:
+        return version, proto, src, dst, (ports[0] << 8) | ports[1], (ports[2] << 8) | ports[3]
+    return version, proto, src, dst, None, None
+
+
+class RuleTable:
+    """Rule table ที่ compile แล้ว: classify(flow_key) -> index ของ profile หรือ NO_MATCH
+
+    Semantics คือ first match ตามลำดับ rules แต่ lookup ไม่ได้ scan ทั้ง list:
+    - exact: dict {5-tuple key: rule} สำหรับ rules ที่ระบุครบ 5-tuple
+    - LPM index: {(version, prefixlen): {dst network >> host bits: [rules]}}
+      lookup ไล่เฉพาะ prefix lengths ที่มีอยู่จริง (ไม่เกิน 33/129 ครั้ง ปกติไม่กี่ครั้ง)
+      แล้วตรวจ proto/src/ports ของ candidates เลือก order ต่ำสุด
+    - cache: {flow_key: profile index} ทำให้ flow ที่เคยเห็นแล้วเป็น dict lookup เดียว
+    Immutable หลัง compile (ยกเว้น cache); เปลี่ยน rules = สร้าง table ใหม่
+    """
+
+    def __init__(self, rules: List[Rule], profile_names: List[str]):
+        self.rules = list(rules)
+        self.profile_names = list(profile_names)
+        index = {name: i for i, name in enumerate(self.profile_names)}
+        for rule in self.rules:
+            if rule.profile not in index:
+                raise ValueError(f"Rule '{rule.name}' uses unknown profile '{rule.profile}'")
+        self._profile_of = [index[rule.profile] for rule in self.rules]
+
+        self._exact: Dict[bytes, Rule] = {}
+        self._lpm: Dict[Tuple[int, int], Dict[int, List[Rule]]] = {}
+        self._any_dst: List[Rule] = []
+        for rule in self.rules:
+            if rule.is_exact:
+                self._exact.setdefault(rule.exact_key(), rule)
+            elif rule.dst is None:
+                self._any_dst.append(rule)
+            else:
+                bits = rule.dst.max_prefixlen
+                plen = rule.dst.prefixlen
+                bucket = self._lpm.setdefault((rule.dst.version, plen), {})
+                bucket.setdefault(int(rule.dst.network_address) >> (bits - plen), []).append(rule)
+        self._plens = {
+            version: sorted((plen for v, plen in self._lpm if v == version), reverse=True)
+            for version in (4, 6)
+        }
+        wildcard_orders = [rule.order for rule in self.rules if not rule.is_exact]
+        self._first_wildcard = min(wildcard_orders) if wildcard_orders else len(self.rules)
+        self.cache: Dict[bytes, int] = {}
+
+    @classmethod
+    def compile(cls, rule_specs: List[Dict[str, Any]], profile_names: List[str]) -> 'RuleTable':
+        return cls([Rule.parse(spec, i) for i, spec in enumerate(rule_specs)], profile_names)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def classify(self, key: bytes) -> int:
+        """Profile index ของ flow (NO_MATCH ถ้าไม่มี rule ไหน match)"""
+        cache = self.cache
+        profile = cache.get(key)
+        if profile is None:
+            rule = self.lookup(key)
+            profile = NO_MATCH if rule is None else self._profile_of[rule.order]
+            if len(cache) >= FLOW_CACHE_MAX:
+                cache.clear()
+            cache[key] = profile
+        return profile
+
+    def lookup(self, key: bytes) -> Optional[Rule]:
+        """Rule แรก (ตามลำดับ) ที่ match flow นี้ โดยไม่ใช้ cache"""
+        best = self._exact.get(key)
+        if best is not None and best.order < self._first_wildcard:
+            return best
+
+        version, proto, src, dst, sport, dport = _parse_key(key)
+        bits = 32 if version == 4 else 128
+        lpm = self._lpm
+        for plen in self._plens[version]:
+            candidates = lpm[(version, plen)].get(dst >> (bits - plen))
+            if candidates:
+                for rule in candidates:
+                    if best is not None and rule.order >= best.order:
+                        break
+                    if rule.matches(version, proto, src, dst, sport, dport):
+                        best = rule
+                        break
+        for rule in self._any_dst:
+            if best is not None and rule.order >= best.order:
+                break
+            if rule.matches(version, proto, src, dst, sport, dport):
+                best = rule
+                break
+        return best
@@ -0,0 +1,357 @@
+"""
+Scheduled impairment scenarios
+Plays a timeline of config phases (steps, linear ramps, periodic link flaps,
+repeats) against the engine from one runner thread, without HTTP in the loop
+"""
+
+import json
+import sys
+import threading
+import time
+import logging
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import yaml
+    HAS_YAML = True
+except ImportError:
+    HAS_YAML = False
+
+import examples
+from network import ImpairmentPlan, NetworkConfig
+
+logger = logging.getLogger(__name__)
+
+# Ramp: ค่าถูก interpolate และ apply ทุก RAMP_INTERVAL_S (ถ้า phase ไม่ได้กำหนด)
+RAMP_INTERVAL_S = 0.1
+RAMP_MIN_INTERVAL_S = 0.01
+
+# Runner รอด้วย Event.wait จนเหลือ SPIN_S ก่อน deadline แล้ว yield-spin (ความละเอียด ~ms)
+# Windows timer ละเอียด ~15.6 ms จึงต้อง spin นานกว่า
+SPIN_S = 0.016 if sys.platform == 'win32' else 0.001
+
+# Fields ที่มีผลเฉพาะตอน start: scenario เปลี่ยนไม่ได้
+START_ONLY_FIELDS = ('filter_str', 'backend', 'backend_options', 'workers')
+
+CONFIG_FIELDS = {f.name for f in fields(NetworkConfig)}
+
+
+def _preset(name: str) -> Dict[str, Any]:
+    """Effect settings จาก examples.py ตามชื่อ (เช่น POOR_WIFI)"""
+    value = getattr(examples, name, None)
+    if not name.isupper() or not isinstance(value, dict):
+        raise ValueError(f"Unknown preset: {name}")
+    # filter_str ของ preset เป็นของตอน start: scenario ใช้แค่ effect settings
+    return {k: v for k, v in value.items() if k not in START_ONLY_FIELDS}
+
+
+def _check_keys(values: Dict[str, Any], where: str):
+    unknown = set(values) - CONFIG_FIELDS
+    if unknown:
+        raise ValueError(f"{where}: unknown config keys {sorted(unknown)}")
+    fixed = set(values) & set(START_ONLY_FIELDS)
+    if fixed:
+        raise ValueError(f"{where}: {sorted(fixed)} can only change with a restart")
+
+
+def _diff(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Keys ของ new ที่ค่าต่างจาก old"""
+    return {k: v for k, v in new.items() if old.get(k) != v}
+
+
+def _interpolate(start, end, fraction: float):
+    value = start + (end - start) * fraction
+    if isinstance(start, int) and isinstance(end, int) and not isinstance(start, bool):
+        return int(round(value))
+    return value
+
+
+@dataclass(frozen=True)
+class Flap:
+    """Link flap ในหนึ่ง phase: ทุก period_s จะ apply config (down) นาน down_s แล้วกลับ"""
+    period_s: float
+    down_s: float
+    config: Dict[str, Any]
+    offset_s: float = 0.0
+
+
+@dataclass(frozen=True)
+class Phase:
+    """ช่วงหนึ่งของ timeline: config คงที่ + ramp (ค่าเริ่ม -> ค่าจบ) หรือ flap"""
+    name: str
+    duration_s: float
+    config: Dict[str, Any] = field(default_factory=dict)
+    ramp: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    ramp_interval_s: float = RAMP_INTERVAL_S
+    flap: Optional[Flap] = None
+
+    @classmethod
+    def parse(cls, spec: Dict[str, Any], index: int) -> 'Phase':
+        name = str(spec.get('name', f"phase{index}"))
+        duration = float(spec.get('duration_s', 0))
+        if duration <= 0:
+            raise ValueError(f"Phase '{name}': duration_s must be > 0")
+        config = _preset(spec['preset']) if 'preset' in spec else {}
+        config.update(spec.get('config', {}))
+        _check_keys(config, f"Phase '{name}'")
+
+        ramp = {}
+        for key, value in spec.get('ramp', {}).items():
+            if not isinstance(value, (list, tuple)) or len(value) != 2:
+                raise ValueError(f"Phase '{name}': ramp '{key}' must be [start, end]")
+            if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value):
+                raise ValueError(f"Phase '{name}': ramp '{key}' must be numeric")
+            ramp[key] = (value[0], value[1])
+        _check_keys(ramp, f"Phase '{name}' ramp")
+        interval = max(RAMP_MIN_INTERVAL_S, float(spec.get('ramp_interval_ms', RAMP_INTERVAL_S * 1000)) / 1000.0)
+
+        flap = None
+        if 'flap' in spec:
+            if ramp:
+                raise ValueError(f"Phase '{name}': ramp and flap cannot be combined")
+            f = spec['flap']
+            flap = Flap(float(f['period_s']), float(f['down_s']), dict(f.get('config', {})),
+                        float(f.get('offset_s', 0)))
+            if not 0 < flap.down_s < flap.period_s:
+                raise ValueError(f"Phase '{name}': flap needs 0 < down_s < period_s")
+            _check_keys(flap.config, f"Phase '{name}' flap")
+        return cls(name, duration, config, ramp, interval, flap)
+
+    def events(self, start_s: float, base: Dict[str, Any]) -> List[Tuple[float, Dict[str, Any]]]:
+        """(offset_s, config เต็ม) ของ phase นี้ เริ่มที่ start_s"""
+        config = {**base, **self.config}
+        if self.ramp:
+            steps = max(1, int(round(self.duration_s / self.ramp_interval_s)))
+            out = []
+            for k in range(steps + 1):
+                fraction = k / steps
+                values = {key: _interpolate(a, b, fraction) for key, (a, b) in self.ramp.items()}
+                out.append((start_s + self.duration_s * fraction, {**config, **values}))
+            return out
+        out = [(start_s, config)]
+        if self.flap is not None:
+            flap = self.flap
+            down = {**config, **flap.config}
+            t = flap.offset_s
+            while t < self.duration_s:
+                out.append((start_s + t, down))
+                if t + flap.down_s < self.duration_s:
+                    out.append((start_s + t + flap.down_s, config))
+                t += flap.period_s
+        return out
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """Timeline ของ phases; repeat = จำนวนรอบ (0 = วนจนกว่าจะ stop)
+
+    ทุก event apply base + config ของ phase (ไม่สะสมจาก phase ก่อน) run เดียวกันจึงได้
+    ลำดับ config เดียวกันทุกครั้ง base = config ของ engine ตอนเริ่ม + scenario base
+    """
+    name: str
+    phases: Tuple[Phase, ...]
+    repeat: int = 1
+    base: Dict[str, Any] = field(default_factory=dict)
+    restore: bool = True  # คืน config เดิมเมื่อจบหรือถูก stop
+
+    @classmethod
+    def parse(cls, spec: Dict[str, Any]) -> 'Scenario':
+        if not isinstance(spec, dict):
+            raise ValueError("Scenario must be a mapping")
+        phases = spec.get('phases')
+        if not phases:
+            raise ValueError("Scenario has no phases")
+        base = spec.get('base', {})
+        base = _preset(base) if isinstance(base, str) else dict(base)
+        _check_keys(base, "Scenario base")
+        repeat = spec.get('repeat', 1)
+        if repeat is True:
+            repeat = 0
+        return cls(
+            name=str(spec.get('name', 'scenario')),
+            phases=tuple(Phase.parse(p, i) for i, p in enumerate(phases)),
+            repeat=max(0, int(repeat)),
+            base=base,
+            restore=bool(spec.get('restore', True)),
+        )
+
+    @classmethod
+    def loads(cls, text: str, fmt: str = 'json') -> 'Scenario':
+        """Parse จาก text (fmt: json หรือ yaml)"""
+        if fmt == 'yaml':
+            if not HAS_YAML:
+                raise ValueError("YAML scenarios require PyYAML (pip install pyyaml)")
+            return cls.parse(yaml.safe_load(text))
+        return cls.parse(json.loads(text))
+
+    @classmethod
+    def load(cls, path: str) -> 'Scenario':
+        """อ่านจากไฟล์ .json / .yaml / .yml"""
+        fmt = 'yaml' if path.lower().endswith(('.yaml', '.yml')) else 'json'
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.loads(f.read(), fmt)
+
+    @property
+    def duration_s(self) -> float:
+        return sum(phase.duration_s for phase in self.phases)
+
+    def timeline(self, base: Dict[str, Any]) -> List[Tuple[float, int, Dict[str, Any]]]:
+        """(offset_s, phase index, config เต็ม) ของหนึ่งรอบ เรียงตามเวลา"""
+        base = {**base, **self.base}
+        events = []
+        start = 0.0
+        for index, phase in enumerate(self.phases):
+            events += [(t, index, config) for t, config in phase.events(start, base)]
+            start += phase.duration_s
+        events.sort(key=lambda event: event[0])  # stable: ลำดับเดิมเมื่อเวลาเท่ากัน
+        return events
+
+
+def _validate(config: Dict[str, Any], base: NetworkConfig):
+    """Compile config ล่วงหน้า (models/rules ที่ผิดจะ raise ก่อน scenario เริ่ม)"""
+    ImpairmentPlan.compile(replace(base, **config))
+
+
+class ScenarioRunner:
+    """เล่น Scenario กับ engine ใน thread เดียว
+
+    timeline ถูกแปลงเป็น deltas (เฉพาะ keys ที่เปลี่ยนจาก event ก่อน) ตอน start
+    runner รอถึง deadline แบบ absolute (start + offset ไม่สะสม drift) แล้ว
+    เรียก engine.update_config(delta) ซึ่งสลับ plan ทั้งก้อนระหว่าง batches;
+    status() รายงาน phase ปัจจุบันและ lateness ของการ apply
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.scenario: Optional[Scenario] = None
+        self._status: Dict[str, Any] = {'running': False}
+
+    def start(self, scenario: Scenario):
+        """Validate แล้วเริ่มเล่น scenario (หยุดตัวที่เล่นอยู่ก่อน)"""
+        self.stop()
+        original = self.engine.get_config()
+        base = {k: v for k, v in original.items() if k in CONFIG_FIELDS and k not in START_ONLY_FIELDS}
+        timeline = scenario.timeline(base)
+
+        # validate จุดเริ่ม/จบของทุก phase และ flap config (ramp ระหว่างทางเป็นค่าระหว่างนั้น)
+        current = self.engine.config
+        checked = set()
+        for i, (_, index, config) in enumerate(timeline):
+            last_of_phase = i + 1 == len(timeline) or timeline[i + 1][1] != index
+            if index not in checked or last_of_phase or scenario.phases[index].flap is not None:
+                _validate(config, current)
+                checked.add(index)
+
+        # deltas ล่วงหน้า: แต่ละ event ส่งเฉพาะ keys ที่ต่างจาก event ก่อน
+        deltas = []
+        previous = base
+        for offset, index, config in timeline:
+            deltas.append((offset, index, _diff(previous, config), config))
+            previous = config
+        # รอบถัดไปเริ่มต่อจาก config สุดท้ายของรอบก่อน ไม่ใช่จาก base
+        wrap = _diff(previous, timeline[0][2])
+
+        with self.lock:
+            self.scenario = scenario
+            self.stop_event = threading.Event()
+            self._status = {
+                'running': True,
+                'name': scenario.name,
+                'phase': scenario.phases[0].name,
+                'phase_index': 0,
+                'iteration': 0,
+                'repeat': scenario.repeat,
+                'duration_s': scenario.duration_s,
+                'elapsed_s': 0.0,
+                'events_applied': 0,
+                'last_lateness_ms': 0.0,
+                'max_lateness_ms': 0.0,
+                'error': None,
+            }
+            self.thread = threading.Thread(
+                target=self._run,
+                args=(scenario, deltas, wrap, base, self.stop_event),
+                daemon=True,
+                name="ScenarioRunner"
+            )
+            self.thread.start()
+        logger.info(f"Scenario '{scenario.name}' started ({len(deltas)} events, "
+                    f"{scenario.duration_s:.1f}s per iteration)")
+
+    def stop(self):
+        """หยุด scenario ที่เล่นอยู่ (ถ้ามี) และรอ thread จบ"""
+        thread = self.thread
+        if thread is None:
+            return
+        self.stop_event.set()
+        if thread is not threading.current_thread():
+            thread.join(timeout=2)
+        self.thread = None
+
+    def status(self) -> Dict[str, Any]:
+        with self.lock:
+            status = dict(self._status)
+        return status
+
+    def _wait_until(self, deadline: float, stop_event: threading.Event) -> bool:
+        """รอถึง deadline (monotonic); False ถ้าถูก stop ระหว่างรอ"""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return not stop_event.is_set()
+            if remaining > SPIN_S:
+                if stop_event.wait(remaining - SPIN_S):
+                    return False
+            else:
+                time.sleep(0)
+
+    def _run(self, scenario: Scenario, deltas, wrap: Dict[str, Any], base: Dict[str, Any],
+             stop_event: threading.Event):
+        started = time.monotonic()
+        iteration = 0
+        applied = base
+        try:
+            while True:
+                for i, (offset, index, delta, config) in enumerate(deltas):
+                    deadline = started + offset
+                    if not self._wait_until(deadline, stop_event):
+                        return
+                    if iteration and i == 0:
+                        delta = wrap
+                    if delta:
+                        self.engine.update_config(delta)
+                    applied = config
+                    lateness_ms = (time.monotonic() - deadline) * 1000.0
+                    with self.lock:
+                        status = self._status
+                        status['phase'] = scenario.phases[index].name
+                        status['phase_index'] = index
+                        status['iteration'] = iteration
+                        status['elapsed_s'] = round(time.monotonic() - started, 3)
+                        status['events_applied'] += 1
+                        status['last_lateness_ms'] = round(lateness_ms, 3)
+                        status['max_lateness_ms'] = round(max(status['max_lateness_ms'], lateness_ms), 3)
+                iteration += 1
+                if scenario.repeat and iteration >= scenario.repeat:
+                    # รอให้ phase สุดท้ายครบเวลาก่อนจบ
+                    self._wait_until(started + scenario.duration_s, stop_event)
+                    return
+                started += scenario.duration_s
+        except Exception as e:
+            logger.error(f"Scenario '{scenario.name}' error: {e}")
+            with self.lock:
+                self._status['error'] = str(e)
+        finally:
+            restore = _diff(applied, base)
+            if scenario.restore and restore:
+                try:
+                    self.engine.update_config(restore)
+                except Exception as e:
+                    logger.error(f"Scenario restore error: {e}")
+            with self.lock:
+                self._status['running'] = False
+            logger.info(f"Scenario '{scenario.name}' ended after {iteration} iteration(s)")
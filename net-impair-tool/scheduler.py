@@ -0,0 +1,82 @@
+"""
+Deadline scheduler สำหรับ delayed packets
+Releases packet slots strictly by ready time (min-heap of int keys), not by arrival order
+"""
+
+import heapq
+
+
+# SlotScheduler: key = (deadline เป็น µs นับจาก epoch << SLOT_BITS) | slot
+SLOT_BITS = 24
+SLOT_MASK = (1 << SLOT_BITS) - 1
+MAX_SLOTS = 1 << SLOT_BITS
+
+
+class SlotScheduler:
+    """Min-heap ของ slot indices เรียงตาม deadline โดยเก็บเป็น int เดียวต่อ packet
+
+    Key = (µs จาก epoch ถึง deadline ปัดขึ้น) << SLOT_BITS | slot จึงไม่มี tuple/float
+    ต่อ entry (~40 bytes รวม pointer ใน heap แทน ~120 ของ (float, seq, slot));
+    push และ pop_ready ปัด µs แบบเดียวกัน entry จึงออกได้เร็วสุดไม่เกิน 1 µs ก่อน
+    ready_time และ next_deadline() <= now รับประกันว่า pop_ready(now) ได้ entry นั้น
+    epoch ย้ายมาที่ deadline ของ entry แรกทุกครั้งที่ heap ว่าง keys จึงเล็ก
+    (≤ 60 bits = int 2 digits จนกว่า queue จะไม่ว่างติดกัน ~19 ชั่วโมง)
+
+    Deadline เท่ากันออกตามเลข slot (ไม่ใช่ลำดับ push) ผู้เรียกที่ต้องการ FIFO
+    ให้ entry เดียวแทนหลาย packets ได้ (slot = หัวของ chain ที่ผู้เรียกเก็บเอง
+    เช่น PacketQueue) แล้วใช้ head_slot / replace_head ตอนตัดหัว chain ทีละตัว
+    """
+
+    def __init__(self):
+        self._heap = []
+        self.epoch = 0.0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, ready_time: float, slot: int):
+        """เพิ่ม slot ที่จะ ready ตอน ready_time (time.monotonic)"""
+        heap = self._heap
+        if not heap:
+            self.epoch = ready_time
+        heapq.heappush(heap, ((int((ready_time - self.epoch) * 1000000.0) + 1) << SLOT_BITS) | slot)
+
+    def next_deadline(self):
+        """ready_time ที่ใกล้ที่สุด (ปัดเป็น µs) หรือ None ถ้า scheduler ว่าง"""
+        if self._heap:
+            return self.epoch + (self._heap[0] >> SLOT_BITS) / 1000000.0
+        return None
+
+    def pop_head(self) -> int:
+        """Pop slot ที่ deadline ใกล้สุด (ไม่สนว่า ready หรือยัง)"""
+        return heapq.heappop(self._heap) & SLOT_MASK
+
+    def head_slot(self) -> int:
+        """Slot ของ entry ที่ deadline ใกล้สุด (ต้องไม่ว่าง)"""
+        return self._heap[0] & SLOT_MASK
+
+    def replace_head(self, slot: int):
+        """เปลี่ยน slot ของ entry หัว heap โดยคง deadline เดิม"""
+        heap = self._heap
+        heapq.heapreplace(heap, (heap[0] & ~SLOT_MASK) | slot)
+
+    def pop_ready(self, now: float, deadlines=None):
+        """Pop ทุก slot ที่ deadline <= now; deadlines (list) รับ deadline ของแต่ละ slot ถ้าให้มา"""
+        heap = self._heap
+        if not heap:
+            return []
+        limit = ((int((now - self.epoch) * 1000000.0) + 1) << SLOT_BITS) | SLOT_MASK
+        if heap[0] > limit:
+            return []
+        keys = []
+        pop = heapq.heappop
+        while heap and heap[0] <= limit:
+            keys.append(pop(heap))
+        if deadlines is not None:
+            epoch = self.epoch
+            deadlines += [epoch + (key >> SLOT_BITS) / 1000000.0 for key in keys]
+        return [key & SLOT_MASK for key in keys]
+
+    def clear(self):
+        """ลบทุก slot ออก"""
+        self._heap.clear()
@@ -0,0 +1,67 @@
+"""
+Token-bucket bandwidth shaper
+Caps throughput at a target rate with burst allowance and a bounded byte queue
+"""
+
+
+class TokenBucket:
+    """Token bucket ต่อทิศทาง (rate เป็น kbit/s, burst/queue เป็น bytes)
+
+    Tokens ติดลบได้: ค่าติดลบคือ bytes ที่รอ serialize อยู่ใน shaper queue
+    admit() คืน delay (ms) ที่ packet ต้องรอจนส่งครบตาม rate หรือ None ถ้า
+    queue เต็ม (tail drop; queue_bytes=0 คือ policer) ทุกอย่างเป็น O(1) ไม่มี timer
+    """
+
+    __slots__ = ('rate', 'burst', 'queue_limit', 'tokens', 'last')
+
+    def __init__(self, rate_kbps: float = 0, burst_bytes: int = 15000, queue_bytes: int = 64000):
+        self.rate = 0.0
+        self.burst = 0
+        self.queue_limit = 0
+        self.tokens = 0.0
+        self.last = None
+        self.configure(rate_kbps, burst_bytes, queue_bytes)
+
+    def configure(self, rate_kbps: float, burst_bytes: int, queue_bytes: int):
+        """ตั้งค่าใหม่โดยไม่ reset backlog ที่มีอยู่"""
+        self.rate = max(0.0, float(rate_kbps)) * 1000.0 / 8.0  # bytes/s
+        self.burst = max(0, int(burst_bytes))
+        self.queue_limit = max(0, int(queue_bytes))
+        if self.last is None:
+            self.tokens = float(self.burst)
+        else:
+            self.tokens = min(self.tokens, float(self.burst))
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def backlog(self, now: float) -> int:
+        """Bytes ที่ยังรอ serialize ณ เวลา now"""
+        if self.last is None or not self.rate:
+            return 0
+        tokens = self.tokens + (now - self.last) * self.rate
+        return int(-tokens) if tokens < 0 else 0
+
+    def admit(self, length: int, now: float):
+        """รับ packet ขนาด length bytes ณ เวลา now (monotonic seconds)"""
+        rate = self.rate
+        if not rate:
+            return 0.0
+        if self.last is None:
+            tokens = float(self.burst)
+        else:
+            tokens = self.tokens + (now - self.last) * rate
+            if tokens > self.burst:
+                tokens = float(self.burst)
+        self.last = now
+
+        if length - tokens > self.queue_limit:
+            self.tokens = tokens
+            return None  # tail drop
+
+        tokens -= length
+        self.tokens = tokens
+        if tokens >= 0:
+            return 0.0
+        return -tokens / rate * 1000.0
@@ -10,6 +10,7 @@
 const AppState = {
     isRunning: false,
     updateInterval: null,
+    statsSource: null,
     config: {},
     previousStats: {}
 };
@@ -317,7 +318,7 @@ async function resetStats() {
         const response = await apiCall('/reset-stats', 'POST');
         
         if (response && response.status === 'ok') {
-            updateStats({ 
+            updateStats(Object.assign({}, AppState.previousStats, {
                 processed: 0, 
                 dropped: 0, 
                 delayed: 0, 
@@ -325,7 +326,7 @@ async function resetStats() {
                 tampered: 0, 
                 out_of_order: 0, 
                 queue_size: 0 
-            });
+            }));
             showToast('✓ Statistics reset!', 'success');
         }
     } catch (error) {
@@ -390,26 +391,60 @@ function updateUIState() {
 }
 
 // ============================================================================
-// Statistics Polling
+// Statistics Streaming
 // ============================================================================
 
+// SSE stream (/api/stats/stream) ส่ง snapshot แรกแล้วตามด้วย delta;
+// ถ้า browser/server ไม่รองรับจะ fallback เป็น polling /api/stats
+const STATS_STREAM_HZ = 10;
+const STATS_POLL_MS = 500;
+
 function startStatsPoll() {
     /**
-     * Start polling statistics every 500ms
+     * Start receiving statistics (SSE stream, fallback เป็น polling ทุก 500ms)
      */
-    if (AppState.updateInterval) {
-        clearInterval(AppState.updateInterval);
+    stopStatsPoll();
+    
+    if (!window.EventSource) {
+        startPollingFallback();
+        return;
     }
     
+    const source = new EventSource(`${API_BASE}/stats/stream?hz=${STATS_STREAM_HZ}`);
+    source.addEventListener('snapshot', (event) => {
+        updateStats(JSON.parse(event.data));
+    });
+    source.addEventListener('delta', (event) => {
+        updateStats(Object.assign({}, AppState.previousStats, JSON.parse(event.data)));
+    });
+    source.onerror = () => {
+        // CONNECTING = browser reconnect เอง (ได้ snapshot ใหม่); CLOSED = ใช้ stream ไม่ได้
+        if (source.readyState === EventSource.CLOSED && AppState.statsSource === source) {
+            console.warn('Stats stream unavailable, falling back to polling');
+            AppState.statsSource = null;
+            startPollingFallback();
+        }
+    };
+    AppState.statsSource = source;
+}
+
+function startPollingFallback() {
+    /**
+     * Poll /api/stats ทุก 500ms
+     */
     AppState.updateInterval = setInterval(() => {
         updateStatsDisplay();
-    }, 500);
+    }, STATS_POLL_MS);
 }
 
 function stopStatsPoll() {
     /**
-     * Stop polling statistics
+     * Stop stream / polling statistics
      */
+    if (AppState.statsSource) {
+        AppState.statsSource.close();
+        AppState.statsSource = null;
+    }
     if (AppState.updateInterval) {
         clearInterval(AppState.updateInterval);
         AppState.updateInterval = null;
@@ -0,0 +1,124 @@
+"""
+Server-Sent Events stats stream
+One producer thread samples engine stats at a fixed rate and every connected
+client receives delta-encoded updates of the latest snapshot
+"""
+
+import json
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+STREAM_MAX_HZ = 20.0        # อัตรา sample ของ producer
+STREAM_DEFAULT_HZ = 10.0    # อัตราส่งต่อ client ถ้าไม่ได้ระบุ ?hz=
+HEARTBEAT_S = 15.0          # SSE comment กัน proxy/browser ตัด connection
+
+
+def _encode(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class StatsBroadcaster:
+    """Producer เดียวสำหรับทุก SSE clients
+
+    - producer thread เรียก get_stats() STREAM_MAX_HZ ครั้ง/วินาที เฉพาะตอนที่มี
+      client เชื่อมต่ออยู่ (หยุดเองเมื่อ client สุดท้ายออก)
+    - เก็บแค่ snapshot ล่าสุด + version; client ที่ช้าจะข้าม versions ระหว่างทาง
+      (coalesce) แทนการต่อคิวไว้ ไม่มี buffer โตตามความช้าของ client
+    - แต่ละ client ได้ event 'snapshot' เต็มครั้งแรก จากนั้น 'delta' เฉพาะ keys
+      ที่เปลี่ยนเทียบกับที่ client นั้นเห็นล่าสุด
+    """
+
+    def __init__(self, get_stats: Callable[[], Dict[str, Any]], rate_hz: float = STREAM_MAX_HZ):
+        self.get_stats = get_stats
+        self.interval = 1.0 / max(1.0, rate_hz)
+        self.lock = threading.Lock()
+        self.updated = threading.Condition(self.lock)
+        self.snapshot: Dict[str, Any] = {}
+        self.version = 0
+        self.clients = 0
+        self.thread = None
+
+    def _run(self):
+        logger.info("Stats stream producer started")
+        next_tick = time.monotonic()
+        try:
+            while True:
+                with self.lock:
+                    if not self.clients:
+                        self.thread = None
+                        break
+                try:
+                    stats = self.get_stats()
+                except Exception as e:
+                    logger.debug(f"Stats stream sample error: {e}")
+                    stats = None
+                if stats is not None:
+                    with self.lock:
+                        self.snapshot = stats
+                        self.version += 1
+                        self.updated.notify_all()
+
+                next_tick += self.interval
+                delay = next_tick - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_tick = time.monotonic()  # ช้ากว่ากำหนด: ไม่ไล่ tick ที่พลาด
+        finally:
+            logger.info("Stats stream producer stopped")
+
+    def _subscribe(self):
+        with self.lock:
+            self.clients += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True, name="StatsStream")
+                self.thread.start()
+
+    def _unsubscribe(self):
+        with self.lock:
+            self.clients -= 1
+
+    def stream(self, rate_hz: float = STREAM_DEFAULT_HZ) -> Iterator[str]:
+        """Generator ของ SSE text สำหรับ client หนึ่งตัว (ส่งไม่เกิน rate_hz ครั้ง/วินาที)"""
+        min_gap = 1.0 / min(max(rate_hz, 0.1), STREAM_MAX_HZ)
+        self._subscribe()
+        try:
+            yield "retry: 2000\n\n"
+            seen = 0
+            last: Dict[str, Any] = {}
+            last_sent = 0.0
+            last_write = time.monotonic()
+            while True:
+                # เว้นระยะตาม rate ของ client ก่อนรอ version ใหม่ (coalesce ระหว่างนั้น)
+                gap = last_sent + min_gap - time.monotonic()
+                if gap > 0:
+                    time.sleep(gap)
+                with self.lock:
+                    if self.version == seen:
+                        self.updated.wait(HEARTBEAT_S)
+                    version = self.version
+                    snapshot = self.snapshot
+
+                now = time.monotonic()
+                if version != seen:
+                    seen = version
+                    last_sent = now
+                    if not last:
+                        message = _encode('snapshot', snapshot)
+                    else:
+                        delta = {k: v for k, v in snapshot.items() if last.get(k) != v}
+                        message = _encode('delta', delta) if delta else None
+                    last = snapshot
+                    if message:
+                        last_write = now
+                        yield message
+                        continue
+                if now - last_write >= HEARTBEAT_S:
+                    last_write = now
+                    yield ": heartbeat\n\n"
+        finally:
+            self._unsubscribe()
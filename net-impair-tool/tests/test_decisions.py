@@ -0,0 +1,43 @@
+"""
+DecisionEngine.take: cursor ต่อ table ต้องไม่สะสมเมื่อ tables ถูกสร้างใหม่ทุกครั้งที่ apply config
+
+Usage: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from decisions import DecisionEngine
+
+
+class TakeCursorTest(unittest.TestCase):
+
+    def test_cursor_continues_within_table(self):
+        decisions = DecisionEngine(seed=1)
+        table = array('d', range(10))
+        first = decisions.take(table, 4)
+        second = decisions.take(table, 4)
+        self.assertEqual((first[-1] + 1) % 10, second[0])
+
+    def test_rebuilt_tables_do_not_accumulate(self):
+        decisions = DecisionEngine(seed=1)
+        for _ in range(1000):
+            table = array('d', range(100))
+            decisions.take(table, 8)
+            del table
+        self.assertLessEqual(len(decisions._cursors), 1)
+
+    def test_live_tables_keep_separate_cursors(self):
+        decisions = DecisionEngine(seed=1)
+        tables = [array('d', range(50)) for _ in range(3)]
+        for table in tables:
+            decisions.take(table, 5)
+        self.assertEqual(len(decisions._cursors), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+Per-direction overrides: shaper settings ของทิศต้องถูก apply ให้ token bucket ของทิศนั้น
+
+Usage: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from network import NetworkImpairmentEngine
+from packets import build_udp_packet
+
+
+class DirectionShaperTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = NetworkImpairmentEngine()
+        self.engine.update_config({
+            'filter_str': 'udp',
+            'outbound': {'shaper_enabled': True, 'shaper_outbound_kbps': 80,
+                         'shaper_burst_bytes': 0, 'shaper_queue_bytes': 20000},
+        })
+
+    def test_bucket_uses_direction_rate(self):
+        bucket = self.engine.shapers[True]
+        self.assertEqual(bucket.rate, 80 * 1000 / 8)
+        self.assertEqual(bucket.burst, 0)
+        self.assertEqual(bucket.queue_limit, 20000)
+        # ทิศขาเข้าไม่มี override: ยังเป็นค่าหลัก
+        self.assertEqual(self.engine.shapers[False].queue_limit, self.engine.config.shaper_queue_bytes)
+
+    def test_packets_are_shaped(self):
+        engine = self.engine
+        shard = engine.shards[0]
+        packets = [build_udp_packet('10.0.0.1', '10.0.0.2', 1000, 53, b'x' * 972) for _ in range(10)]
+        engine._process_batch(shard, packets, 100.0)
+        stats = engine.get_stats()
+        self.assertEqual(stats['shaped'], 10)
+        # 10 × 1000 B ที่ 10000 B/s: packet สุดท้ายออกหลัง ~1 s
+        self.assertAlmostEqual(engine.shapers[True].backlog(100.0), 10000, delta=1)
+
+    def test_other_direction_rate_rejected(self):
+        before = self.engine.get_config()
+        with self.assertRaises(ValueError):
+            self.engine.update_config({'outbound': {'shaper_inbound_kbps': 80}})
+        self.assertEqual(self.engine.get_config(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
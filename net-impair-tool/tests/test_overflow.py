@@ -0,0 +1,98 @@
+"""
+Delay-queue overflow: trace verdicts และ flow table ต้องตรงกับ counters
+
+Usage: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flows import FlowTable
+from network import NetworkImpairmentEngine
+from packets import build_udp_packet
+from tracing import VERDICT_OVERFLOW, VERDICT_QUEUED, TraceRing
+
+
+def make_engine(policy: str, max_packets: int = 10) -> NetworkImpairmentEngine:
+    engine = NetworkImpairmentEngine()
+    engine.update_config({
+        'lag_enabled': True,
+        'lag_ms': 1000,
+        'queue_max_packets': max_packets,
+        'queue_overflow_policy': policy,
+    })
+    engine.shards[0].trace = TraceRing(1024)
+    engine.shards[0].flows = FlowTable()
+    return engine
+
+
+def make_batch(count: int, first_port: int = 1000):
+    return [build_udp_packet('10.0.0.1', '10.0.0.2', first_port + i % 4, 53, b'x' * 32)
+            for i in range(count)]
+
+
+def verdict_counts(ring: TraceRing):
+    verdicts = [ring.verdict[slot & ring.mask] & 0x0F for slot in range(ring.tail, ring.head)]
+    return verdicts.count(VERDICT_QUEUED), verdicts.count(VERDICT_OVERFLOW)
+
+
+class OverflowTraceTest(unittest.TestCase):
+
+    def run_batches(self, policy: str, batches: int):
+        engine = make_engine(policy)
+        shard = engine.shards[0]
+        for n in range(batches):
+            engine._process_batch(shard, make_batch(25, 1000 + n * 4), float(n))
+        return engine, shard
+
+    def test_tail_drop_traces_overflow(self):
+        engine, shard = self.run_batches('tail_drop', 2)
+        stats = engine.get_stats()
+        queued, overflow = verdict_counts(shard.trace)
+        self.assertEqual(stats['overflow'], 40)
+        self.assertEqual(overflow, stats['overflow'])
+        self.assertEqual(queued, len(shard.queues[True]))
+
+    def test_head_drop_traces_evictions(self):
+        engine, shard = self.run_batches('head_drop', 3)
+        stats = engine.get_stats()
+        queued, overflow = verdict_counts(shard.trace)
+        self.assertGreater(stats['overflow'], 0)
+        self.assertEqual(overflow, stats['overflow'])
+        # ทุก packet ได้ queued หรือ overflow (tail drop); evicted ได้ทั้งสองอย่าง
+        evicted = queued - len(shard.queues[True])
+        self.assertGreater(evicted, 0)
+        self.assertEqual(queued + overflow - evicted, 25 * 3)
+
+
+class OverflowFlowsTest(unittest.TestCase):
+
+    def run_batches(self, policy: str, batches: int):
+        engine = make_engine(policy)
+        shard = engine.shards[0]
+        for n in range(batches):
+            engine._process_batch(shard, make_batch(25), float(n))
+        return engine.get_stats(), shard
+
+    def test_tail_drop_counts_dropped(self):
+        stats, shard = self.run_batches('tail_drop', 2)
+        records = shard.flows.records()
+        self.assertEqual(sum(flow.dropped for flow in records), stats['overflow'])
+        self.assertEqual(sum(flow.delayed for flow in records), len(shard.queues[True]))
+
+    def test_head_drop_counts_evictions(self):
+        stats, shard = self.run_batches('head_drop', 3)
+        records = shard.flows.records()
+        self.assertEqual(sum(flow.dropped for flow in records), stats['overflow'])
+        # evicted packets นับทั้ง delayed (ตอนเข้าคิว) และ dropped
+        delayed = sum(flow.delayed for flow in records)
+        evicted = delayed - len(shard.queues[True])
+        self.assertGreater(evicted, 0)
+        self.assertEqual(delayed + stats['overflow'] - evicted, 25 * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+"""
+Per-flow profiles: shaper rates เป็นของทิศ profile เปิด/ปิด shaper ได้อย่างเดียว
+
+Usage: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from network import PROFILE_SHAPER_FIELDS, NetworkImpairmentEngine
+
+RULES = [{'dst': '10.0.0.0/8', 'profile': 'slow'}]
+
+
+class ProfileShaperTest(unittest.TestCase):
+
+    def test_shaper_enabled_allowed(self):
+        engine = NetworkImpairmentEngine()
+        engine.update_config({'rules': RULES, 'profiles': {'slow': {'shaper_enabled': True}}})
+        self.assertEqual(engine.config.profiles, {'slow': {'shaper_enabled': True}})
+
+    def test_shaper_settings_rejected(self):
+        engine = NetworkImpairmentEngine()
+        before = engine.get_config()
+        for name in PROFILE_SHAPER_FIELDS:
+            with self.subTest(name=name), self.assertRaises(ValueError):
+                engine.update_config({'rules': RULES, 'profiles': {'slow': {'shaper_enabled': True, name: 64}}})
+        self.assertEqual(engine.get_config(), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+update_config ที่ล้มเหลวต้องไม่ทิ้ง engine ไว้ครึ่งทาง (config / plan / queues คงเดิม)
+
+Usage: python -m unittest discover -s tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends import SyntheticBackend
+from network import NetworkImpairmentEngine
+from packets import build_udp_packet
+from scheduler import MAX_SLOTS
+
+
+class FailedUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = NetworkImpairmentEngine()
+        self.engine.update_config({'lag_enabled': True, 'lag_ms': 50, 'queue_max_packets': 1000})
+        self.before = self.engine.get_config()
+        self.plan = self.engine.plan
+
+    def assertUnchanged(self):
+        engine = self.engine
+        self.assertEqual(engine.get_config(), self.before)
+        self.assertIs(engine.plan, self.plan)
+        self.assertEqual(engine.packet_queue.max_packets, 1000)
+
+    def test_oversized_queue_rejected(self):
+        with self.assertRaises(ValueError):
+            self.engine.update_config({'drop_enabled': True, 'queue_max_packets': MAX_SLOTS + 1})
+        self.assertUnchanged()
+
+    def test_oversized_auto_queue_rejected(self):
+        with self.assertRaises(ValueError):
+            self.engine.update_config({'queue_max_packets': 0, 'lag_ms': 100000,
+                                       'queue_expected_pps': 10 ** 6})
+        self.assertUnchanged()
+
+
+    def test_bad_shaper_value_rolls_back(self):
+        engine = self.engine
+        burst = engine.shapers[True].burst
+        with self.assertRaises(ValueError):
+            engine.update_config({'queue_max_packets': 500, 'shaper_enabled': True,
+                                  'shaper_burst_bytes': 'large'})
+        self.assertUnchanged()
+        self.assertEqual(engine.shapers[True].burst, burst)
+
+    def test_bad_seed_rolls_back(self):
+        with self.assertRaises(ValueError):
+            self.engine.update_config({'queue_max_packets': 500, 'seed': 'abc'})
+        self.assertUnchanged()
+
+    def test_unwritable_trace_file_rejected(self):
+        engine = self.engine
+        with tempfile.TemporaryDirectory() as tmp:
+            engine.update_config({'trace_enabled': True, 'trace_file': os.path.join(tmp, 'run.pcapng')})
+            self.before = engine.get_config()
+            self.plan = engine.plan
+            engine.start(backend=SyntheticBackend(pps=1000))
+            try:
+                writer = engine.trace_writer
+                with self.assertRaises(ValueError):
+                    engine.update_config({'drop_enabled': True, 'drop_chance': 100,
+                                          'trace_file': os.path.join(tmp, 'missing', 'run.pcapng')})
+                self.assertUnchanged()
+                self.assertIs(engine.trace_writer, writer)
+                self.assertIsNotNone(engine.shards[0].trace)
+            finally:
+                engine.stop()
+
+
+
+class ReseedTest(unittest.TestCase):
+
+    def test_reseed_keeps_held_packets(self):
+        engine = NetworkImpairmentEngine()
+        engine.update_config({'out_of_order_enabled': True, 'out_of_order_chance': 100,
+                              'ooo_timeout_ms': 1000, 'seed': 1})
+        shard = engine.shards[0]
+        packets = [build_udp_packet('10.0.0.1', '10.0.0.2', 1000, 53, bytes([i])) for i in range(4)]
+        engine._process_batch(shard, packets, 0.0)
+        held = shard.reorder.held
+        self.assertGreater(held, 0)
+        engine.update_config({'seed': 2})
+        self.assertEqual(shard.reorder.held, held)
+        # packets ที่ hold ไว้ยังถูกปล่อยเข้า delay queue เมื่อครบ timeout
+        engine._flush_reorder(shard, 2.0)
+        self.assertEqual(shard.reorder.held, 0)
+        self.assertEqual(len(shard.queues[True]), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
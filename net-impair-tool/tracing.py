@@ -0,0 +1,349 @@
+"""
+Per-packet trace export (verdict + applied delay) สำหรับเทียบ impairment run กับ application logs
+Shards record into preallocated single-producer rings; one writer thread streams
+them to pcapng (verdict as packet comment) plus a compact binary sidecar
+"""
+
+import os
+import socket
+import struct
+import threading
+import time
+import logging
+from array import array
+from typing import Callable, Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Verdict (4 bits ล่าง) + flags (4 bits บน) ของแต่ละ record
+VERDICT_PASS = 0  # passthrough: ส่งทันทีโดยไม่ผ่าน delay queue
+VERDICT_QUEUED = 1  # เข้า delay queue พร้อม delay
+VERDICT_DROPPED = 2  # drop / loss model
+VERDICT_SHAPER_DROPPED = 3  # shaper queue เต็ม
+VERDICT_OVERFLOW = 4  # delay queue เต็ม (tail drop หรือถูก head_drop ไล่ออก)
+FLAG_DUPLICATE = 0x10  # copy จาก duplicate stage
+FLAG_TAMPERED = 0x20
+FLAG_REORDERED = 0x40  # ถูก hold ใน reorder buffer แล้วปล่อยตามหลัง
+VERDICT_NAMES = ('pass', 'queued', 'dropped', 'shaper_dropped', 'overflow')
+FLAG_NAMES = ((FLAG_DUPLICATE, 'duplicate'), (FLAG_TAMPERED, 'tampered'), (FLAG_REORDERED, 'reordered'))
+
+TRACE_RING_RECORDS = 65536  # ต่อ shard (ปัดขึ้นเป็นกำลังของ 2)
+TRACE_SNAPLEN = 96  # bytes แรกของ packet ที่เก็บ (headers + ต้น payload)
+TRACE_FLUSH_S = 0.05  # writer drain rings ทุกช่วงนี้
+TRACE_DRAIN_CHUNK = 256  # records ต่อการเขียนหนึ่งครั้ง (writer yield GIL ระหว่าง chunks)
+TRACE_MARKS_MAX = 65536
+TRACE_COMMENT_CACHE = 4096  # marks ค้าง (packets ที่หายไปโดยไม่ถูก record) ถูกล้างเมื่อเกินนี้
+
+# pcapng (LINKTYPE_RAW: packet เริ่มที่ IP header) timestamps เป็น ns (if_tsresol = 9)
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER = 0x1A2B3C4D
+LINKTYPE_RAW = 101
+
+# Sidecar: magic แล้วตามด้วย records ขนาดคงที่ (55 bytes) ลำดับเดียวกับ packets ใน pcapng
+# (ts_ns wall clock, delay_ms, length, verdict, ip version, proto, flow ดู _flow)
+SIDECAR_MAGIC = b'NITRACE1'
+SIDECAR_RECORD = struct.Struct('<qfIBBB36s')
+
+
+class TraceRing:
+    """Ring ของ trace records ที่ preallocate ไว้ (single producer / single consumer)
+
+    producer คือ thread ที่ apply effects ให้ shard (capture หรือ worker) และเป็นคน
+    เดียวที่เขียน slots กับ head; writer thread อ่าน tail..head แล้วเขียน tail ทั้งสอง
+    ฝั่งไม่ใช้ lock: head ถูกขยับหลังเขียน slots ครบทั้ง batch แล้วเท่านั้น
+    ring เต็ม = records ใหม่ถูกทิ้งและนับใน lost (hot path ไม่รอ writer)
+
+    slot เก็บ reference ของ packet (ไม่ copy bytes บน hot path) ซึ่ง stages แก้เสร็จแล้ว
+    ตอน record; writer ตัด snaplen bytes แล้วปล่อย reference การเขียน slots ทำเป็น
+    slice ต่อ batch มีแค่ flags (marks/duplicates) ที่ต้องวนทีละ packet
+    marks: flags ที่ stages ติดไว้กับ packet (id) ระหว่างทาง ถูก pop ตอน record
+    """
+
+    def __init__(self, capacity: int = TRACE_RING_RECORDS, snaplen: int = TRACE_SNAPLEN):
+        capacity = 1 << max(4, int(capacity) - 1).bit_length()
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.snaplen = max(20, int(snaplen))
+        self.packets = [None] * capacity
+        self.ts = array('d', bytes(8 * capacity))
+        self.delay = array('d', bytes(8 * capacity))
+        self.verdict = bytearray(capacity)
+        self.marks = {}
+        self.head = 0
+        self.tail = 0
+        self.lost = 0
+
+    def mark(self, packets, indices, flag: int):
+        """ติด flag ให้ packets ที่ indices (บันทึกลง record ตอน packet ถูก record)"""
+        marks = self.marks
+        if len(marks) >= TRACE_MARKS_MAX:
+            marks.clear()
+        for i in indices:
+            key = id(packets[i])
+            marks[key] = marks.get(key, 0) | flag
+
+    def record(self, packets, delays, verdict: int, now: float):
+        """บันทึก packets (delays ms หรือ None = 0) ด้วย verdict เดียวกัน ที่เวลา now"""
+        head = self.head
+        count = len(packets)
+        free = self.capacity - (head - self.tail)
+        if count > free:
+            self.lost += count - free
+            count = free
+            packets = packets[:count]
+        if not count:
+            return
+        if delays is None:
+            delays = array('d', bytes(8 * count))
+        else:
+            delays = array('d', delays[:count])
+        start = head & self.mask
+        first = min(count, self.capacity - start)
+        self._fill(start, packets, delays, verdict, now, 0, first)
+        if first < count:
+            self._fill(0, packets, delays, verdict, now, first, count)
+
+        # ต่อ packet เฉพาะเมื่อมี flags: marks จาก stages หรือ duplicates (packet object
+        # เดียวกันซ้ำใน batch: ครั้งแรกคือ original ที่เหลือคือ copies)
+        marks = self.marks
+        if marks or len(set(map(id, packets))) < count:
+            pop = marks.pop
+            verdicts = self.verdict
+            mask = self.mask
+            seen = {}
+            for k, packet in enumerate(packets):
+                key = id(packet)
+                flags = seen.get(key)
+                if flags is None:
+                    flags = seen[key] = verdict | pop(key, 0)
+                else:
+                    flags |= FLAG_DUPLICATE
+                verdicts[(head + k) & mask] = flags
+        self.head = head + count
+
+    def _fill(self, slot: int, packets, delays, verdict: int, now: float, i: int, j: int):
+        end = slot + j - i
+        self.packets[slot:end] = packets[i:j]
+        self.ts[slot:end] = array('d', (now,)) * (j - i)
+        self.delay[slot:end] = delays[i:j]
+        self.verdict[slot:end] = bytes((verdict,)) * (j - i)
+
+
+def verdict_text(verdict: int, delay_ms: float) -> str:
+    """ข้อความของ record (pcapng comment) เช่น 'queued delay=12.500ms duplicate'"""
+    text = VERDICT_NAMES[verdict & 0x0F]
+    if verdict & 0x0F == VERDICT_QUEUED:
+        text += f" delay={delay_ms:.3f}ms"
+    for flag, name in FLAG_NAMES:
+        if verdict & flag:
+            text += ' ' + name
+    return text
+
+
+def _flow(data):
+    """(ip version, proto, addresses + ports) จาก header ที่ capture ไว้ (สั้นได้)
+
+    ช่วง flow: IPv4 = src(4) dst(4) sport dport, IPv6 = src(16) dst(16) sport dport
+    (ports เป็น 0 เมื่อไม่ใช่ TCP/UDP)
+    """
+    if not data:
+        return 0, 0, b''
+    version = data[0] >> 4
+    if version == 6 and len(data) >= 40:
+        proto = data[6]
+        addresses = data[8:40]
+        offset = 40
+    elif version == 4 and len(data) >= 20:
+        proto = data[9]
+        addresses = data[12:20]
+        offset = (data[0] & 0x0F) * 4
+    else:
+        return version, 0, b''
+    if proto in (6, 17) and len(data) >= offset + 4:
+        return version, proto, addresses + data[offset:offset + 4]
+    return version, proto, addresses
+
+
+PADDING = (b'', b'\x00', b'\x00\x00', b'\x00\x00\x00')
+
+
+def _option(text: bytes) -> bytes:
+    """opt_comment (code 1, pad ถึง 4 bytes) + opt_endofopt"""
+    return struct.pack('<HH', 1, len(text)) + text + PADDING[-len(text) & 3] + b'\x00\x00\x00\x00'
+
+
+class TraceWriter:
+    """Writer thread: drain rings ของทุก shard ลง pcapng + sidecar ทุก TRACE_FLUSH_S
+
+    ไฟล์ sidecar = path เดียวกันแต่นามสกุล .trace; record ที่ n ของ sidecar คือ
+    packet ที่ n ของ pcapng timestamps แปลงจาก monotonic เป็น wall clock ตอน open
+    """
+
+    def __init__(self, path: str, rings: Callable[[], List[TraceRing]], snaplen: int = TRACE_SNAPLEN):
+        self.path = path
+        self.sidecar_path = os.path.splitext(path)[0] + '.trace'
+        self.rings = rings
+        self.snaplen = snaplen
+        self.records = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self._pcap = None
+        self._sidecar = None
+        self._wall_offset = 0.0
+        self._comments = {}
+
+    def open(self):
+        """เปิดไฟล์ทั้งสองและเขียน headers (start เรียกให้ถ้ายังไม่เปิด) raise OSError"""
+        pcap = open(self.path, 'wb')
+        try:
+            sidecar = open(self.sidecar_path, 'wb')
+        except OSError:
+            pcap.close()
+            raise
+        self._wall_offset = time.time() - time.monotonic()
+        self._pcap = pcap
+        self._sidecar = sidecar
+        self._pcap.write(self._header())
+        self._sidecar.write(SIDECAR_MAGIC)
+
+    def close(self):
+        """ปิดไฟล์ของ writer ที่เปิดแล้วแต่ยังไม่ start (ถ้า start แล้วใช้ stop)"""
+        if self.thread is not None:
+            self.stop()
+            return
+        for f in (self._pcap, self._sidecar):
+            if f:
+                f.close()
+        self._pcap = self._sidecar = None
+
+    def start(self):
+        if self._pcap is None:
+            self.open()
+        self.thread = threading.Thread(target=self._run, daemon=True, name="TraceWriter")
+        self.thread.start()
+        logger.info(f"Tracing to {self.path} (+ {self.sidecar_path})")
+
+    def stop(self):
+        """หยุด thread แล้ว drain ที่เหลือครั้งสุดท้ายก่อนปิดไฟล์"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def _header(self) -> bytes:
+        shb = struct.pack('<IIIHHq', PCAPNG_SHB, 28, PCAPNG_BYTE_ORDER, 1, 0, -1) + struct.pack('<I', 28)
+        # if_tsresol = 9 (ns) แล้ว opt_endofopt
+        options = struct.pack('<HHB3x', 9, 1, 9) + struct.pack('<HH', 0, 0)
+        length = 16 + len(options) + 4
+        idb = (struct.pack('<IIHHI', PCAPNG_IDB, length, LINKTYPE_RAW, 0, self.snaplen)
+               + options + struct.pack('<I', length))
+        return shb + idb
+
+    def _comment(self, verdict: int, delay_ms: float) -> bytes:
+        """opt_comment + opt_endofopt ของ record (cache ตาม (verdict, delay) ที่ซ้ำกันบ่อย)"""
+        option = _option(verdict_text(verdict, delay_ms).encode())
+        if len(self._comments) >= TRACE_COMMENT_CACHE:
+            self._comments.clear()
+        self._comments[(verdict, delay_ms)] = option
+        return option
+
+    def _run(self):
+        try:
+            while not self.stop_event.wait(TRACE_FLUSH_S):
+                self._drain()
+            self._drain()
+        except Exception as e:
+            logger.error(f"Trace writer error: {e}")
+        finally:
+            for f in (self._pcap, self._sidecar):
+                if f:
+                    f.close()
+            self._pcap = self._sidecar = None
+            logger.info(f"Trace closed ({self.records} packets)")
+
+    def _drain(self):
+        """เขียน records ที่รออยู่ทีละ TRACE_DRAIN_CHUNK (yield GIL ระหว่าง chunks)"""
+        epb = struct.Struct('<IIIIIII').pack
+        end = struct.Struct('<I').pack
+        pack_sidecar = SIDECAR_RECORD.pack
+        wall_offset = self._wall_offset
+        comments = self._comments
+        comment = self._comment
+        for ring in self.rings():
+            head = ring.head
+            tail = ring.tail
+            mask = ring.mask
+            snaplen = ring.snaplen
+            refs = ring.packets
+            verdicts = ring.verdict
+            delays = ring.delay
+            stamps = ring.ts
+            while tail < head:
+                stop = min(head, tail + TRACE_DRAIN_CHUNK)
+                pcap = []
+                sidecar = []
+                stamp = None
+                for seq in range(tail, stop):
+                    slot = seq & mask
+                    raw = refs[slot].raw
+                    refs[slot] = None
+                    length = len(raw)
+                    captured = raw[:snaplen].tobytes()
+                    cap = len(captured)
+                    verdict = verdicts[slot]
+                    delay_ms = delays[slot]
+                    if stamps[slot] != stamp:
+                        # ทั้ง batch ใช้ timestamp เดียวกัน
+                        stamp = stamps[slot]
+                        ts_ns = int((stamp + wall_offset) * 1e9)
+                        ts_high = ts_ns >> 32
+                        ts_low = ts_ns & 0xFFFFFFFF
+                    option = comments.get((verdict, delay_ms))
+                    if option is None:
+                        option = comment(verdict, delay_ms)
+                    pad = -cap & 3
+                    total = 32 + cap + pad + len(option)
+                    pcap += (epb(PCAPNG_EPB, total, 0, ts_high, ts_low, cap, length),
+                             captured, PADDING[pad], option, end(total))
+                    if cap >= 24 and captured[0] == 0x45 and (captured[9] == 6 or captured[9] == 17):
+                        # IPv4 ไม่มี options: addresses + ports ติดกันที่ 12-24
+                        sidecar.append(pack_sidecar(ts_ns, delay_ms, length, verdict, 4, captured[9],
+                                                    captured[12:24]))
+                    else:
+                        sidecar.append(pack_sidecar(ts_ns, delay_ms, length, verdict, *_flow(captured)))
+                self._pcap.write(b''.join(pcap))
+                self._sidecar.write(b''.join(sidecar))
+                self.records += stop - tail
+                tail = ring.tail = stop
+                time.sleep(0)
+        self._pcap.flush()
+        self._sidecar.flush()
+
+
+def read_sidecar(path: str) -> Iterator[Dict]:
+    """อ่าน sidecar (.trace) ทีละ record เป็น dict"""
+    with open(path, 'rb') as f:
+        if f.read(len(SIDECAR_MAGIC)) != SIDECAR_MAGIC:
+            raise ValueError(f"Not a trace sidecar: {path}")
+        size = SIDECAR_RECORD.size
+        while True:
+            chunk = f.read(size)
+            if len(chunk) < size:
+                return
+            ts_ns, delay_ms, length, verdict, version, proto, flow = SIDECAR_RECORD.unpack(chunk)
+            family, width = (socket.AF_INET6, 16) if version == 6 else (socket.AF_INET, 4)
+            ports = flow[2 * width:2 * width + 4]
+            yield {
+                'ts_ns': ts_ns,
+                'verdict': VERDICT_NAMES[verdict & 0x0F],
+                'flags': [name for flag, name in FLAG_NAMES if verdict & flag],
+                'delay_ms': delay_ms,
+                'length': length,
+                'proto': proto,
+                'src': socket.inet_ntop(family, flow[:width]),
+                'dst': socket.inet_ntop(family, flow[width:2 * width]),
+                'sport': (ports[0] << 8) | ports[1],
+                'dport': (ports[2] << 8) | ports[3],
+            }